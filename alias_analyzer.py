@@ -0,0 +1,275 @@
+"""Integrity and collision checks for POKEMON_NAME_ALIAS.
+
+Usage:
+    python alias_analyzer.py [--db pokemons.db] [--json] [--limit 20] [--fix]
+
+POKEMON_NAME_ALIAS has no constraints, so the whole table is checked in a
+single scan: every row is read once and matched against in-memory sets and
+dicts of the names and forms instead of issuing a query per row. Reported:
+
+* blank            aliases that are empty after trimming spaces
+* duplicate        exact copies of another row
+* orphan_pokemon   NDEX_NUMBER missing from POKEMON_NAME
+* orphan_form      FORM_ID missing from POKEMON_NAME_FORM (FORM_ID 0 is always valid)
+* name_collision   the official NAME of another pokémon; lookups never reach it
+* redundant_name   the pokémon's own NAME on its base form
+* alias_conflict   the same alias on different pokémon
+* near_duplicate   different spellings of the same name after normalization
+
+``--fix`` deletes the rows of the first six kinds, except orphan forms,
+which are moved to the base form, in one transaction. The last two kinds
+need a human decision and are only reported. The database is not migrated,
+so problems the migrations would hide are still visible.
+"""
+import argparse
+import contextlib
+import gc
+import json
+import sqlite3
+import sys
+
+import instrumentation
+from alias_resolver import alias_key
+from normalize import search_key, search_keys
+
+BLANK = "blank"
+DUPLICATE = "duplicate"
+ORPHAN_POKEMON = "orphan_pokemon"
+ORPHAN_FORM = "orphan_form"
+NAME_COLLISION = "name_collision"
+REDUNDANT_NAME = "redundant_name"
+ALIAS_CONFLICT = "alias_conflict"
+NEAR_DUPLICATE = "near_duplicate"
+
+KINDS = [BLANK, DUPLICATE, ORPHAN_POKEMON, ORPHAN_FORM, NAME_COLLISION, REDUNDANT_NAME,
+         ALIAS_CONFLICT, NEAR_DUPLICATE]
+LABELS = {
+    BLANK: "空の別名",
+    DUPLICATE: "完全な重複",
+    ORPHAN_POKEMON: "存在しないポケモン",
+    ORPHAN_FORM: "存在しないすがた",
+    NAME_COLLISION: "他のポケモンの正式名",
+    REDUNDANT_NAME: "自分の正式名",
+    ALIAS_CONFLICT: "複数のポケモンに同じ別名",
+    NEAR_DUPLICATE: "正規化すると同じ表記",
+}
+FIXABLE = {BLANK, DUPLICATE, ORPHAN_POKEMON, ORPHAN_FORM, NAME_COLLISION, REDUNDANT_NAME}
+
+
+class Finding:
+    """One problem: its kind, the alias rows involved and a short explanation."""
+
+    def __init__(self, kind, rows, detail):
+        self.kind = kind
+        self.rows = rows  # [(NDEX_NUMBER, FORM_ID, NAME_ALIAS)]
+        self.detail = detail
+
+    def to_json(self):
+        return {"kind": self.kind, "rows": [list(row) for row in self.rows], "detail": self.detail}
+
+
+class AnalysisReport:
+    def __init__(self):
+        self.rows = 0
+        self.findings = {kind: [] for kind in KINDS}
+        self.fixes = {}  # rowid -> new FORM_ID, or None to delete
+        self.deleted = 0
+        self.moved = 0
+
+    def add(self, kind, rows, detail):
+        self.findings[kind].append(Finding(kind, rows, detail))
+
+    def delete(self, rowid):
+        self.fixes[rowid] = None
+
+    def count(self, kinds=KINDS):
+        return sum(len(self.findings[kind]) for kind in kinds)
+
+    def to_json(self):
+        return {"rows": self.rows,
+                "counts": {kind: len(findings) for kind, findings in self.findings.items()},
+                "findings": {kind: [finding.to_json() for finding in findings]
+                             for kind, findings in self.findings.items()},
+                "fixable_rows": len(self.fixes), "deleted": self.deleted, "moved": self.moved}
+
+    def print(self, out=sys.stdout, limit=20):
+        for kind in KINDS:
+            findings = self.findings[kind]
+            if not findings:
+                continue
+            print(f"{LABELS[kind]} ({kind}): {len(findings)} 件", file=out)
+            for finding in findings[:limit]:
+                print(f"  {finding.detail}", file=out)
+            if len(findings) > limit:
+                print(f"  ... 他 {len(findings) - limit} 件", file=out)
+        print(f"別名 {self.rows} 行 / 問題 {self.count()} 件 "
+              f"(自動修正できる行 {len(self.fixes)} 行)", file=out)
+
+
+def _row(ndex, form_id, alias):
+    return f"'{alias}' (NDEX_NUMBER={ndex}, FORM_ID={form_id})"
+
+
+@contextlib.contextmanager
+def _gc_paused():
+    # Millions of long-lived tuples would trigger full collections over and over
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+@instrumentation.traced("analyze_aliases")
+def analyze(conn):
+    """Check every alias row against the name and form tables; returns an AnalysisReport."""
+    report = AnalysisReport()
+    names = dict(conn.execute("SELECT NDEX_NUMBER, NAME FROM POKEMON_NAME"))
+    name_owner = {}  # alias_key of an official name -> NDEX_NUMBER
+    for ndex, name in names.items():
+        name_owner.setdefault(alias_key(name), ndex)
+    forms = set(conn.execute("SELECT DISTINCT NDEX_NUMBER, FORM_ID FROM POKEMON_NAME_FORM"))
+
+    with _gc_paused():
+        seen = {}  # (NDEX_NUMBER, FORM_ID, NAME_ALIAS) -> rowid of the first copy
+        copies = {}  # row -> number of extra copies
+        by_key = {}  # alias_key -> first row with it
+        conflicts = {}  # alias_key -> {NDEX_NUMBER: row}, only for keys on several pokémon
+        base_keys = set()  # (NDEX_NUMBER, NAME_ALIAS) of the rows kept on FORM_ID 0
+        orphan_forms = []
+
+        for rowid, ndex, form_id, alias in conn.execute(
+                "SELECT rowid, NDEX_NUMBER, FORM_ID, NAME_ALIAS FROM POKEMON_NAME_ALIAS"):
+            row = (ndex, form_id, alias)
+            if row in seen:
+                copies[row] = copies.get(row, 0) + 1
+                report.delete(rowid)
+                continue
+            seen[row] = rowid
+
+            key = alias.strip().casefold()  # alias_key, inlined for the hot loop
+            if not key:
+                report.add(BLANK, [row], _row(*row))
+                report.delete(rowid)
+                continue
+            if ndex not in names:
+                report.add(ORPHAN_POKEMON, [row], _row(*row))
+                report.delete(rowid)
+                continue
+            owner = name_owner.get(key)
+            if owner is not None:
+                if owner != ndex:
+                    report.add(NAME_COLLISION, [row],
+                               f"{_row(*row)} は {names[owner]} (NDEX_NUMBER={owner}) の正式名です")
+                    report.delete(rowid)
+                    continue
+                if form_id == 0:
+                    report.add(REDUNDANT_NAME, [row], _row(*row))
+                    report.delete(rowid)
+                    continue
+            if form_id == 0:
+                base_keys.add((ndex, alias))
+            elif (ndex, form_id) not in forms:
+                orphan_forms.append((rowid, row, key, owner == ndex))
+
+            first = by_key.setdefault(key, row)
+            if first[0] != ndex:
+                conflicts.setdefault(key, {first[0]: first}).setdefault(ndex, row)
+        report.rows = len(seen) + sum(copies.values())
+
+        for row, extra in copies.items():
+            report.add(DUPLICATE, [row] * (extra + 1), f"{_row(*row)} が {extra + 1} 行あります")
+
+        for rowid, (ndex, form_id, alias), key, is_name in orphan_forms:
+            report.add(ORPHAN_FORM, [(ndex, form_id, alias)], _row(ndex, form_id, alias))
+            # Moved to the base form, unless there it would repeat the official
+            # name or break the unique index, which compares NAME_ALIAS
+            # exactly; then it is deleted
+            if is_name or (ndex, alias) in base_keys:
+                report.fixes[rowid] = None
+            else:
+                report.fixes[rowid] = 0
+                base_keys.add((ndex, alias))
+
+        for key, owners in conflicts.items():
+            rows = sorted(owners.values())
+            report.add(ALIAS_CONFLICT, rows, f"'{key}': " + ", ".join(
+                f"{names[ndex]} (NDEX_NUMBER={ndex}, FORM_ID={form_id})" for ndex, form_id, _ in rows))
+
+        # One search key per distinct alias; spellings shared by several
+        # pokémon are near-duplicates, variants of one pokémon's name are not
+        first_spelling = {}  # search_key -> (NDEX_NUMBER, text)
+        near = {}  # search_key -> {NDEX_NUMBER: text}
+        rows = list(by_key.values())
+        for spelling, (ndex, _, alias) in zip(search_keys(row[2] for row in rows), rows):
+            first = first_spelling.setdefault(spelling, (ndex, alias))
+            if first[0] != ndex:
+                near.setdefault(spelling, {first[0]: first[1]}).setdefault(ndex, alias)
+        # Official names take part so "ピカチュー" on another pokémon is caught too
+        for ndex, name in names.items():
+            spelling = search_key(name)
+            if spelling in near:
+                near[spelling][ndex] = name
+            elif spelling in first_spelling and first_spelling[spelling][0] != ndex:
+                near[spelling] = dict([first_spelling[spelling], (ndex, name)])
+        for owners in near.values():
+            rows = sorted((ndex, None, text) for ndex, text in owners.items())
+            report.add(NEAR_DUPLICATE, rows, " / ".join(f"'{text}' ({names[ndex]})" for ndex, _, text in rows))
+    return report
+
+
+@instrumentation.traced("fix_aliases")
+def apply_fixes(conn, report):
+    """Delete or move the fixable rows found by `analyze` in one transaction."""
+    cursor = conn.cursor()
+    cursor.execute("CREATE TEMP TABLE IF NOT EXISTS ALIAS_FIX (ROW_ID INTEGER PRIMARY KEY, FORM_ID INTEGER)")
+    try:
+        cursor.execute("DELETE FROM ALIAS_FIX")
+        cursor.executemany("INSERT INTO ALIAS_FIX (ROW_ID, FORM_ID) VALUES (?, ?)", report.fixes.items())
+        cursor.execute("""
+            DELETE FROM POKEMON_NAME_ALIAS
+            WHERE rowid IN (SELECT ROW_ID FROM ALIAS_FIX WHERE FORM_ID IS NULL)""")
+        report.deleted = cursor.rowcount
+        cursor.execute("""
+            UPDATE POKEMON_NAME_ALIAS SET FORM_ID = 0
+            WHERE rowid IN (SELECT ROW_ID FROM ALIAS_FIX WHERE FORM_ID = 0)""")
+        report.moved = cursor.rowcount
+        cursor.execute("DELETE FROM ALIAS_FIX")
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="POKEMON_NAME_ALIAS の整合性と衝突を検査する")
+    parser.add_argument("--db", default="pokemons.db", help="データベースファイル (既定: pokemons.db)")
+    parser.add_argument("--json", action="store_true", help="結果をJSONで出力")
+    parser.add_argument("--limit", type=int, default=20, help="種類ごとに表示する件数")
+    parser.add_argument("--fix", action="store_true",
+                        help="重複・空・存在しないポケモン/すがた・正式名と同じ別名を修正する")
+    args = parser.parse_args(argv)
+
+    instrumentation.enable_from_env()
+    conn = sqlite3.connect(args.db)
+    try:
+        report = analyze(conn)
+        if args.fix and report.fixes:
+            apply_fixes(conn, report)
+        if args.json:
+            json.dump(report.to_json(), sys.stdout, ensure_ascii=False, indent=2)
+            print()
+        else:
+            report.print(limit=args.limit)
+            if args.fix:
+                print(f"削除 {report.deleted} 行 / 基本のすがたへ移動 {report.moved} 行")
+    finally:
+        conn.close()
+    remaining = report.count([kind for kind in KINDS if kind not in FIXABLE]) if args.fix else report.count()
+    return 1 if remaining else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
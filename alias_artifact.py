@@ -0,0 +1,378 @@
+"""Compiled, read-only alias dictionary for consumers that only look aliases up.
+
+``build`` compiles POKEMON_NAME, POKEMON_NAME_FORM and POKEMON_NAME_ALIAS
+into one immutable file; `AliasArtifact` maps it with ``mmap`` and answers
+the same lookups as `AliasResolver` without SQLite. Opening parses only the
+header, and a lookup reads just the records its binary search probes, so
+load time does not grow with the number of aliases.
+
+Usage:
+    python alias_artifact.py build [--db pokemons.db] aliases.bin
+    python alias_artifact.py lookup aliases.bin リザX ピカチュウ
+    python alias_artifact.py prefix aliases.bin ピカ [--limit 10]
+    python alias_artifact.py verify aliases.bin [--db pokemons.db]
+
+Layout (little-endian)::
+
+    header    magic "PKMALIAS", format version, CRC-32 of everything after
+              the header, number of distinct keys, then (offset, count) of
+              the four sections
+    strings   u32 length + UTF-8 bytes, each distinct string once
+    keys      (key, NDEX_NUMBER, FORM_ID, text) records sorted by the UTF-8
+              bytes of the key; a key's targets follow in priority order
+    pokemon   (NDEX_NUMBER, name) sorted by NDEX_NUMBER
+    forms     (NDEX_NUMBER, FORM_ID, label, artwork) sorted by both
+
+Keys are `alias_key` of the names, aliases and unambiguous form names, with
+the priorities `AliasResolver` uses; string fields are offsets into the
+string section.
+"""
+import argparse
+import mmap
+import os
+import sqlite3
+import struct
+import sys
+import zlib
+
+from alias_resolver import alias_key, build_tables, connect_readonly, read_rows
+from alias_store import FormTable
+
+MAGIC = b"PKMALIAS"
+VERSION = 1
+STRINGS, KEYS, POKEMON, FORMS = range(4)
+
+_HEADER = struct.Struct("<8sIII")
+_SECTION = struct.Struct("<QQ")
+_LENGTH = struct.Struct("<I")
+_KEY = struct.Struct("<IIiI")
+_POKEMON = struct.Struct("<II")
+_FORM = struct.Struct("<IiII")
+_DATA_START = _HEADER.size + 4 * _SECTION.size
+
+
+class ArtifactError(Exception):
+    pass
+
+
+class _Strings:
+    def __init__(self):
+        self.offsets = {}
+        self.data = bytearray()
+
+    def add(self, text):
+        offset = self.offsets.get(text)
+        if offset is None:
+            encoded = text.encode("utf-8")
+            offset = self.offsets[text] = len(self.data)
+            self.data += _LENGTH.pack(len(encoded)) + encoded
+        return offset
+
+
+def compile_artifact(conn, path):
+    """Write the artifact for the database behind `conn` to `path` atomically.
+
+    Returns the number of lookup keys.
+    """
+    names, forms, aliases = read_rows(conn)
+    table, every, texts = build_tables(names, forms, aliases)
+    form_table = FormTable()
+    form_table.load(conn)
+    # Forms sharing a label are missing from the label mapping but keep their artwork
+    form_ids = {}
+    for ndex, form_id in conn.execute("SELECT DISTINCT NDEX_NUMBER, FORM_ID FROM POKEMON_NAME_FORM"):
+        form_ids.setdefault(ndex, set()).add(form_id)
+
+    strings = _Strings()
+    keys = bytearray()
+    for key in sorted(table, key=lambda key: key.encode("utf-8")):
+        key_offset = strings.add(key)
+        text_offset = strings.add(texts[key])
+        for ndex, form_id in every.get(key) or [table[key]]:
+            keys += _KEY.pack(key_offset, ndex, form_id, text_offset)
+
+    pokemon = bytearray()
+    form_records = bytearray()
+    for ndex, name in sorted(names):
+        pokemon += _POKEMON.pack(ndex, strings.add(name))
+        for form_id in sorted(set(form_table.mapping(ndex).values()) | form_ids.get(ndex, set())):
+            form_records += _FORM.pack(ndex, form_id, strings.add(form_table.label_for(ndex, form_id)),
+                                       strings.add(form_table.artwork(ndex, form_id)))
+
+    sections = [(strings.data, len(strings.offsets)), (keys, len(keys) // _KEY.size),
+                (pokemon, len(names)), (form_records, len(form_records) // _FORM.size)]
+    body = bytearray()
+    table_bytes = bytearray()
+    for data, count in sections:
+        table_bytes += _SECTION.pack(_DATA_START + len(body), count)
+        body += data
+    crc = zlib.crc32(body, zlib.crc32(table_bytes))
+
+    part = path + ".part"
+    try:
+        with open(part, "wb") as f:
+            f.write(_HEADER.pack(MAGIC, VERSION, crc, len(table)))
+            f.write(table_bytes)
+            f.write(body)
+        os.replace(part, path)
+    except BaseException:
+        if os.path.exists(part):
+            os.remove(part)
+        raise
+    return len(table)
+
+
+class AliasArtifact:
+    """Memory-mapped reader; the lookup methods mirror `AliasResolver`."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._map)
+        try:
+            if len(self._map) < _DATA_START:
+                raise ArtifactError(f"{path}: ファイルが短すぎます")
+            magic, version, self.crc, self.key_count = _HEADER.unpack_from(self._map, 0)
+            if magic != MAGIC:
+                raise ArtifactError(f"{path}: 別名辞書のファイルではありません")
+            if version != VERSION:
+                raise ArtifactError(f"{path}: 未対応の形式です (バージョン {version})")
+            self._sections = [_SECTION.unpack_from(self._map, _HEADER.size + i * _SECTION.size) for i in range(4)]
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self):
+        self._view.release()
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _string_bytes(self, offset):
+        # A bounded copy of one key; cheaper per probe than comparing in place from Python
+        start = self._sections[STRINGS][0] + offset
+        length, = _LENGTH.unpack_from(self._map, start)
+        return self._map[start + 4:start + 4 + length]
+
+    def _string(self, offset):
+        return self._string_bytes(offset).decode("utf-8")
+
+    def _key(self, index):
+        return _KEY.unpack_from(self._map, self._sections[KEYS][0] + index * _KEY.size)
+
+    def _lower_bound(self, encoded):
+        low, high = 0, self._sections[KEYS][1]
+        while low < high:
+            middle = (low + high) // 2
+            if self._string_bytes(self._key(middle)[0]) < encoded:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def resolve_all(self, alias):
+        """Return every ``(NDEX_NUMBER, FORM_ID)`` that `alias` refers to, by priority."""
+        encoded = alias_key(alias).encode("utf-8")
+        matches = []
+        index = self._lower_bound(encoded)
+        count = self._sections[KEYS][1]
+        while index < count:
+            key_offset, ndex, form_id, _ = self._key(index)
+            if self._string_bytes(key_offset) != encoded:
+                break
+            matches.append((ndex, form_id))
+            index += 1
+        return matches
+
+    def resolve(self, alias):
+        """Return ``(NDEX_NUMBER, FORM_ID)`` for `alias`, or None if unknown."""
+        encoded = alias_key(alias).encode("utf-8")
+        index = self._lower_bound(encoded)
+        if index < self._sections[KEYS][1]:
+            key_offset, ndex, form_id, _ = self._key(index)
+            if self._string_bytes(key_offset) == encoded:
+                return ndex, form_id
+        return None
+
+    def resolve_many(self, aliases):
+        return [self.resolve(alias) for alias in aliases]
+
+    def prefix(self, prefix, limit=10):
+        """Return up to `limit` ``(text, NDEX_NUMBER, FORM_ID)`` whose key starts with `prefix`.
+
+        Results are in key order, one per key, with the key's first target.
+        """
+        encoded = alias_key(prefix).encode("utf-8")
+        results = []
+        index = self._lower_bound(encoded)
+        count = self._sections[KEYS][1]
+        last = None
+        while index < count and len(results) < limit:
+            key_offset, ndex, form_id, text_offset = self._key(index)
+            index += 1
+            if key_offset == last:
+                continue
+            if not self._string_bytes(key_offset).startswith(encoded):
+                break
+            last = key_offset
+            results.append((self._string(text_offset), ndex, form_id))
+        return results
+
+    def _find(self, section, record, key):
+        offset, count = self._sections[section]
+        low, high = 0, count
+        while low < high:
+            middle = (low + high) // 2
+            values = record.unpack_from(self._map, offset + middle * record.size)
+            if values[:len(key)] < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < count:
+            values = record.unpack_from(self._map, offset + low * record.size)
+            if values[:len(key)] == key:
+                return values
+        return None
+
+    def name_of(self, ndex):
+        found = self._find(POKEMON, _POKEMON, (ndex,))
+        return self._string(found[1]) if found else None
+
+    def form_label(self, ndex, form_id):
+        """The label the editors show for a form; "" when it has none."""
+        found = self._find(FORMS, _FORM, (ndex, form_id))
+        return self._string(found[2]) if found else ""
+
+    def artwork(self, ndex, form_id):
+        found = self._find(FORMS, _FORM, (ndex, form_id))
+        return self._string(found[3]) if found else None
+
+    def check(self):
+        """Raise ArtifactError when the stored checksum does not match the content."""
+        if zlib.crc32(self._view[_HEADER.size:]) != self.crc:
+            raise ArtifactError(f"{self.path}: チェックサムが一致しません")
+
+    def __len__(self):
+        """Number of distinct lookup keys, like ``len(AliasResolver)``."""
+        return self.key_count
+
+
+_EXPECTED_KEYS = """
+    WITH FORM_KEYS AS (
+        SELECT ALIAS_KEY(FORM_NAME) AS KEY FROM POKEMON_NAME_FORM WHERE FORM_NAME IS NOT NULL
+        GROUP BY KEY HAVING COUNT(DISTINCT NDEX_NUMBER) = 1),
+    CANDIDATES (KEY, NDEX_NUMBER, FORM_ID, PRIORITY) AS (
+        SELECT ALIAS_KEY(NAME), NDEX_NUMBER, 0, 0 FROM POKEMON_NAME
+        UNION ALL
+        SELECT ALIAS_KEY(NAME_ALIAS), NDEX_NUMBER, FORM_ID, 1 FROM POKEMON_NAME_ALIAS
+        UNION ALL
+        SELECT ALIAS_KEY(FORM_NAME), NDEX_NUMBER, FORM_ID, 2 FROM POKEMON_NAME_FORM
+        WHERE ALIAS_KEY(FORM_NAME) IN (SELECT KEY FROM FORM_KEYS))
+    SELECT KEY, NDEX_NUMBER, FORM_ID, MIN(PRIORITY) FROM CANDIDATES
+    GROUP BY KEY, NDEX_NUMBER, FORM_ID"""
+
+
+def verify(artifact, db_path):
+    """Compare every lookup of `artifact` with the SQLite source; returns the mismatches.
+
+    The expected targets come from SQL over `db_path`, not from the code that
+    wrote the artifact. A key must resolve to a target of its best priority
+    and list every target once, in priority order; which of several equally
+    ranked targets comes first is not checked.
+    """
+    artifact.check()
+    conn = connect_readonly(db_path)
+    try:
+        conn.create_function("ALIAS_KEY", 1, lambda text: None if text is None else alias_key(text),
+                             deterministic=True)
+        expected = {}  # key -> {(NDEX_NUMBER, FORM_ID): priority}
+        for key, ndex, form_id, priority in conn.execute(_EXPECTED_KEYS):
+            expected.setdefault(key, {})[(ndex, form_id)] = priority
+        names = dict(conn.execute("SELECT NDEX_NUMBER, NAME FROM POKEMON_NAME"))
+        forms = FormTable()
+        forms.load(conn)
+        form_rows = conn.execute("SELECT DISTINCT NDEX_NUMBER, FORM_ID FROM POKEMON_NAME_FORM").fetchall()
+    finally:
+        conn.close()
+
+    problems = []
+    if len(artifact) != len(expected):
+        problems.append(f"キーの数: 辞書 {len(artifact)} / データベース {len(expected)}")
+    for key, targets in expected.items():
+        found = artifact.resolve_all(key)
+        priorities = [targets.get(target) for target in found]
+        if (sorted(found) != sorted(targets) or priorities != sorted(priorities)
+                or artifact.resolve(key) != (found[0] if found else None)):
+            problems.append(f"'{key}': 辞書 {found} / データベース {sorted(targets, key=targets.get)}")
+    for ndex, name in names.items():
+        if artifact.name_of(ndex) != name:
+            problems.append(f"NDEX_NUMBER={ndex}: 辞書 {artifact.name_of(ndex)!r} / データベース {name!r}")
+    for ndex, form_id in set(form_rows) | {(ndex, 0) for ndex in names}:
+        if ndex not in names:
+            continue
+        label = forms.label_for(ndex, form_id)
+        if artifact.form_label(ndex, form_id) != label:
+            problems.append(f"すがた ({ndex}, {form_id}): 辞書 {artifact.form_label(ndex, form_id)!r} / "
+                            f"データベース {label!r}")
+        artwork = forms.artwork(ndex, form_id)
+        if artifact.artwork(ndex, form_id) != artwork:
+            problems.append(f"画像 ({ndex}, {form_id}): 辞書 {artifact.artwork(ndex, form_id)!r} / "
+                            f"データベース {artwork!r}")
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="読み取り専用の別名辞書ファイルの作成と検索")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="データベースから辞書ファイルを作成")
+    build.add_argument("artifact")
+    lookup = commands.add_parser("lookup", help="別名を完全一致で検索")
+    lookup.add_argument("artifact")
+    lookup.add_argument("aliases", nargs="+")
+    prefix = commands.add_parser("prefix", help="前方一致で検索")
+    prefix.add_argument("artifact")
+    prefix.add_argument("prefix")
+    prefix.add_argument("--limit", type=int, default=10)
+    check = commands.add_parser("verify", help="辞書ファイルがデータベースと同じ結果を返すか確認")
+    check.add_argument("artifact")
+    for command in (build, check):
+        command.add_argument("--db", default=os.environ.get("POKEMON_DB", "pokemons.db"), help="データベースファイル")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        conn = sqlite3.connect(args.db)
+        try:
+            count = compile_artifact(conn, args.artifact)
+        finally:
+            conn.close()
+        print(f"{args.artifact}: {count} 件のキー, {os.path.getsize(args.artifact)} バイト", file=sys.stderr)
+        return 0
+
+    with AliasArtifact(args.artifact) as artifact:
+        if args.command == "lookup":
+            for alias in args.aliases:
+                match = artifact.resolve(alias)
+                if match:
+                    print(f"{alias}\t{match[0]}\t{match[1]}\t{artifact.name_of(match[0])}\t"
+                          f"{artifact.form_label(*match)}")
+                else:
+                    print(f"{alias}\t見つかりません")
+            return 0
+        if args.command == "prefix":
+            for text, ndex, form_id in artifact.prefix(args.prefix, args.limit):
+                print(f"{text}\t{ndex}\t{form_id}\t{artifact.name_of(ndex)}")
+            return 0
+        problems = verify(artifact, args.db)
+        for problem in problems[:50]:
+            print(problem)
+        print(f"{'一致しました' if not problems else f'{len(problems)} 件の不一致があります'}", file=sys.stderr)
+        return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,158 @@
+"""Three-way merge of POKEMON_NAME_ALIAS between database copies.
+
+Each copy's alias table is loaded as a set of ``(NDEX_NUMBER, FORM_ID,
+NAME_ALIAS)`` rows, so the whole merge is a handful of set operations:
+
+    merged = (local & remote) | (local - base) | (remote - base)
+
+i.e. a row survives unless one side deleted it, and additions from both
+sides are kept. Only two situations are reported as conflicts:
+
+* the same new alias text was added for different pokémon/forms on each side;
+* both sides removed the same row and each added a different replacement for
+  the same pokémon/form (two different renames of one alias).
+
+Usage: python alias_merge.py BASE LOCAL REMOTE [-o OUT]
+"""
+import os
+import sqlite3
+import sys
+
+ALIAS_ROWS = "SELECT NDEX_NUMBER, FORM_ID, NAME_ALIAS FROM POKEMON_NAME_ALIAS"
+
+
+def load_alias_set(conn):
+    return set(conn.execute(ALIAS_ROWS))
+
+
+def load_alias_set_from_file(db_path):
+    conn = sqlite3.connect(f"file:{os.path.abspath(db_path)}?mode=ro", uri=True)
+    try:
+        return load_alias_set(conn)
+    finally:
+        conn.close()
+
+
+class Conflict:
+    ALIAS_TARGET = "alias_target"
+    RENAME = "rename"
+
+    def __init__(self, kind, local_rows, remote_rows, base_rows=()):
+        self.kind = kind
+        self.base_rows = sorted(base_rows)
+        self.local_rows = sorted(local_rows)
+        self.remote_rows = sorted(remote_rows)
+
+    def describe(self):
+        local = ", ".join(f"'{alias}' ({ndex}/{form_id})" for ndex, form_id, alias in self.local_rows)
+        remote = ", ".join(f"'{alias}' ({ndex}/{form_id})" for ndex, form_id, alias in self.remote_rows)
+        if self.kind == self.RENAME:
+            base = ", ".join(f"'{alias}'" for _, _, alias in self.base_rows)
+            return f"{base} の変更が競合: ローカル {local} / リモート {remote}"
+        return f"別名の対象が競合: ローカル {local} / リモート {remote}"
+
+
+class MergeResult:
+    def __init__(self, merged, conflicts, local):
+        self.local = local
+        self.merged = merged
+        self.conflicts = conflicts
+        self.to_insert = merged - local  # rows the local copy is missing
+        self.to_delete = local - merged  # rows the local copy must drop
+
+    def prefer_local(self):
+        """Resolve every conflict in favour of the local side."""
+        drop = set()
+        for conflict in self.conflicts:
+            drop.update(row for row in conflict.remote_rows if row not in self.local)
+        return MergeResult(self.merged - drop, [], self.local)
+
+
+def three_way_merge(base, local, remote):
+    """Merge three alias row sets and return a MergeResult."""
+    added_local = local - base
+    added_remote = remote - base
+    merged = (local & remote) | added_local | added_remote
+
+    conflicts = []
+
+    # Same alias text newly pointed at different targets
+    by_alias_local = {}
+    for row in added_local - added_remote:
+        by_alias_local.setdefault(row[2], set()).add(row)
+    by_alias_remote = {}
+    for row in added_remote - added_local:
+        if row[2] in by_alias_local:
+            by_alias_remote.setdefault(row[2], set()).add(row)
+    for alias, remote_rows in by_alias_remote.items():
+        conflicts.append(Conflict(Conflict.ALIAS_TARGET, by_alias_local[alias], remote_rows))
+
+    # Both sides removed a row and added different rows for the same form
+    removed_both = (base - local) & (base - remote)
+    if removed_both:
+        groups = {}
+        for row in removed_both:
+            groups.setdefault(row[:2], [set(), set(), set()])[0].add(row)
+        for row in added_local - added_remote:
+            if row[:2] in groups:
+                groups[row[:2]][1].add(row)
+        for row in added_remote - added_local:
+            if row[:2] in groups:
+                groups[row[:2]][2].add(row)
+        for base_rows, local_rows, remote_rows in groups.values():
+            if local_rows and remote_rows:
+                conflicts.append(Conflict(Conflict.RENAME, local_rows, remote_rows, base_rows))
+
+    return MergeResult(merged, conflicts, local)
+
+
+def apply_merge(conn, result):
+    """Make the alias table of `conn` equal to the merged set, in one transaction."""
+    cursor = conn.cursor()
+    cursor.executemany("DELETE FROM POKEMON_NAME_ALIAS WHERE NDEX_NUMBER = ? AND FORM_ID = ? AND NAME_ALIAS = ?",
+                       result.to_delete)
+    cursor.executemany("INSERT OR IGNORE INTO POKEMON_NAME_ALIAS (NDEX_NUMBER, FORM_ID, NAME_ALIAS) VALUES (?, ?, ?)",
+                       result.to_insert)
+    conn.commit()
+
+
+def merge_databases(base_path, local_conn, remote_path):
+    """Three-way merge the alias table of `local_conn` against two database files."""
+    return three_way_merge(load_alias_set_from_file(base_path), load_alias_set(local_conn),
+                           load_alias_set_from_file(remote_path))
+
+
+def main(argv=None):
+    import argparse
+    import shutil
+
+    parser = argparse.ArgumentParser(description="POKEMON_NAME_ALIAS の3方向マージ")
+    parser.add_argument("base", help="共通の元になったデータベース")
+    parser.add_argument("local", help="ローカルで編集したデータベース")
+    parser.add_argument("remote", help="リモートで編集されたデータベース")
+    parser.add_argument("-o", "--output", help="結果の出力先 (省略時は LOCAL を更新)")
+    parser.add_argument("--prefer-local", action="store_true", help="競合をローカル優先で解決する")
+    args = parser.parse_args(argv)
+
+    target = args.local
+    if args.output:
+        shutil.copyfile(args.local, args.output)
+        target = args.output
+    conn = sqlite3.connect(target)
+    try:
+        result = merge_databases(args.base, conn, args.remote)
+        for conflict in result.conflicts:
+            print(conflict.describe(), file=sys.stderr)
+        if result.conflicts and not args.prefer_local:
+            print(f"競合が {len(result.conflicts)} 件あります。--prefer-local を指定してください", file=sys.stderr)
+            return 1
+        result = result.prefer_local()
+        apply_merge(conn, result)
+        print(f"追加 {len(result.to_insert)} 件 / 削除 {len(result.to_delete)} 件", file=sys.stderr)
+        return 0
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,177 @@
+"""Headless alias resolution over pokemons.db.
+
+Maps a name or alias string to ``(NDEX_NUMBER, FORM_ID)`` from in-memory
+tables, without tkinter and without issuing SQL per lookup::
+
+    resolver = AliasResolver("pokemons.db")
+    resolver.resolve("リザX")            # -> (6, 1)
+    resolver.resolve_many(["ピカチュウ", "???"])  # -> [(25, 0), None]
+"""
+import os
+import sqlite3
+import time
+
+
+def alias_key(text):
+    """Key used for lookups; aliases are matched ignoring case and surrounding spaces."""
+    return text.strip().casefold()
+
+
+def connect_readonly(db_path):
+    return sqlite3.connect(f"file:{os.path.abspath(db_path)}?mode=ro", uri=True)
+
+
+def db_version(db_path):
+    """mtimes of the database and its -wal file; edits in WAL mode only touch the latter."""
+    version = []
+    for path in (db_path, db_path + "-wal"):
+        try:
+            version.append(os.stat(path).st_mtime_ns)
+        except OSError:
+            version.append(None)
+    return tuple(version)
+
+
+def read_rows(conn):
+    """The rows `build_tables` takes, in the order that decides priorities."""
+    names = conn.execute("SELECT NDEX_NUMBER, NAME FROM POKEMON_NAME").fetchall()
+    forms = conn.execute(
+        "SELECT NDEX_NUMBER, FORM_ID, FORM_NAME FROM POKEMON_NAME_FORM WHERE FORM_NAME IS NOT NULL").fetchall()
+    aliases = conn.execute("SELECT NDEX_NUMBER, FORM_ID, NAME_ALIAS FROM POKEMON_NAME_ALIAS").fetchall()
+    return names, forms, aliases
+
+
+def build_tables(names, forms, aliases):
+    """Build the lookup tables from ``(NDEX_NUMBER, NAME)``, ``(NDEX_NUMBER,
+    FORM_ID, FORM_NAME)`` and ``(NDEX_NUMBER, FORM_ID, NAME_ALIAS)`` rows.
+
+    Returns ``(table, every, texts)``: the first target of each key by
+    priority, all targets of the ambiguous keys, and the first text each key
+    was seen with.
+    """
+    targets = {}  # share one tuple object per (NDEX_NUMBER, FORM_ID)
+
+    def target(ndex, form_id):
+        key = (ndex, form_id)
+        return targets.setdefault(key, key)
+
+    table = {}  # key -> first target by priority
+    every = {}  # key -> all targets, only for ambiguous keys
+    texts = {}
+
+    def add(text, value):
+        key = alias_key(text)
+        first = table.setdefault(key, value)
+        if first is value:
+            texts.setdefault(key, text)
+        else:
+            matches = every.setdefault(key, [first])
+            if value not in matches:
+                matches.append(value)
+
+    for ndex, name in names:
+        add(name, target(ndex, 0))
+    for ndex, form_id, alias in aliases:
+        add(alias, target(ndex, form_id))
+
+    owners = {}
+    for ndex, form_id, form_name in forms:
+        owners.setdefault(alias_key(form_name), set()).add(ndex)
+    for ndex, form_id, form_name in forms:
+        if len(owners[alias_key(form_name)]) == 1:
+            add(form_name, target(ndex, form_id))
+    return table, every, texts
+
+
+class AliasResolver:
+    """Preloaded lookup tables for resolving aliases to pokémon forms.
+
+    Keys are resolved in priority order: official names (FORM_ID 0), then
+    aliases, then form names that belong to a single pokémon. Generic form
+    labels shared by many pokémon (e.g. キョダイマックス) are not indexed.
+
+    The mtimes of the database and its -wal file are checked at most every
+    `check_interval` seconds and the tables are rebuilt when they change.
+    """
+
+    def __init__(self, db_path, check_interval=1.0, conn=None):
+        self.db_path = db_path
+        self.check_interval = check_interval
+        self._version = None
+        self._next_check = 0.0
+        self.load(conn)
+
+    def load(self, conn=None):
+        """(Re)build the lookup tables from the database.
+
+        Reads through `conn` when given, e.g. inside a caller's read
+        transaction, instead of opening a connection of its own.
+        """
+        version = db_version(self.db_path)
+        if conn is not None:
+            names, forms, aliases = read_rows(conn)
+        else:
+            conn = connect_readonly(self.db_path)
+            try:
+                names, forms, aliases = read_rows(conn)
+            finally:
+                conn.close()
+
+        self.names = dict(names)
+        table, every, _ = build_tables(names, forms, aliases)
+        self._table = table
+        self._every = every
+        self._version = version
+        self._next_check = time.monotonic() + self.check_interval
+
+    def reload_if_changed(self):
+        """Reload when the database or its -wal file changed. Returns True if reloaded."""
+        version = db_version(self.db_path)
+        if version[0] is None:
+            return False
+        if version == self._version:
+            self._next_check = time.monotonic() + self.check_interval
+            return False
+        self.load()
+        return True
+
+    def _maybe_reload(self):
+        if time.monotonic() >= self._next_check:
+            self.reload_if_changed()
+
+    def resolve(self, alias):
+        """Return ``(NDEX_NUMBER, FORM_ID)`` for `alias`, or None if unknown."""
+        self._maybe_reload()
+        return self._table.get(alias_key(alias))
+
+    def resolve_all(self, alias):
+        """Return every ``(NDEX_NUMBER, FORM_ID)`` that `alias` refers to."""
+        self._maybe_reload()
+        key = alias_key(alias)
+        if key in self._every:
+            return list(self._every[key])
+        match = self._table.get(key)
+        return [match] if match else []
+
+    def resolve_many(self, aliases):
+        """Resolve an iterable of aliases; unknown ones map to None."""
+        self._maybe_reload()
+        get = self._table.get
+        return [get(alias_key(alias)) for alias in aliases]
+
+    def name_of(self, ndex):
+        return self.names.get(ndex)
+
+    def __len__(self):
+        return len(self._table)
+
+
+if __name__ == "__main__":
+    import sys
+
+    resolver = AliasResolver(os.environ.get("POKEMON_DB", "pokemons.db"))
+    for alias, match in zip(sys.argv[1:], resolver.resolve_many(sys.argv[1:])):
+        if match:
+            print(f"{alias}\t{match[0]}\t{match[1]}\t{resolver.name_of(match[0])}")
+        else:
+            print(f"{alias}\t-")
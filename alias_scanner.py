@@ -0,0 +1,213 @@
+"""Find every pokémon name and alias mentioned in free text.
+
+`AliasScanner` compiles the lookup keys of `AliasResolver` (names, aliases
+and unambiguous form names, compared after `alias_key`) into an
+Aho–Corasick automaton and reports ``(NDEX_NUMBER, FORM_ID, (start, end))``
+for each mention in one pass over the text::
+
+    scanner = AliasScanner("pokemons.db")
+    scanner.scan("リザXとピカチュウを使う")
+    # [(6, 1, (0, 3)), (25, 0, (4, 9))]
+
+Overlapping mentions are reduced to the leftmost-longest ones, so
+"リザードン" is reported once and not also as "リザード". Purely ASCII
+aliases only match as whole words, so "x" does not match inside "box".
+The automaton is rebuilt when the database (or its -wal file) changes.
+
+Usage: python alias_scanner.py [--db pokemons.db] [--all] < messages.txt
+"""
+import argparse
+import os
+import sys
+import time
+from collections import deque
+
+from alias_resolver import build_tables, connect_readonly, db_version, read_rows
+
+
+class Automaton:
+    """Aho–Corasick automaton over a list of distinct, non-empty patterns."""
+
+    def __init__(self, patterns):
+        self.patterns = list(patterns)
+        goto = [{}]
+        output = [-1]  # index of the pattern ending at the node, or -1
+        for index, pattern in enumerate(self.patterns):
+            node = 0
+            for char in pattern:
+                child = goto[node].get(char)
+                if child is None:
+                    child = len(goto)
+                    goto[node][char] = child
+                    goto.append({})
+                    output.append(-1)
+                node = child
+            output[node] = index
+
+        # Failure links in breadth-first order; `report` is the nearest node
+        # on the failure chain (the node itself included) that ends a pattern
+        fail = [0] * len(goto)
+        report = [0] * len(goto)
+        queue = deque()
+        for child in goto[0].values():
+            report[child] = child if output[child] >= 0 else 0
+            queue.append(child)
+        while queue:
+            node = queue.popleft()
+            for char, child in goto[node].items():
+                state = fail[node]
+                while state and char not in goto[state]:
+                    state = fail[state]
+                fail[child] = goto[state].get(char, 0)
+                report[child] = child if output[child] >= 0 else report[fail[child]]
+                queue.append(child)
+
+        self.goto = goto
+        self.fail = fail
+        self.output = output
+        self.report = report
+        self.lengths = [len(pattern) for pattern in self.patterns]
+        self.alphabet = frozenset(goto[0]).union(*goto)
+
+    def find(self, text):
+        """Return every ``(start, end, pattern index)`` occurrence, by end position."""
+        goto, fail, output, report, lengths = self.goto, self.fail, self.output, self.report, self.lengths
+        alphabet = self.alphabet
+        matches = []
+        node = 0
+        for position, char in enumerate(text):
+            if char not in alphabet:
+                node = 0
+                continue
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            found = report[node]
+            while found:
+                index = output[found]
+                matches.append((position + 1 - lengths[index], position + 1, index))
+                found = report[fail[found]]
+        return matches
+
+
+def leftmost_longest(matches):
+    """Drop matches overlapping an earlier-starting or longer one."""
+    selected = []
+    end = 0
+    for match in sorted(matches, key=lambda match: (match[0], -match[1])):
+        if match[0] >= end:
+            selected.append(match)
+            end = match[1]
+    return selected
+
+
+def _ascii_word(char):
+    return char.isascii() and char.isalnum()
+
+
+class AliasScanner:
+    def __init__(self, db_path, check_interval=1.0):
+        self.db_path = db_path
+        self.check_interval = check_interval
+        self._version = None
+        self._next_check = 0.0
+        self.load()
+
+    def load(self):
+        """(Re)build the automaton from the database."""
+        version = db_version(self.db_path)
+        conn = connect_readonly(self.db_path)
+        try:
+            names, forms, aliases = read_rows(conn)
+        finally:
+            conn.close()
+        table, _, _ = build_tables(names, forms, aliases)
+        keys = [key for key in table if key]
+        self.names = dict(names)
+        self.targets = [table[key] for key in keys]
+        # Whole-word flags for the start and end of purely ASCII keys
+        self.bounded = [(key.isascii() and _ascii_word(key[0]), key.isascii() and _ascii_word(key[-1]))
+                        for key in keys]
+        self.automaton = Automaton(keys)
+        self._version = version
+        self._next_check = time.monotonic() + self.check_interval
+
+    def reload_if_changed(self):
+        """Rebuild when the database changed. Returns True if rebuilt."""
+        if db_version(self.db_path) == self._version:
+            self._next_check = time.monotonic() + self.check_interval
+            return False
+        self.load()
+        return True
+
+    def _maybe_reload(self):
+        if time.monotonic() >= self._next_check:
+            self.reload_if_changed()
+
+    def _scan(self, text, overlapping):
+        folded = text.casefold()
+        if len(folded) == len(text):
+            positions = None
+        else:
+            # Some characters fold to several ("ß" -> "ss"); map spans back
+            positions = []
+            for index, char in enumerate(text):
+                positions.extend([index] * len(char.casefold()))
+            positions.append(len(text))
+
+        matches = []
+        for start, end, index in self.automaton.find(folded):
+            left, right = self.bounded[index]
+            if (left and start > 0 and _ascii_word(folded[start - 1])) or \
+                    (right and end < len(folded) and _ascii_word(folded[end])):
+                continue
+            matches.append((start, end, index))
+        if not overlapping:
+            matches = leftmost_longest(matches)
+        elif matches:
+            matches.sort()
+
+        results = []
+        for start, end, index in matches:
+            if positions is not None:
+                start, end = positions[start], positions[end - 1] + 1
+            ndex, form_id = self.targets[index]
+            results.append((ndex, form_id, (start, end)))
+        return results
+
+    def scan(self, text, overlapping=False):
+        """Return ``(NDEX_NUMBER, FORM_ID, (start, end))`` for each mention in `text`.
+
+        With `overlapping`, every occurrence of every key is returned.
+        """
+        self._maybe_reload()
+        return self._scan(text, overlapping)
+
+    def scan_many(self, texts, overlapping=False):
+        """Scan a batch of messages; the database is checked once per batch."""
+        self._maybe_reload()
+        return [self._scan(text, overlapping) for text in texts]
+
+    def name_of(self, ndex):
+        return self.names.get(ndex)
+
+    def __len__(self):
+        return len(self.targets)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="テキスト中のポケモン名・別名をすべて検出する")
+    parser.add_argument("--db", default=os.environ.get("POKEMON_DB", "pokemons.db"), help="データベースファイル")
+    parser.add_argument("--all", action="store_true", help="重なり合う一致もすべて表示")
+    args = parser.parse_args(argv)
+
+    scanner = AliasScanner(args.db)
+    for line_no, line in enumerate(sys.stdin, 1):
+        line = line.rstrip("\n")
+        for ndex, form_id, (start, end) in scanner.scan(line, overlapping=args.all):
+            print(f"{line_no}\t{start}\t{end}\t{line[start:end]}\t{ndex}\t{form_id}\t{scanner.name_of(ndex)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
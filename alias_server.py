@@ -0,0 +1,398 @@
+"""Read-only JSON lookup service over pokemons.db.
+
+Serves the same lookups as the editors so other services can resolve
+aliases without shipping their own copy of the database::
+
+    GET  /resolve?q=リザX                 -> {"query": ..., "match": {...} | null}
+    POST /resolve   {"queries": [...]}    -> {"results": [...]}
+    GET  /suggest?q=ぴか[&limit=10]       -> {"query": ..., "suggestions": [...]}
+    POST /suggest   {"queries": [...]}    -> {"results": [...]}
+    GET  /pokemon/6/aliases               -> {"ndex": 6, "name": ..., "forms": [...]}
+    POST /pokemon/aliases {"ndex": [...]} -> {"results": [...]}
+
+Requests are handled by a fixed pool of worker threads, each holding its own
+read-only connection. A keep-alive connection holds its worker only while it
+has requests to send: it is closed after IDLE_TIMEOUT seconds without one,
+and right away (with ``Connection: close``) while other connections are
+waiting for a worker. Responses are kept in an LRU cache; the cache, the
+in-memory indexes and the connections are dropped when the database file
+(or its -wal file, while an editor has it open) changes.
+
+Usage: python alias_server.py [--db pokemons.db] [--port 8080] [--workers 8]
+"""
+import argparse
+import json
+import os
+import select
+import sys
+import threading
+import time
+import traceback
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import instrumentation
+from alias_resolver import AliasResolver, connect_readonly, db_version
+from alias_store import FormTable, fetch_pokemon_aliases
+from autocomplete import AutocompleteIndex, SUGGEST_LIMIT
+
+DEFAULT_PORT = 8080
+DEFAULT_WORKERS = 8
+CACHE_SIZE = 4096
+CHECK_INTERVAL = 1.0
+# Upper bound on the queries accepted by one batch request
+MAX_BATCH = 1000
+MAX_BODY = 1 << 20
+# Seconds a keep-alive connection may wait for its next request
+IDLE_TIMEOUT = 5.0
+IDLE_POLL = 0.1
+
+
+class BadRequest(Exception):
+    pass
+
+
+class ResponseCache:
+    """Thread-safe LRU of encoded response bodies."""
+
+    def __init__(self, size=CACHE_SIZE):
+        self.size = size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            body = self._entries.get(key)
+            if body is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return body
+
+    def put(self, key, body):
+        if self.size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = body
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class AliasService:
+    """The lookups behind the HTTP endpoints, independent of the transport."""
+
+    def __init__(self, db_path, cache_size=CACHE_SIZE, check_interval=CHECK_INTERVAL):
+        self.db_path = db_path
+        self.check_interval = check_interval
+        self.cache = ResponseCache(cache_size)
+        self.generation = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._next_check = 0.0
+        self.reload()
+
+    def reload(self):
+        """Rebuild the in-memory indexes and retire the worker connections."""
+        version = db_version(self.db_path)
+        conn = connect_readonly(self.db_path)
+        try:
+            # One read transaction, so every index sees the same snapshot
+            conn.execute("BEGIN")
+            autocomplete = AutocompleteIndex()
+            autocomplete.load(conn)
+            forms = FormTable()
+            forms.load(conn)
+            # The service decides when to reload, so the resolver never checks on its own
+            resolver = AliasResolver(self.db_path, check_interval=float("inf"), conn=conn)
+            conn.rollback()
+        finally:
+            conn.close()
+        self.indexes = (resolver, autocomplete, forms)
+        self.version = version
+        self.generation += 1
+        self.cache.clear()
+
+    def check(self):
+        """Reload when the database changed; checked at most every `check_interval` seconds."""
+        if time.monotonic() < self._next_check:
+            return
+        with self._lock:
+            if time.monotonic() < self._next_check:
+                return
+            if db_version(self.db_path) != self.version:
+                self.reload()
+            self._next_check = time.monotonic() + self.check_interval
+
+    def connection(self):
+        """The calling worker's read-only connection, reopened after a reload."""
+        local = self._local
+        if getattr(local, "generation", None) != self.generation:
+            if getattr(local, "conn", None) is not None:
+                local.conn.close()
+            local.conn = connect_readonly(self.db_path)
+            local.generation = self.generation
+        return local.conn
+
+    def _match(self, ndex_number, form_id):
+        resolver, _, forms = self.indexes
+        return {"ndex": ndex_number, "form_id": form_id, "name": resolver.name_of(ndex_number),
+                "form": forms.label_for(ndex_number, form_id)}
+
+    @instrumentation.traced("serve_resolve")
+    def resolve(self, queries):
+        resolver = self.indexes[0]
+        return [self._match(*match) if match else None for match in resolver.resolve_many(queries)]
+
+    @instrumentation.traced("serve_suggest")
+    def suggest(self, queries, limit=SUGGEST_LIMIT):
+        autocomplete = self.indexes[1]
+        return [autocomplete.suggest(query)[:limit] for query in queries]
+
+    @instrumentation.traced("serve_aliases")
+    def aliases(self, ndex_numbers):
+        resolver, _, forms = self.indexes
+        cursor = self.connection().cursor()
+        results = []
+        for ndex_number in ndex_numbers:
+            name = resolver.name_of(ndex_number)
+            if name is None:
+                results.append(None)
+                continue
+            by_form = fetch_pokemon_aliases(cursor, ndex_number)
+            form_ids = list(dict.fromkeys(forms.mapping(ndex_number)[label] for label in forms.labels(ndex_number)))
+            form_ids += [form_id for form_id in by_form if form_id not in form_ids]
+            results.append({"ndex": ndex_number, "name": name, "forms": [
+                {"form_id": form_id, "label": forms.label_for(ndex_number, form_id),
+                 "aliases": by_form.get(form_id, [])} for form_id in form_ids]})
+        return results
+
+
+def _strings(payload, field):
+    values = payload.get(field) if isinstance(payload, dict) else None
+    if not isinstance(values, list) or not all(isinstance(value, str) for value in values):
+        raise BadRequest(f"'{field}' must be a list of strings")
+    if len(values) > MAX_BATCH:
+        raise BadRequest(f"at most {MAX_BATCH} entries per request")
+    return values
+
+
+def _ndex_numbers(payload):
+    values = payload.get("ndex") if isinstance(payload, dict) else None
+    # bool is a subclass of int, but true/false are not pokémon numbers
+    if not isinstance(values, list) or not all(isinstance(value, int) and not isinstance(value, bool)
+                                               for value in values):
+        raise BadRequest("'ndex' must be a list of integers")
+    if len(values) > MAX_BATCH:
+        raise BadRequest(f"at most {MAX_BATCH} entries per request")
+    return values
+
+
+def _limit(params):
+    try:
+        return max(0, min(int(params.get("limit", [SUGGEST_LIMIT])[0]), SUGGEST_LIMIT))
+    except ValueError:
+        raise BadRequest("'limit' must be an integer")
+
+
+def _query(params):
+    if "q" not in params:
+        raise BadRequest("missing query parameter 'q'")
+    return params["q"][0]
+
+
+def route(service, method, path, params, payload):
+    """Answer one request; returns ``(status, JSON-serializable body)``."""
+    parts = [part for part in path.split("/") if part]
+    if method == "GET":
+        if parts == ["resolve"]:
+            query = _query(params)
+            return 200, {"query": query, "match": service.resolve([query])[0]}
+        if parts == ["suggest"]:
+            query = _query(params)
+            return 200, {"query": query, "suggestions": service.suggest([query], _limit(params))[0]}
+        if len(parts) == 3 and parts[0] == "pokemon" and parts[2] == "aliases" and parts[1].isdigit():
+            result = service.aliases([int(parts[1])])[0]
+            if result is None:
+                return 404, {"error": f"no pokémon with NDEX_NUMBER {parts[1]}"}
+            return 200, result
+    elif method == "POST":
+        if parts == ["resolve"]:
+            return 200, {"results": service.resolve(_strings(payload, "queries"))}
+        if parts == ["suggest"]:
+            return 200, {"results": service.suggest(_strings(payload, "queries"), _limit(params))}
+        if parts == ["pokemon", "aliases"]:
+            return 200, {"results": service.aliases(_ndex_numbers(payload))}
+    return 404, {"error": f"unknown endpoint {method} {path}"}
+
+
+class AliasRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so a client reuses its connection
+    timeout = 10  # for reading a request that has started; idle waits use IDLE_TIMEOUT
+    # Headers and body are separate writes; with Nagle each response waits for a delayed ACK
+    disable_nagle_algorithm = True
+
+    def handle(self):
+        self.close_connection = True
+        self.handle_one_request()
+        while not self.close_connection and self._wait_for_request():
+            self.handle_one_request()
+
+    def _wait_for_request(self):
+        """True when the next request arrives before the idle timeout and no
+        other connection is waiting for this worker."""
+        deadline = time.monotonic() + IDLE_TIMEOUT
+        while not self.server.saturated():
+            if self._buffered():
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            readable, _, _ = select.select([self.connection], [], [], min(IDLE_POLL, remaining))
+            if readable:
+                return True
+        return False
+
+    def _buffered(self):
+        # A pipelined request may already sit in rfile's buffer, invisible to select
+        self.connection.setblocking(False)
+        try:
+            return bool(self.rfile.peek(1))
+        except (BlockingIOError, ValueError, TypeError):
+            return False
+        finally:
+            self.connection.settimeout(self.timeout)
+
+    def do_GET(self):
+        self.respond("GET", b"")
+
+    def do_POST(self):
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            self.send_body(400, {"error": "invalid Content-Length"})
+            self.close_connection = True
+            return
+        if length > MAX_BODY:
+            self.send_body(413, {"error": "request body too large"})
+            self.close_connection = True
+            return
+        self.respond("POST", self.rfile.read(length))
+
+    def respond(self, method, body):
+        service = self.server.service
+        service.check()
+        # A response computed on indexes that were replaced meanwhile is stored
+        # under the old generation, where no later request looks it up
+        key = (service.generation, method, self.path, body)
+        cached = service.cache.get(key)
+        if cached is not None:
+            self.send_encoded(200, cached)
+            return
+        url = urlsplit(self.path)
+        try:
+            payload = json.loads(body) if body else None
+            status, result = route(service, method, url.path, parse_qs(url.query), payload)
+        except (BadRequest, ValueError) as e:
+            status, result = 400, {"error": str(e)}
+        except Exception:
+            self.log_error("%s %s failed", method, self.path)
+            traceback.print_exc()
+            status, result = 500, {"error": "internal server error"}
+        encoded = json.dumps(result, ensure_ascii=False).encode("utf-8")
+        if status == 200:
+            service.cache.put(key, encoded)
+        self.send_encoded(status, encoded)
+
+    def send_body(self, status, result):
+        self.send_encoded(status, json.dumps(result, ensure_ascii=False).encode("utf-8"))
+
+    def send_encoded(self, status, encoded):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(encoded)))
+        if self.server.saturated():
+            # Hand the worker to a waiting connection; the client reconnects
+            self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(encoded)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def log_error(self, format, *args):
+        # Errors are logged even without --verbose
+        super().log_message(format, *args)
+
+
+class AliasHTTPServer(ThreadingHTTPServer):
+    """HTTP server handing connections to a fixed pool of worker threads."""
+
+    def __init__(self, address, service, workers=DEFAULT_WORKERS, verbose=False):
+        super().__init__(address, AliasRequestHandler)
+        self.service = service
+        self.verbose = verbose
+        self.workers = workers
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="alias-worker")
+        self.connections = 0  # accepted and not yet closed, including those waiting for a worker
+        self._connections_lock = threading.Lock()
+
+    def saturated(self):
+        """True while some connection is waiting for a free worker."""
+        return self.connections > self.workers
+
+    def process_request(self, request, client_address):
+        with self._connections_lock:
+            self.connections += 1
+        self.executor.submit(self._process, request, client_address)
+
+    def _process(self, request, client_address):
+        try:
+            self.process_request_thread(request, client_address)
+        finally:
+            with self._connections_lock:
+                self.connections -= 1
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(wait=False)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="pokemons.db の別名を検索する読み取り専用のJSONサーバー")
+    parser.add_argument("--db", default=os.environ.get("POKEMON_DB", "pokemons.db"), help="データベースファイル")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="ワーカースレッド数")
+    parser.add_argument("--cache-size", type=int, default=CACHE_SIZE, help="キャッシュする応答の数 (0で無効)")
+    parser.add_argument("-v", "--verbose", action="store_true", help="リクエストごとにログを出力")
+    args = parser.parse_args(argv)
+
+    instrumentation.enable_from_env()
+    service = AliasService(args.db, cache_size=args.cache_size)
+    server = AliasHTTPServer((args.host, args.port), service, workers=args.workers, verbose=args.verbose)
+    print(f"http://{args.host}:{server.server_address[1]}/ で待機しています (Ctrl+Cで終了)", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
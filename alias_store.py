@@ -0,0 +1,163 @@
+"""Data layer shared by the GUIs, the command-line tools and the benchmarks.
+
+A pokémon's forms are shown to editors as labels: "基本" for the base form,
+otherwise the FORM_NAME or GENDER of a POKEMON_NAME_FORM row. The query
+functions below are the ones `PokemonAliasManager` runs; they take a cursor
+and never touch tkinter, so they can be timed without a display.
+"""
+
+from instrumentation import traced
+
+BASE_FORM_LABEL = "基本"
+
+
+def form_labels(form_rows):
+    """Return the labels shown in the form menu for one pokémon.
+
+    `form_rows` are ``(FORM_ID, FORM_NAME, GENDER)`` tuples.
+    """
+    forms = []
+    form_exists = False
+
+    for form_id, form_name, gender in form_rows:
+        if form_id == 0:
+            form_exists = True
+            if form_name is None and gender is None:
+                forms.append(BASE_FORM_LABEL)
+            elif form_name is not None:
+                forms.append(form_name)
+            elif gender is not None:
+                forms.append(gender)
+        else:
+            if form_name is not None:
+                forms.append(form_name)
+            if gender is not None:
+                forms.append(gender)
+
+    if not form_exists:
+        forms.append(BASE_FORM_LABEL)
+    return forms
+
+
+def form_id_map(form_rows):
+    """Map every label of one pokémon to its FORM_ID.
+
+    Mirrors ``(FORM_NAME = ? OR GENDER = ?)``: the first row in FORM_ID order
+    wins when a label is shared by several forms.
+    """
+    mapping = {}
+    for form_id, form_name, gender in sorted(form_rows, key=lambda row: row[0]):
+        if form_name is not None:
+            mapping.setdefault(form_name, form_id)
+        if gender is not None:
+            mapping.setdefault(gender, form_id)
+    mapping[BASE_FORM_LABEL] = 0
+    return mapping
+
+
+class FormTable:
+    """Form labels of every pokémon, loaded with a single query.
+
+    Labels come back in menu order without duplicates and resolve to a
+    FORM_ID with one dict lookup. The editors never change
+    POKEMON_NAME_FORM, so the table only needs reloading when the
+    connection is replaced by another copy of the database.
+    """
+
+    def __init__(self):
+        self.forms = {}  # NDEX_NUMBER -> (labels, {label: FORM_ID}, {FORM_ID: label})
+        self.artworks = {}  # (NDEX_NUMBER, FORM_ID) -> ARTWORK_FILENAME
+
+    @traced("load_forms")
+    def load(self, conn):
+        rows = {}
+        self.artworks = {}
+        for ndex, form_id, form_name, gender, artwork in conn.execute("""
+                SELECT NDEX_NUMBER, FORM_ID, FORM_NAME, GENDER, ARTWORK_FILENAME FROM POKEMON_NAME_FORM
+                ORDER BY NDEX_NUMBER, FORM_ID, GENDER"""):
+            rows.setdefault(ndex, []).append((form_id, form_name, gender))
+            if artwork:
+                self.artworks.setdefault((ndex, form_id), artwork)
+        self.forms = {}
+        for ndex, form_rows in rows.items():
+            labels = list(dict.fromkeys(form_labels(form_rows)))
+            mapping = form_id_map(form_rows)
+            reverse = {}
+            for label in labels:
+                reverse.setdefault(mapping[label], label)
+            self.forms[ndex] = (labels, mapping, reverse)
+        return len(self.forms)
+
+    def _entry(self, ndex_number):
+        return self.forms.get(ndex_number) or _BASE_ONLY
+
+    def labels(self, ndex_number):
+        return list(self._entry(ndex_number)[0])
+
+    def mapping(self, ndex_number):
+        return self._entry(ndex_number)[1]
+
+    def form_id(self, ndex_number, label):
+        """Resolve a form label to its FORM_ID, falling back to the base form."""
+        return self._entry(ndex_number)[1].get(label, 0)
+
+    def label_for(self, ndex_number, form_id):
+        """Reverse of `form_id`; "" for a FORM_ID without a label."""
+        return self._entry(ndex_number)[2].get(form_id, "")
+
+    def artwork(self, ndex_number, form_id):
+        """ARTWORK_FILENAME of a form, falling back to the "NNNN_FF" naming the table uses."""
+        return self.artworks.get((ndex_number, form_id)) or f"{ndex_number:04d}_{form_id:02d}"
+
+
+_BASE_ONLY = ([BASE_FORM_LABEL], {BASE_FORM_LABEL: 0}, {0: BASE_FORM_LABEL})
+
+
+@traced("load_pokemon", rows=lambda ndex_number: int(ndex_number is not None))
+def ndex_for_name(cursor, name):
+    """Return the NDEX_NUMBER of the pokémon called `name`, or None."""
+    cursor.execute("SELECT NDEX_NUMBER FROM POKEMON_NAME WHERE NAME = ?", (name,))
+    result = cursor.fetchone()
+    return result[0] if result else None
+
+
+@traced("list_aliases")
+def fetch_aliases(cursor, ndex_number, form_id):
+    """Return the aliases registered for one pokémon and form, in index order."""
+    cursor.execute("SELECT NAME_ALIAS FROM POKEMON_NAME_ALIAS WHERE NDEX_NUMBER = ? AND FORM_ID = ?",
+                   (ndex_number, form_id))
+    return [alias[0] for alias in cursor.fetchall()]
+
+
+@traced("list_pokemon_aliases")
+def fetch_pokemon_aliases(cursor, ndex_number):
+    """Return ``{FORM_ID: [alias, ...]}`` for every form of one pokémon."""
+    cursor.execute("SELECT FORM_ID, NAME_ALIAS FROM POKEMON_NAME_ALIAS WHERE NDEX_NUMBER = ? ORDER BY FORM_ID",
+                   (ndex_number,))
+    aliases = {}
+    for form_id, alias in cursor.fetchall():
+        aliases.setdefault(form_id, []).append(alias)
+    return aliases
+
+
+@traced("add_alias")
+def insert_alias(cursor, ndex_number, form_id, alias):
+    """Insert one alias; raises sqlite3.IntegrityError when it already exists."""
+    cursor.execute("INSERT INTO POKEMON_NAME_ALIAS (NAME_ALIAS, NDEX_NUMBER, FORM_ID) VALUES (?, ?, ?)",
+                   (alias, ndex_number, form_id))
+
+
+@traced("edit_alias")
+def rename_alias(cursor, ndex_number, form_id, old_alias, new_alias):
+    """Rename one alias and return the number of rows changed."""
+    cursor.execute("UPDATE POKEMON_NAME_ALIAS SET NAME_ALIAS = ? WHERE NAME_ALIAS = ? AND NDEX_NUMBER = ? AND FORM_ID = ?",
+                   (new_alias, old_alias, ndex_number, form_id))
+    return cursor.rowcount
+
+
+@traced("delete_alias")
+def delete_alias(cursor, ndex_number, form_id, alias):
+    """Delete one alias and return the number of rows removed."""
+    cursor.execute("DELETE FROM POKEMON_NAME_ALIAS WHERE NAME_ALIAS = ? AND NDEX_NUMBER = ? AND FORM_ID = ?",
+                   (alias, ndex_number, form_id))
+    return cursor.rowcount
@@ -0,0 +1,141 @@
+"""Virtualized alias list for the editors.
+
+`AliasListView` keeps the aliases of the selected form in a sorted Python
+list and renders only the rows that fit in the listbox, so a form with
+thousands of aliases costs the same to show and scroll as one with ten.
+Edits patch the list with ``bisect`` instead of re-querying; the sort order
+is the one ``fetch_aliases`` returns through the unique alias index. Any
+number of changes within one event-loop turn is rendered once, from
+``after_idle``.
+"""
+import bisect
+import tkinter as tk
+
+
+class AliasListView:
+    def __init__(self, parent, height=10, width=20):
+        self.frame = tk.Frame(parent)
+        self.listbox = tk.Listbox(self.frame, height=height, width=width, exportselection=False,
+                                  activestyle=tk.NONE)
+        self.scrollbar = tk.Scrollbar(self.frame, orient=tk.VERTICAL, command=self.yview)
+        self.listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.rows = height
+        self.items = []
+        self.key = None  # (NDEX_NUMBER, FORM_ID) the items belong to
+        self.top = 0
+        self.selection = None  # index into items
+        self._rendered = None
+        self._render_job = None
+
+        self.listbox.bind("<<ListboxSelect>>", self._on_select)
+        self.listbox.bind("<MouseWheel>", self._on_wheel)
+        self.listbox.bind("<Button-4>", lambda event: self.yview("scroll", -1, "units"))
+        self.listbox.bind("<Button-5>", lambda event: self.yview("scroll", 1, "units"))
+        self.listbox.bind("<Up>", lambda event: self._move(-1))
+        self.listbox.bind("<Down>", lambda event: self._move(1))
+        self.listbox.bind("<Prior>", lambda event: self._move(-self.rows))
+        self.listbox.bind("<Next>", lambda event: self._move(self.rows))
+
+    def grid(self, **kwargs):
+        self.frame.grid(**kwargs)
+
+    def bind(self, sequence, func):
+        self.listbox.bind(sequence, func)
+
+    def set_items(self, key, items):
+        """Show a fresh result set, scrolled to the top."""
+        self.key = key
+        self.items = sorted(items)
+        self.top = 0
+        self.selection = None
+        self._schedule_render()
+
+    def clear(self):
+        self.set_items(None, [])
+
+    def add(self, item):
+        index = bisect.bisect_left(self.items, item)
+        if index < len(self.items) and self.items[index] == item:
+            return
+        self.items.insert(index, item)
+        # Keep the visible rows in place when the change is above them
+        if index < self.top:
+            self.top += 1
+        if self.selection is not None and index <= self.selection:
+            self.selection += 1
+        self._schedule_render()
+
+    def remove(self, item):
+        index = bisect.bisect_left(self.items, item)
+        if index == len(self.items) or self.items[index] != item:
+            return
+        del self.items[index]
+        if index < self.top:
+            self.top -= 1
+        if self.selection == index:
+            self.selection = None
+        elif self.selection is not None and index < self.selection:
+            self.selection -= 1
+        self._schedule_render()
+
+    def selected(self):
+        """The selected alias, or None."""
+        return self.items[self.selection] if self.selection is not None else None
+
+    def yview(self, *args):
+        """Scrollbar command: ``moveto fraction`` or ``scroll n units|pages``."""
+        if args[0] == "moveto":
+            top = int(float(args[1]) * len(self.items))
+        else:
+            step = int(args[1])
+            top = self.top + (step * self.rows if args[2] == "pages" else step)
+        self._scroll_to(top)
+
+    def _scroll_to(self, top):
+        top = max(0, min(top, len(self.items) - self.rows))
+        if top != self.top:
+            self.top = top
+            self._schedule_render()
+
+    def _move(self, step):
+        if not self.items:
+            return "break"
+        index = 0 if self.selection is None else max(0, min(self.selection + step, len(self.items) - 1))
+        self.selection = index
+        if index < self.top:
+            self._scroll_to(index)
+        elif index >= self.top + self.rows:
+            self._scroll_to(index - self.rows + 1)
+        self._schedule_render()
+        return "break"
+
+    def _on_wheel(self, event):
+        self.yview("scroll", -1 if event.delta > 0 else 1, "units")
+        return "break"
+
+    def _on_select(self, event):
+        selection = self.listbox.curselection()
+        if selection:
+            self.selection = self.top + selection[0]
+
+    def _schedule_render(self):
+        if self._render_job is None:
+            self._render_job = self.listbox.after_idle(self.render)
+
+    def render(self):
+        self._render_job = None
+        self.top = max(0, min(self.top, len(self.items) - self.rows))
+        window = self.items[self.top:self.top + self.rows]
+        if window != self._rendered:
+            self.listbox.delete(0, tk.END)
+            if window:
+                self.listbox.insert(tk.END, *window)
+            self._rendered = window
+        self.listbox.selection_clear(0, tk.END)
+        if self.selection is not None and self.top <= self.selection < self.top + self.rows:
+            self.listbox.selection_set(self.selection - self.top)
+        if self.items:
+            self.scrollbar.set(self.top / len(self.items), min(1.0, (self.top + self.rows) / len(self.items)))
+        else:
+            self.scrollbar.set(0.0, 1.0)
@@ -0,0 +1,255 @@
+"""Form artwork thumbnails for the editors, loaded off the Tk thread.
+
+`POKEMON_NAME_FORM.ARTWORK_FILENAME` names a file without extension in a
+local asset directory (``POKEMON_ARTWORK_DIR``, ``artwork`` by default).
+Worker threads find, decode and downscale the file and keep the thumbnail
+as PNG in an on-disk cache keyed by the file's path, size and mtime, so an
+artwork is decoded at full size only once. The main thread turns the small
+PNG into a ``PhotoImage`` and keeps the most recent ones in a memory LRU.
+
+Decoding needs the optional ``Pillow`` package for anything but PNG and
+GIF. Without it the original file is read on the worker and downscaled with
+``PhotoImage.subsample`` on the main thread the first time only; the result
+is then written to the disk cache.
+"""
+import base64
+import hashlib
+import io
+import itertools
+import math
+import os
+import queue
+import threading
+import tkinter as tk
+from collections import OrderedDict
+
+from drive_cache import DEFAULT_CACHE_DIR
+
+DEFAULT_ARTWORK_DIR = "artwork"
+DEFAULT_THUMBNAIL_DIR = os.path.join(DEFAULT_CACHE_DIR, "thumbnails")
+THUMBNAIL_SIZE = 160
+MEMORY_ITEMS = 128
+WORKERS = 2
+POLL_MS = 30
+# Forms on each side of the shown one that are loaded ahead of time
+PREFETCH_FORMS = 2
+
+VISIBLE, PREFETCH = 0, 1
+MISSING, THUMBNAIL, ORIGINAL = "missing", "thumbnail", "original"
+
+
+def _pil():
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    return Image
+
+
+def artwork_dir():
+    return os.environ.get("POKEMON_ARTWORK_DIR") or DEFAULT_ARTWORK_DIR
+
+
+def extensions():
+    """File extensions tried in order; Tk itself only reads PNG and GIF."""
+    if _pil() is None:
+        return (".png", ".gif")
+    return (".png", ".webp", ".jpg", ".jpeg", ".gif")
+
+
+def find_artwork(directory, filename):
+    for extension in ("",) + extensions():
+        path = os.path.join(directory, filename + extension)
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def make_thumbnail(path, size):
+    """PNG bytes of `path` scaled to fit `size`x`size` with Pillow."""
+    Image = _pil()
+    with Image.open(path) as image:
+        image.draft("RGB", (size, size))  # lets JPEG decode at a reduced scale
+        image.thumbnail((size, size))
+        out = io.BytesIO()
+        image.save(out, format="PNG")
+    return out.getvalue()
+
+
+def _write_atomic(path, data):
+    part = path + ".part"
+    with open(part, "wb") as f:
+        f.write(data)
+    os.replace(part, path)
+
+
+class ArtworkLoader:
+    """Loads thumbnails on worker threads and hands ``PhotoImage``s to the main thread.
+
+    Visible requests are served before prefetches. Results are collected
+    with ``root.after`` polling, only while requests are outstanding.
+    """
+
+    def __init__(self, root, directory=None, cache_dir=DEFAULT_THUMBNAIL_DIR, size=THUMBNAIL_SIZE,
+                 memory_items=MEMORY_ITEMS, workers=WORKERS, poll_ms=POLL_MS):
+        self.root = root
+        self.directory = directory or artwork_dir()
+        self.cache_dir = cache_dir
+        self.size = size
+        self.memory_items = memory_items
+        self.workers = workers
+        self.poll_ms = poll_ms
+        self.images = OrderedDict()  # filename -> PhotoImage, or None when there is no artwork
+        self.callbacks = {}  # filename -> callbacks waiting for it
+        self.pending = {}  # filename -> best priority requested
+        self.requests = queue.PriorityQueue()
+        self.results = queue.Queue()
+        self.threads = []
+        self._order = itertools.count()
+        self._polling = False
+
+    def get(self, filename, callback):
+        """Call ``callback(photo)`` with the thumbnail, right away when it is in memory."""
+        if filename in self.images:
+            self.images.move_to_end(filename)
+            callback(self.images[filename])
+            return
+        self.callbacks.setdefault(filename, []).append(callback)
+        self._submit(filename, VISIBLE)
+
+    def prefetch(self, filenames):
+        for filename in filenames:
+            if filename not in self.images:
+                self._submit(filename, PREFETCH)
+
+    def close(self):
+        for _ in self.threads:
+            self.requests.put((-1, next(self._order), None))
+        self.threads = []
+
+    def _submit(self, filename, priority):
+        if self.pending.get(filename, PREFETCH + 1) <= priority:
+            return
+        # A prefetch already queued is queued again ahead of the others; the
+        # second load is a disk cache hit
+        self.pending[filename] = priority
+        self.requests.put((priority, next(self._order), filename))
+        while len(self.threads) < self.workers:
+            thread = threading.Thread(target=self._work, daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        if not self._polling:
+            self._polling = True
+            self.root.after(self.poll_ms, self._poll)
+
+    def _work(self):
+        # Runs on a worker thread: files and bytes only, never tkinter
+        while True:
+            _, _, filename = self.requests.get()
+            if filename is None:
+                return
+            try:
+                result = self._load(filename)
+            except Exception:
+                result = (MISSING, None, None)
+            self.results.put((filename,) + result)
+
+    def _load(self, filename):
+        path = find_artwork(self.directory, filename)
+        if path is None:
+            return MISSING, None, None
+        stat = os.stat(path)
+        key = hashlib.sha1(f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}:{self.size}"
+                           .encode("utf-8")).hexdigest()
+        cached = os.path.join(self.cache_dir, key + ".png")
+        try:
+            with open(cached, "rb") as f:
+                return THUMBNAIL, f.read(), None
+        except OSError:
+            pass
+        if _pil() is None:
+            with open(path, "rb") as f:
+                return ORIGINAL, f.read(), cached
+        data = make_thumbnail(path, self.size)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            _write_atomic(cached, data)
+        except OSError:
+            pass
+        return THUMBNAIL, data, None
+
+    def _photo(self, kind, data, cached):
+        if kind == MISSING:
+            return None
+        try:
+            photo = tk.PhotoImage(data=base64.b64encode(data))
+        except tk.TclError:
+            return None
+        if kind == ORIGINAL:
+            factor = math.ceil(max(photo.width(), photo.height()) / self.size)
+            if factor > 1:
+                photo = photo.subsample(factor)
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                photo.write(cached + ".part", format="png")
+                os.replace(cached + ".part", cached)
+            except (OSError, tk.TclError):
+                pass
+        return photo
+
+    def _poll(self):
+        while True:
+            try:
+                filename, kind, data, cached = self.results.get_nowait()
+            except queue.Empty:
+                break
+            if filename not in self.images:
+                self.images[filename] = self._photo(kind, data, cached)
+                while len(self.images) > self.memory_items:
+                    self.images.popitem(last=False)
+            self.pending.pop(filename, None)
+            for callback in self.callbacks.pop(filename, []):
+                callback(self.images[filename])
+        if self.pending:
+            self.root.after(self.poll_ms, self._poll)
+        else:
+            self._polling = False
+
+
+class ArtworkPanel:
+    """Label showing the selected form's artwork; the neighbouring forms are prefetched."""
+
+    def __init__(self, parent, forms, loader):
+        self.forms = forms
+        self.loader = loader
+        self.label = tk.Label(parent, text="", width=THUMBNAIL_SIZE // 8, compound=tk.CENTER)
+        self.filename = None
+        self.photo = None
+
+    def grid(self, **kwargs):
+        self.label.grid(**kwargs)
+
+    def show(self, ndex_number, form_label):
+        labels = self.forms.labels(ndex_number)
+        form_id = self.forms.form_id(ndex_number, form_label)
+        self.filename = self.forms.artwork(ndex_number, form_id)
+        self.label.config(image="", text="読み込み中...", width=THUMBNAIL_SIZE // 8)
+        self.loader.get(self.filename, lambda photo, filename=self.filename: self._loaded(filename, photo))
+
+        if form_label in labels:
+            index = labels.index(form_label)
+            nearby = labels[index + 1:index + 1 + PREFETCH_FORMS] + labels[max(0, index - PREFETCH_FORMS):index]
+            filenames = dict.fromkeys(self.forms.artwork(ndex_number, self.forms.form_id(ndex_number, label))
+                                      for label in nearby)
+            filenames.pop(self.filename, None)
+            self.loader.prefetch(filenames)
+
+    def _loaded(self, filename, photo):
+        if filename != self.filename:
+            return  # another form was selected meanwhile
+        self.photo = photo
+        if photo is None:
+            self.label.config(image="", text="画像なし", width=THUMBNAIL_SIZE // 8)
+        else:
+            # With an image the width is in pixels
+            self.label.config(image=photo, text="", width=photo.width())
@@ -0,0 +1,162 @@
+"""In-memory autocomplete index over pokémon names and aliases."""
+from instrumentation import traced
+from normalize import query_keys, search_key
+
+SUGGEST_LIMIT = 30
+SUGGEST_DELAY_MS = 150
+# Typo tolerance: bigram overlap (Dice coefficient) needed for a fuzzy match
+FUZZY_MIN_LENGTH = 3
+FUZZY_MIN_SIMILARITY = 0.5
+
+# Match kinds, best first
+EXACT, PREFIX, INFIX, FUZZY = 0, 1, 2, 3
+
+
+def _bigrams(key):
+    return {key[i:i + 2] for i in range(len(key) - 1)}
+
+
+class AutocompleteIndex:
+    """Bigram index answering prefix and infix queries without touching SQLite.
+
+    Each entry is a searchable key (an official name or an alias) pointing
+    at the official pokémon name that should appear in the combobox. Keys
+    are normalized once when indexed (see normalize.py); when too few keys
+    contain the query, entries sharing enough bigrams with it are suggested
+    after the substring matches.
+    """
+
+    def __init__(self, limit=SUGGEST_LIMIT):
+        self.limit = limit
+        self.clear()
+
+    def clear(self):
+        self.entries = {}  # entry id -> (key, name, ndex, is_alias)
+        self.by_alias = {}  # (alias, ndex) -> [entry id, ...]
+        self.chars = {}  # single character -> set of entry ids
+        self.grams = {}  # bigram -> set of entry ids
+        self.names = []  # official names in NDEX order, for empty queries
+        self.name_by_ndex = {}
+        self._next_id = 0
+
+    @traced("autocomplete_load", rows=lambda result: None)
+    def load(self, conn):
+        """Rebuild the index from POKEMON_NAME and POKEMON_NAME_ALIAS."""
+        self.clear()
+        cursor = conn.cursor()
+        cursor.execute("SELECT NDEX_NUMBER, NAME FROM POKEMON_NAME ORDER BY NDEX_NUMBER")
+        for ndex, name in cursor.fetchall():
+            self.name_by_ndex[ndex] = name
+            self.names.append(name)
+            self._add(name, name, ndex, False)
+        cursor.execute("SELECT NAME_ALIAS, NDEX_NUMBER FROM POKEMON_NAME_ALIAS")
+        for alias, ndex in cursor.fetchall():
+            self.add_alias(alias, ndex)
+
+    def _add(self, text, name, ndex, is_alias):
+        key = search_key(text)
+        entry_id = self._next_id
+        self._next_id += 1
+        self.entries[entry_id] = (key, name, ndex, is_alias)
+        for char in set(key):
+            self.chars.setdefault(char, set()).add(entry_id)
+        for gram in _bigrams(key):
+            self.grams.setdefault(gram, set()).add(entry_id)
+        return entry_id
+
+    def _remove(self, entry_id):
+        key = self.entries.pop(entry_id)[0]
+        for char in set(key):
+            self.chars[char].discard(entry_id)
+        for gram in _bigrams(key):
+            self.grams[gram].discard(entry_id)
+
+    def add_alias(self, alias, ndex):
+        """Index a new alias for the pokémon with the given NDEX number."""
+        name = self.name_by_ndex.get(ndex)
+        if name is None or not alias:
+            return
+        entry_id = self._add(alias, name, ndex, True)
+        self.by_alias.setdefault((alias, ndex), []).append(entry_id)
+
+    def remove_alias(self, alias, ndex):
+        """Drop one indexed occurrence of an alias."""
+        ids = self.by_alias.get((alias, ndex))
+        if ids:
+            self._remove(ids.pop())
+            if not ids:
+                del self.by_alias[(alias, ndex)]
+
+    def rename_alias(self, old_alias, new_alias, ndex):
+        self.remove_alias(old_alias, ndex)
+        self.add_alias(new_alias, ndex)
+
+    def _candidates(self, query):
+        if len(query) == 1:
+            return self.chars.get(query, ())
+        postings = []
+        for gram in _bigrams(query):
+            ids = self.grams.get(gram)
+            if not ids:
+                return ()
+            postings.append(ids)
+        postings.sort(key=len)
+        result = set(postings[0])
+        for ids in postings[1:]:
+            result &= ids
+            if not result:
+                break
+        return result
+
+    @traced("suggest_fuzzy")
+    def _fuzzy(self, query, best):
+        """Add entries whose bigrams overlap the query enough to `best`."""
+        query_grams = _bigrams(query)
+        shared = {}
+        for gram in query_grams:
+            for entry_id in self.grams.get(gram, ()):
+                shared[entry_id] = shared.get(entry_id, 0) + 1
+        # Dice >= threshold needs at least this many shared bigrams
+        needed = FUZZY_MIN_SIMILARITY * len(query_grams) / 2
+        for entry_id, count in shared.items():
+            if count < needed:
+                continue
+            key, name, ndex, is_alias = self.entries[entry_id]
+            similarity = 2 * count / (len(query_grams) + len(_bigrams(key)))
+            if similarity < FUZZY_MIN_SIMILARITY:
+                continue
+            score = (FUZZY, -similarity, is_alias, 0, len(key), ndex)
+            if name not in best or score < best[name]:
+                best[name] = score
+
+    @traced("suggest")
+    def suggest(self, typed):
+        """Return official names matching `typed`, best matches first."""
+        queries = query_keys(typed.strip())
+        if not queries:
+            return self.names[:self.limit]
+
+        best = {}
+        for query in queries:
+            for entry_id in self._candidates(query):
+                key, name, ndex, is_alias = self.entries[entry_id]
+                pos = key.find(query)
+                if pos < 0:
+                    continue
+                if key == query:
+                    kind = EXACT
+                elif pos == 0:
+                    kind = PREFIX
+                else:
+                    kind = INFIX
+                score = (kind, is_alias, pos, len(key), ndex)
+                if name not in best or score < best[name]:
+                    best[name] = score
+
+        if len(best) < self.limit:
+            for query in queries:
+                if len(query) >= FUZZY_MIN_LENGTH:
+                    self._fuzzy(query, best)
+
+        ranked = sorted(best, key=best.__getitem__)
+        return ranked[:self.limit]
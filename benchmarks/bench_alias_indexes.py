@@ -0,0 +1,66 @@
+"""Compare alias lookups before and after the schema migrations.
+
+Usage: python -m benchmarks.bench_alias_indexes [--aliases 200000] [--lookups 200]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from benchmarks.synthetic import create_database
+from migrations import migrate
+
+QUERIES = {
+    "update_alias_list": (
+        "SELECT NAME_ALIAS FROM POKEMON_NAME_ALIAS WHERE NDEX_NUMBER = ? AND FORM_ID = ?",
+        lambda row: (row[0], row[1])),
+    "delete_alias": (
+        "SELECT COUNT(*) FROM POKEMON_NAME_ALIAS WHERE NAME_ALIAS = ? AND NDEX_NUMBER = ? AND FORM_ID = ?",
+        lambda row: (row[2], row[0], row[1])),
+    "resolve_alias": (
+        "SELECT NDEX_NUMBER, FORM_ID FROM POKEMON_NAME_ALIAS WHERE NAME_ALIAS = ?",
+        lambda row: (row[2],)),
+}
+
+
+def time_queries(conn, samples):
+    results = {}
+    for label, (sql, params) in QUERIES.items():
+        start = time.perf_counter()
+        for row in samples:
+            conn.execute(sql, params(row)).fetchall()
+        results[label] = (time.perf_counter() - start) / len(samples)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--aliases", type=int, default=200000)
+    parser.add_argument("--lookups", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        conn = create_database(path, aliases=args.aliases, duplicate_rate=0.01, seed=args.seed)
+        rows = conn.execute("SELECT NDEX_NUMBER, FORM_ID, NAME_ALIAS FROM POKEMON_NAME_ALIAS").fetchall()
+        samples = random.Random(args.seed).sample(rows, min(args.lookups, len(rows)))
+
+        before = time_queries(conn, samples)
+        start = time.perf_counter()
+        migrate(conn)
+        migration_time = time.perf_counter() - start
+        after = time_queries(conn, samples)
+        remaining = conn.execute("SELECT COUNT(*) FROM POKEMON_NAME_ALIAS").fetchone()[0]
+        conn.close()
+
+    print(f"aliases: {len(rows)} -> {remaining} after dedupe, migration {migration_time * 1000:.1f} ms")
+    print(f"{'query':<20}{'before (ms)':>14}{'after (ms)':>14}{'speedup':>10}")
+    for label in QUERIES:
+        speedup = before[label] / after[label] if after[label] else float("inf")
+        print(f"{label:<20}{before[label] * 1000:>14.3f}{after[label] * 1000:>14.3f}{speedup:>9.0f}x")
+
+
+if __name__ == "__main__":
+    main()
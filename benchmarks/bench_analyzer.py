@@ -0,0 +1,66 @@
+"""Time alias_analyzer on a large synthetic alias table with injected problems.
+
+Besides the random duplicates from `create_database`, rows with missing
+pokémon, missing forms, blank aliases and other pokémon's names are added.
+The analysis and the fix are timed, and a second analysis checks that only
+the kinds needing a human decision are left.
+
+Usage: python -m benchmarks.bench_analyzer [--aliases 2000000]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from alias_analyzer import FIXABLE, analyze, apply_fixes
+from benchmarks.synthetic import create_database
+
+
+def inject_problems(conn, count, rng):
+    names = conn.execute("SELECT NDEX_NUMBER, NAME FROM POKEMON_NAME").fetchall()
+    rows = []
+    for i in range(count):
+        ndex, name = rng.choice(names)
+        other = rng.choice(names)[1]
+        rows += [(100000 + i, 0, f"ゆうれい{i}"),
+                 (ndex, 99, f"きえたすがた{i}"),
+                 (ndex, 0, " "),
+                 (ndex, 0, other if other != name else f"べつ{i}")]
+    conn.executemany("INSERT INTO POKEMON_NAME_ALIAS (NDEX_NUMBER, FORM_ID, NAME_ALIAS) VALUES (?, ?, ?)", rows)
+    conn.commit()
+    return len(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--aliases", type=int, default=2000000)
+    parser.add_argument("--problems", type=int, default=1000, help="種類ごとに追加する問題のある行の数")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        conn = create_database(path, aliases=args.aliases, duplicate_rate=0.01, seed=args.seed)
+        injected = inject_problems(conn, args.problems, random.Random(args.seed))
+
+        start = time.perf_counter()
+        report = analyze(conn)
+        analyze_time = time.perf_counter() - start
+        start = time.perf_counter()
+        apply_fixes(conn, report)
+        fix_time = time.perf_counter() - start
+        after = analyze(conn)
+        conn.close()
+
+    print(f"aliases: {report.rows} rows ({injected} injected), analyze {analyze_time:.2f} s, "
+          f"fix {fix_time:.2f} s (deleted {report.deleted}, moved {report.moved})")
+    for kind, findings in report.findings.items():
+        print(f"{kind:<16}{len(findings):>10}{len(after.findings[kind]):>10}")
+    leftover = after.count(FIXABLE)
+    print("fixable problems left after --fix:", leftover)
+    return 1 if leftover else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,69 @@
+"""Compare the compiled alias artifact with AliasResolver on a synthetic database.
+
+Reports build size and time, time to first lookup (open + one resolve) for
+both, and the per-lookup cost, then checks that the artifact answers every
+key exactly like the resolver.
+
+Usage: python -m benchmarks.bench_artifact [--aliases 200000] [--lookups 10000]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from alias_artifact import AliasArtifact, compile_artifact, verify
+from alias_resolver import AliasResolver
+from benchmarks.synthetic import create_database
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--aliases", type=int, default=200000)
+    parser.add_argument("--lookups", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        artifact_path = os.path.join(tmp, "aliases.bin")
+        create_database(db_path, aliases=args.aliases, seed=args.seed).close()
+        conn = sqlite3.connect(db_path)
+        queries = [row[0] for row in conn.execute("SELECT NAME_ALIAS FROM POKEMON_NAME_ALIAS")]
+        start = time.perf_counter()
+        compile_artifact(conn, artifact_path)
+        build_time = time.perf_counter() - start
+        conn.close()
+        queries = random.Random(args.seed).sample(queries, min(args.lookups, len(queries)))
+
+        start = time.perf_counter()
+        resolver = AliasResolver(db_path)
+        resolver.resolve(queries[0])
+        resolver_open = time.perf_counter() - start
+        start = time.perf_counter()
+        artifact = AliasArtifact(artifact_path)
+        artifact.resolve(queries[0])
+        artifact_open = time.perf_counter() - start
+
+        start = time.perf_counter()
+        expected = resolver.resolve_many(queries)
+        resolver_lookup = (time.perf_counter() - start) / len(queries)
+        start = time.perf_counter()
+        found = artifact.resolve_many(queries)
+        artifact_lookup = (time.perf_counter() - start) / len(queries)
+
+        problems = verify(artifact, db_path)
+        size = os.path.getsize(artifact_path)
+        artifact.close()
+
+    print(f"artifact: {size / 1024:.0f} KiB for {args.aliases} aliases, built in {build_time * 1000:.0f} ms")
+    print(f"{'':<10}{'first lookup (ms)':>20}{'lookup (us)':>14}")
+    print(f"{'resolver':<10}{resolver_open * 1000:>20.2f}{resolver_lookup * 1e6:>14.2f}")
+    print(f"{'artifact':<10}{artifact_open * 1000:>20.2f}{artifact_lookup * 1e6:>14.2f}")
+    print("same answers:", found == expected and not problems)
+    return 1 if problems or found != expected else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
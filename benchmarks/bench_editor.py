@@ -0,0 +1,184 @@
+"""Time the editor's queries on synthetic databases of several sizes.
+
+Runs the same calls as `PokemonAliasManager` (through alias_store and
+AutocompleteIndex, so no display is needed) and writes the latency of each
+operation as JSON. Pass an earlier result with --compare to see which
+operations got slower between revisions.
+
+Usage:
+    python -m benchmarks.bench_editor [--sizes 1000 100000 1000000] [-o result.json]
+    python -m benchmarks.bench_editor --compare baseline.json [--threshold 1.5]
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+from alias_store import FormTable, fetch_aliases, ndex_for_name, insert_alias, rename_alias, delete_alias
+from autocomplete import AutocompleteIndex
+from benchmarks.synthetic import create_database, random_name
+from edit_session import EditSession
+from migrations import migrate
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+
+
+def summarize(samples):
+    samples = sorted(samples)
+    return {
+        "count": len(samples),
+        "mean_ms": sum(samples) / len(samples) * 1000,
+        "p50_ms": samples[len(samples) // 2] * 1000,
+        "p95_ms": samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000,
+        "max_ms": samples[-1] * 1000,
+    }
+
+
+def timed(func, args_list):
+    samples = []
+    for args in args_list:
+        start = time.perf_counter()
+        func(*args)
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+def bench_size(aliases, operations, seed):
+    rng = random.Random(seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = create_database(os.path.join(tmp, "bench.db"), aliases=aliases, forms_per_pokemon=0.5, seed=seed)
+        migrate(conn)
+        cursor = conn.cursor()
+        autocomplete = AutocompleteIndex()
+        forms = FormTable()
+
+        result = {}
+        start = time.perf_counter()
+        autocomplete.load(conn)
+        result["autocomplete_load"] = summarize([time.perf_counter() - start])
+        start = time.perf_counter()
+        forms.load(conn)
+        result["form_table_load"] = summarize([time.perf_counter() - start])
+
+        names = [name for (name,) in conn.execute("SELECT NAME FROM POKEMON_NAME")]
+        alias_rows = conn.execute("SELECT NDEX_NUMBER, FORM_ID, NAME_ALIAS FROM POKEMON_NAME_ALIAS").fetchall()
+        samples = rng.sample(alias_rows, min(operations, len(alias_rows)))
+        labels = {ndex: forms.labels(ndex) for ndex, _, _ in samples}
+
+        # suggest_pokemon: what the user has typed so far, from names and aliases
+        typed = [text[:rng.randint(1, 3)] for text in rng.sample(names, min(operations // 2, len(names)))]
+        typed += [alias[:rng.randint(1, 3)] for _, _, alias in samples[:operations // 2]]
+        result["suggest"] = timed(autocomplete.suggest, [(text,) for text in typed])
+
+        # update_forms_and_aliases: name lookup, form menu and the first form's aliases
+        def select(name):
+            ndex = ndex_for_name(cursor, name)
+            fetch_aliases(cursor, ndex, forms.form_id(ndex, forms.labels(ndex)[0]))
+        result["update_forms_and_aliases"] = timed(select, [(rng.choice(names),) for _ in range(operations)])
+
+        # update_alias_list: switching forms in the menu
+        result["update_alias_list"] = timed(
+            lambda ndex, label: fetch_aliases(cursor, ndex, forms.form_id(ndex, label)),
+            [(ndex, rng.choice(labels[ndex])) for ndex, _, _ in samples])
+
+        # add / edit / delete, each committed like the GUI does
+        def add(ndex, label, alias):
+            form_id = forms.form_id(ndex, label)
+            insert_alias(cursor, ndex, form_id, alias)
+            conn.commit()
+            autocomplete.add_alias(alias, ndex)
+
+        def edit(ndex, label, old_alias, new_alias):
+            form_id = forms.form_id(ndex, label)
+            rename_alias(cursor, ndex, form_id, old_alias, new_alias)
+            conn.commit()
+            autocomplete.rename_alias(old_alias, new_alias, ndex)
+
+        def delete(ndex, label, alias):
+            form_id = forms.form_id(ndex, label)
+            delete_alias(cursor, ndex, form_id, alias)
+            conn.commit()
+            autocomplete.remove_alias(alias, ndex)
+
+        writes = [(ndex, rng.choice(labels[ndex]), f"{random_name(rng, 4, 8)}{i}")
+                  for i, (ndex, _, _) in enumerate(samples)]
+        result["add_alias"] = timed(add, writes)
+        result["edit_alias"] = timed(edit, [(ndex, label, alias, alias + "ー") for ndex, label, alias in writes])
+        result["delete_alias"] = timed(delete, [(ndex, label, alias + "ー") for ndex, label, alias in writes])
+
+        # The same adds in an edit session: WAL, one savepoint each, committed once
+        session = EditSession(conn)
+        batched = [(ndex, forms.form_id(ndex, label), alias + "ー") for ndex, label, alias in writes]
+        result["add_alias_session"] = timed(session.add_alias, batched)
+        result["session_commit"] = timed(session.commit, [()])
+        result["session_undo"] = timed(session.undo, [()] * len(batched))
+        session.close()
+        conn.close()
+    return result
+
+
+def revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(baseline, current, threshold):
+    """Print the slowdown of each operation; returns the number of regressions."""
+    regressions = 0
+    print(f"{'aliases':>10} {'operation':<26}{'before (ms)':>13}{'after (ms)':>13}{'ratio':>8}")
+    for size, operations in current["results"].items():
+        for name, timing in operations.items():
+            before = baseline["results"].get(size, {}).get(name)
+            if not before:
+                continue
+            ratio = timing["p50_ms"] / before["p50_ms"] if before["p50_ms"] else float("inf")
+            mark = " !" if ratio > threshold else ""
+            regressions += bool(mark)
+            print(f"{size:>10} {name:<26}{before['p50_ms']:>13.3f}{timing['p50_ms']:>13.3f}{ratio:>7.2f}x{mark}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="別名の件数")
+    parser.add_argument("--operations", type=int, default=200, help="操作ごとの試行回数")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", help="結果のJSONを書き出すファイル (既定: 標準出力)")
+    parser.add_argument("--compare", help="比較対象の以前の結果 (JSON)")
+    parser.add_argument("--threshold", type=float, default=1.5, help="この倍率を超えた遅延を退行とみなす")
+    args = parser.parse_args()
+
+    report = {
+        "revision": revision(),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "operations": args.operations,
+        "seed": args.seed,
+        "results": {str(size): bench_size(size, args.operations, args.seed) for size in args.sizes},
+    }
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    elif not args.compare:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        return 1 if compare(baseline, report, args.threshold) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+"""Throughput of the Aho–Corasick alias scanner on a synthetic corpus.
+
+Builds a database, generates chat-like messages with known aliases inserted
+into random filler, and reports the automaton build time, the scanning
+throughput (MB/s, messages/s) for single and batched scans, and the share of
+inserted aliases that were found at the inserted position.
+
+Usage: python -m benchmarks.bench_scanner [--aliases 50000] [--messages 20000]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from alias_scanner import AliasScanner
+from benchmarks.synthetic import create_database
+
+FILLER = "のでをはがにとってもすごいつよいかわいいですね、。！？ 今日明日対戦育成 abc123"
+
+
+def make_corpus(rng, aliases, messages, mentions):
+    corpus = []
+    expected = []  # (message index, start, alias)
+    for index in range(messages):
+        parts = []
+        length = 0
+        for _ in range(rng.randint(0, mentions)):
+            filler = "".join(rng.choice(FILLER) for _ in range(rng.randint(3, 20)))
+            # Filler of kana could extend the alias into a longer key; keep it apart
+            filler += " "
+            alias = rng.choice(aliases)
+            parts.extend((filler, alias, " "))
+            expected.append((index, length + len(filler), alias))
+            length += len(filler) + len(alias) + 1
+        parts.append("".join(rng.choice(FILLER) for _ in range(rng.randint(5, 40))))
+        corpus.append("".join(parts))
+    return corpus, expected
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--aliases", type=int, default=50000)
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--mentions", type=int, default=3, help="max aliases per message")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        create_database(db_path, aliases=args.aliases, seed=args.seed).close()
+        conn = sqlite3.connect(db_path)
+        aliases = [row[0] for row in conn.execute("SELECT DISTINCT NAME_ALIAS FROM POKEMON_NAME_ALIAS")]
+        conn.close()
+
+        start = time.perf_counter()
+        scanner = AliasScanner(db_path, check_interval=3600)
+        build_time = time.perf_counter() - start
+        corpus, expected = make_corpus(rng, aliases, args.messages, args.mentions)
+        size = sum(len(text.encode("utf-8")) for text in corpus)
+
+        start = time.perf_counter()
+        single = [scanner.scan(text) for text in corpus]
+        single_time = time.perf_counter() - start
+        start = time.perf_counter()
+        batched = scanner.scan_many(corpus)
+        batch_time = time.perf_counter() - start
+
+    spans = {(index, start) for index, found in enumerate(batched) for _, _, (start, _) in found}
+    recall = sum((index, start) in spans for index, start, _ in expected) / max(1, len(expected))
+    mentions = sum(len(found) for found in batched)
+
+    print(f"automaton: {len(scanner)} keys, {len(scanner.automaton.goto)} states, built in {build_time * 1000:.0f} ms")
+    print(f"corpus: {len(corpus)} messages, {size / 1e6:.2f} MB, {mentions} mentions found")
+    print(f"{'':<8}{'MB/s':>10}{'messages/s':>14}")
+    for label, elapsed in (("scan", single_time), ("batch", batch_time)):
+        print(f"{label:<8}{size / 1e6 / elapsed:>10.2f}{len(corpus) / elapsed:>14.0f}")
+    print(f"inserted aliases found: {recall:.1%}")
+    print("same results:", single == batched)
+    return 0 if single == batched else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,95 @@
+"""Compare the trigram full-text index with LIKE '%...%' scans.
+
+For each database size, random substrings of existing aliases are looked
+up with `search_index.search` and `search_index.like_search`; the write
+overhead of the sync triggers is measured by inserting aliases with and
+without the index. Results are printed as JSON.
+
+Usage: python -m benchmarks.bench_search [--sizes 10000 100000 1000000] [--queries 200]
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+import search_index
+from benchmarks.bench_editor import summarize, timed
+from benchmarks.synthetic import create_database, random_name
+from migrations import migrate
+
+DEFAULT_SIZES = [10000, 100000, 1000000]
+
+
+def time_inserts(conn, rows):
+    def insert(ndex, form_id, alias):
+        conn.execute("INSERT INTO POKEMON_NAME_ALIAS (NDEX_NUMBER, FORM_ID, NAME_ALIAS) VALUES (?, ?, ?)",
+                     (ndex, form_id, alias))
+    result = timed(insert, rows)
+    conn.rollback()
+    return result
+
+
+def bench_size(aliases, queries, seed):
+    rng = random.Random(seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = create_database(os.path.join(tmp, "bench.db"), aliases=aliases, seed=seed)
+        rows = conn.execute("SELECT NDEX_NUMBER, FORM_ID, NAME_ALIAS FROM POKEMON_NAME_ALIAS").fetchall()
+        new_rows = [(ndex, form_id, random_name(rng, 4, 8) + str(i))
+                    for i, (ndex, form_id, _) in enumerate(rng.sample(rows, queries))]
+        result = {}
+
+        migrate(conn)
+        build_start = time.perf_counter()
+        search_index.rebuild(conn)
+        result["index_build"] = summarize([time.perf_counter() - build_start])
+        result["insert_with_index"] = time_inserts(conn, new_rows)
+
+        texts = []
+        for _, _, alias in rng.sample(rows, queries):
+            length = min(len(alias), rng.randint(search_index.MIN_QUERY_LENGTH, 5))
+            start = rng.randint(0, len(alias) - length)
+            texts.append((alias[start:start + length],))
+        result["fts_search"] = timed(lambda text: search_index.search(conn, text), texts)
+        result["like_search"] = timed(lambda text: search_index.like_search(conn, text), texts)
+        mismatches = sum(search_index.search(conn, text) != search_index.like_search(conn, text)
+                         for (text,) in texts)
+
+        # Same inserts once the triggers are gone
+        conn.execute(f"DROP TABLE {search_index.SEARCH_TABLE}")
+        for table in ("POKEMON_NAME", "POKEMON_NAME_FORM", "POKEMON_NAME_ALIAS"):
+            for suffix in ("AI", "AD", "AU"):
+                conn.execute(f"DROP TRIGGER IF EXISTS {table}_SEARCH_{suffix}")
+        conn.commit()
+        result["insert_without_index"] = time_inserts(conn, new_rows)
+        result["mismatches"] = mismatches
+        result["speedup_p50"] = result["like_search"]["p50_ms"] / result["fts_search"]["p50_ms"]
+        conn.close()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="別名の件数")
+    parser.add_argument("--queries", type=int, default=200, help="検索の試行回数")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if not search_index.supported(sqlite3.connect(":memory:")):
+        print("このSQLiteはFTS5のtrigramトークナイザに対応していません", file=sys.stderr)
+        return 1
+    report = {
+        "sqlite": sqlite3.sqlite_version,
+        "queries": args.queries,
+        "results": {str(size): bench_size(size, args.queries, args.seed) for size in args.sizes},
+    }
+    json.dump(report, sys.stdout, indent=2)
+    print()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+"""Load-test alias_server on a synthetic database.
+
+Starts the server in-process on a free port and drives it from several
+client threads over keep-alive connections. Each scenario reports the
+request latency and throughput as JSON:
+
+* resolve / suggest / aliases: one lookup per GET, distinct queries
+  (every response is computed);
+* resolve_cached: the same queries again, answered from the LRU cache;
+* resolve_batch: the same lookups sent as POST /resolve batches.
+
+Usage: python -m benchmarks.bench_server [--aliases 100000] [--clients 8] [--requests 2000]
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import quote
+
+from alias_server import AliasHTTPServer, AliasService, DEFAULT_WORKERS
+from benchmarks.bench_editor import summarize
+from benchmarks.synthetic import create_database
+from migrations import migrate
+
+
+def run_clients(port, requests, clients):
+    """Send `requests` (``(method, path, body)``) spread over `clients` threads."""
+    chunks = [requests[i::clients] for i in range(clients)]
+    samples = [[] for _ in chunks]
+    errors = []
+
+    def client(chunk, out):
+        conn = http.client.HTTPConnection("127.0.0.1", port)
+        try:
+            for method, path, body in chunk:
+                start = time.perf_counter()
+                conn.request(method, path, body=body,
+                             headers={"Content-Type": "application/json"} if body else {})
+                response = conn.getresponse()
+                response.read()
+                out.append(time.perf_counter() - start)
+                if response.status != 200:
+                    errors.append(response.status)
+        finally:
+            conn.close()
+
+    threads = [threading.Thread(target=client, args=(chunk, out)) for chunk, out in zip(chunks, samples)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    result = summarize([sample for out in samples for sample in out])
+    result["requests_per_s"] = len(requests) / elapsed
+    result["errors"] = len(errors)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--aliases", type=int, default=100000, help="別名の件数")
+    parser.add_argument("--clients", type=int, default=8, help="同時に接続するクライアント数")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="サーバーのワーカースレッド数")
+    parser.add_argument("--requests", type=int, default=2000, help="シナリオごとのリクエスト数")
+    parser.add_argument("--batch", type=int, default=100, help="一括リクエストあたりの件数")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        conn = create_database(db_path, aliases=args.aliases, seed=args.seed)
+        migrate(conn)
+        aliases = [alias for (alias,) in conn.execute("SELECT NAME_ALIAS FROM POKEMON_NAME_ALIAS")]
+        ndex_numbers = [ndex for (ndex,) in conn.execute("SELECT NDEX_NUMBER FROM POKEMON_NAME")]
+        conn.close()
+
+        service = AliasService(db_path, cache_size=args.requests * 2)
+        server = AliasHTTPServer(("127.0.0.1", 0), service, workers=args.workers)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        port = server.server_address[1]
+        try:
+            queries = rng.sample(aliases, min(args.requests, len(aliases)))
+            resolve = [("GET", f"/resolve?q={quote(query)}", None) for query in queries]
+            typed = [("GET", f"/suggest?q={quote(query[:rng.randint(1, 3)])}&limit=10", None)
+                     for query in queries]
+            pokemon = [("GET", f"/pokemon/{rng.choice(ndex_numbers)}/aliases", None) for _ in queries]
+            batches = [("POST", "/resolve", json.dumps({"queries": queries[i:i + args.batch]}).encode("utf-8"))
+                       for i in range(0, len(queries), args.batch)]
+
+            results = {}
+            results["resolve"] = run_clients(port, resolve, args.clients)
+            results["resolve_cached"] = run_clients(port, resolve, args.clients)
+            service.cache.clear()
+            results["suggest"] = run_clients(port, typed, args.clients)
+            results["aliases"] = run_clients(port, pokemon, args.clients)
+            service.cache.clear()
+            results["resolve_batch"] = run_clients(port, batches, args.clients)
+            results["resolve_batch"]["lookups_per_s"] = results["resolve_batch"]["requests_per_s"] * args.batch
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    json.dump({"aliases": args.aliases, "clients": args.clients, "workers": args.workers,
+               "results": results}, sys.stdout, indent=2)
+    print()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,96 @@
+"""Measure startup time of the two editors.
+
+Each run starts a fresh interpreter and reports the time to import the
+module and, when a display is available, the time until the first window
+has been drawn. remote_update is started with a cache directory that
+already holds a copy of the database, i.e. the path a returning user takes.
+
+Usage: python -m benchmarks.bench_startup [--runs 5] [--db pokemons.db] [--json]
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ENTRY_POINTS = ["local_update", "remote_update"]
+DRIVE_URL = "https://drive.google.com/file/d/benchmark/view"
+
+
+def child(entry_point, db_path, cache_dir, window):
+    start = time.perf_counter()
+    module = __import__(entry_point)
+    result = {"import": time.perf_counter() - start}
+    if window:
+        import tkinter as tk
+
+        root = tk.Tk()
+        if entry_point == "remote_update":
+            module.PokemonAliasManager(root, DRIVE_URL, cache_dir=cache_dir)
+        else:
+            module.PokemonAliasManager(root, db_path)
+        root.update()
+        result["window"] = time.perf_counter() - start
+        root.destroy()
+    print(json.dumps(result))
+
+
+def run_once(entry_point, db_path, cache_dir, window):
+    repo = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    command = [sys.executable, "-m", "benchmarks.bench_startup", "--child", entry_point,
+               "--db", db_path, "--cache-dir", cache_dir]
+    if window:
+        command.append("--window")
+    start = time.perf_counter()
+    output = subprocess.run(command, cwd=repo, check=True, capture_output=True, text=True).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    result["process"] = time.perf_counter() - start
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--db", default="pokemons.db")
+    parser.add_argument("--json", action="store_true", help="結果をJSONで出力する")
+    parser.add_argument("--child", choices=ENTRY_POINTS, help=argparse.SUPPRESS)
+    parser.add_argument("--cache-dir", help=argparse.SUPPRESS)
+    parser.add_argument("--window", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args.db, args.cache_dir, args.window)
+        return
+
+    from drive_cache import DriveCache
+
+    window = bool(os.environ.get("DISPLAY")) or sys.platform in ("win32", "darwin")
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        # Work on copies: local_update migrates its database in place
+        db_path = os.path.join(tmp, "pokemons.db")
+        shutil.copyfile(args.db, db_path)
+        cache = DriveCache(os.path.join(tmp, "cache"))
+        cache.store("benchmark", db_path, {"md5Checksum": "benchmark"})
+
+        for entry_point in ENTRY_POINTS:
+            runs = [run_once(entry_point, db_path, cache.cache_dir, window) for _ in range(args.runs)]
+            results[entry_point] = {key: statistics.median(run[key] for run in runs) for key in runs[0]}
+
+    if args.json:
+        print(json.dumps({"runs": args.runs, "window": window, "results": results}, indent=2))
+        return
+    if not window:
+        print("DISPLAY がないためウィンドウ表示までの時間は計測していません")
+    print(f"{'entry point':<16}{'import (ms)':>14}{'window (ms)':>14}{'process (ms)':>14}")
+    for entry_point, timing in results.items():
+        window_ms = f"{timing['window'] * 1000:.1f}" if "window" in timing else "-"
+        print(f"{entry_point:<16}{timing['import'] * 1000:>14.1f}{window_ms:>14}{timing['process'] * 1000:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
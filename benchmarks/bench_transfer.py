@@ -0,0 +1,130 @@
+"""Measure compressed transfers against a local, unreliable HTTP stand-in.
+
+A synthetic database is compressed with each available codec and served by
+a local HTTP server that honours Range requests and misbehaves on purpose:
+it answers some requests with 503 and cuts some responses off halfway.
+`transfer.download_url` has to retry, resume and decompress each payload
+back to the original bytes. Sizes, encode time and download time are
+printed as JSON.
+
+Usage: python -m benchmarks.bench_transfer [--aliases 200000] [--failure-rate 0.3]
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import transfer
+from benchmarks.synthetic import create_database
+
+
+class FlakyHandler(BaseHTTPRequestHandler):
+    """Serves ``server.payloads[path]`` with Range support and injected failures."""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        data = server.payloads.get(self.path)
+        if data is None:
+            self.send_error(404)
+            return
+        server.requests += 1
+        if server.rng.random() < server.failure_rate / 2:
+            server.failures += 1
+            self.send_error(503)
+            return
+        start = 0
+        range_header = self.headers.get("Range")
+        if range_header and range_header.startswith("bytes="):
+            start = int(range_header[6:].split("-")[0])
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{len(data) - 1}/{len(data)}")
+        else:
+            self.send_response(200)
+        body = data[start:]
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if len(body) > 1 and server.rng.random() < server.failure_rate / 2:
+            # Drop the connection halfway through the body
+            server.failures += 1
+            self.wfile.write(body[:len(body) // 2])
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(payloads, failure_rate, seed):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FlakyHandler)
+    server.daemon_threads = True
+    server.payloads = payloads
+    server.failure_rate = failure_rate
+    server.rng = random.Random(seed)
+    server.requests = 0
+    server.failures = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--aliases", type=int, default=200000, help="別名の件数")
+    parser.add_argument("--failure-rate", type=float, default=0.3, help="失敗させる応答の割合")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    codecs = [transfer.NONE, transfer.GZIP] + ([transfer.ZSTD] if transfer._zstd() else [])
+    retry = transfer.RetryPolicy(retries=20, base=0.01, cap=0.1)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        create_database(db_path, aliases=args.aliases, seed=args.seed).close()
+        with open(db_path, "rb") as f:
+            original = f.read()
+        digest = hashlib.sha256(original).hexdigest()
+
+        payloads = {}
+        for name in codecs:
+            start = time.perf_counter()
+            encoded = os.path.join(tmp, f"encoded-{name}")
+            transfer.encode_file(db_path, encoded, name)
+            encode_s = time.perf_counter() - start
+            with open(encoded, "rb") as f:
+                payloads[f"/{name}"] = f.read()
+            results[name] = {"bytes": len(payloads[f"/{name}"]),
+                             "ratio": len(payloads[f"/{name}"]) / len(original),
+                             "encode_ms": encode_s * 1000}
+
+        server = start_server(payloads, args.failure_rate, args.seed)
+        try:
+            for name in codecs:
+                server.requests = server.failures = 0
+                dest = os.path.join(tmp, f"decoded-{name}.db")
+                start = time.perf_counter()
+                transfer.download_url(f"http://127.0.0.1:{server.server_address[1]}/{name}", dest, retry=retry)
+                results[name]["download_ms"] = (time.perf_counter() - start) * 1000
+                results[name]["requests"] = server.requests
+                results[name]["injected_failures"] = server.failures
+                with open(dest, "rb") as f:
+                    results[name]["intact"] = hashlib.sha256(f.read()).hexdigest() == digest
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    json.dump({"database_bytes": len(original), "chunk_size": transfer.chunk_size(), "results": results},
+              sys.stdout, indent=2)
+    print()
+    return 0 if all(result["intact"] for result in results.values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
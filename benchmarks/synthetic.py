@@ -0,0 +1,91 @@
+"""Synthetic pokemons.db generator used by the benchmarks."""
+import random
+import sqlite3
+
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS "POKEMON_NAME" (
+	"NDEX_NUMBER"	INTEGER NOT NULL,
+	"NAME"	TEXT NOT NULL,
+	PRIMARY KEY("NDEX_NUMBER")
+)""",
+    """CREATE TABLE IF NOT EXISTS "POKEMON_NAME_FORM" (
+	"NDEX_NUMBER"	INTEGER NOT NULL,
+	"FORM_ID"	INTEGER NOT NULL,
+	"GENDER"	TEXT,
+	"FORM_NAME"	TEXT,
+	"ARTWORK_FILENAME"	TEXT,
+	PRIMARY KEY("NDEX_NUMBER","FORM_ID","GENDER")
+)""",
+    """CREATE TABLE IF NOT EXISTS "POKEMON_NAME_ALIAS" (
+	"NDEX_NUMBER"	INTEGER NOT NULL,
+	"FORM_ID"	INTEGER NOT NULL,
+	"NAME_ALIAS"	TEXT NOT NULL
+)""",
+]
+
+KATAKANA = [chr(c) for c in range(ord("ァ"), ord("ヶ") + 1)] + ["ー"]
+FORM_NAMES = ["メガ", "キョダイマックス", "アローラのすがた", "ガラルのすがた", "ヒスイのすがた", "パルデアのすがた"]
+
+
+def random_name(rng, low=2, high=6):
+    return "".join(rng.choice(KATAKANA) for _ in range(rng.randint(low, high)))
+
+
+def create_database(path, pokemon=1025, aliases=10000, forms_per_pokemon=0.5,
+                    duplicate_rate=0.0, seed=0):
+    """Create a database with the real schema filled with random data.
+
+    `aliases` rows are spread over random pokémon and forms;
+    `duplicate_rate` of them are exact copies of earlier rows.
+    Returns an open connection to the new database.
+    """
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    cursor = conn.cursor()
+    for statement in SCHEMA:
+        cursor.execute(statement)
+
+    names = set()
+    name_rows = []
+    for ndex in range(1, pokemon + 1):
+        name = random_name(rng, 3, 6)
+        while name in names:
+            name = random_name(rng, 3, 6)
+        names.add(name)
+        name_rows.append((ndex, name))
+    cursor.executemany("INSERT INTO POKEMON_NAME (NDEX_NUMBER, NAME) VALUES (?, ?)", name_rows)
+
+    form_rows = []
+    form_ids = {}
+    for ndex, name in name_rows:
+        ids = [0]
+        extra = int(forms_per_pokemon) + (rng.random() < forms_per_pokemon % 1)
+        gendered = rng.random() < 0.1
+        form_rows.append((ndex, 0, "m" if gendered else None, None, f"{ndex:04d}_00"))
+        for form_id in range(1, extra + 1):
+            form_name = rng.choice(FORM_NAMES) + name
+            form_rows.append((ndex, form_id, None, form_name, f"{ndex:04d}_{form_id:02d}"))
+            ids.append(form_id)
+        form_ids[ndex] = ids
+    cursor.executemany("""
+        INSERT INTO POKEMON_NAME_FORM (NDEX_NUMBER, FORM_ID, GENDER, FORM_NAME, ARTWORK_FILENAME)
+        VALUES (?, ?, ?, ?, ?)""", form_rows)
+
+    def alias_rows():
+        recent = []
+        for _ in range(aliases):
+            if recent and rng.random() < duplicate_rate:
+                row = rng.choice(recent)
+            else:
+                ndex = rng.randint(1, pokemon)
+                row = (ndex, rng.choice(form_ids[ndex]), random_name(rng, 2, 8))
+                if len(recent) < 1000:
+                    recent.append(row)
+                else:
+                    recent[rng.randrange(1000)] = row
+            yield row
+
+    cursor.executemany("INSERT INTO POKEMON_NAME_ALIAS (NDEX_NUMBER, FORM_ID, NAME_ALIAS) VALUES (?, ?, ?)",
+                       alias_rows())
+    conn.commit()
+    return conn
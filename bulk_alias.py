@@ -0,0 +1,244 @@
+"""Bulk import and export of POKEMON_NAME_ALIAS rows.
+
+Usage:
+    python bulk_alias.py [--db pokemons.db] export aliases.csv
+    python bulk_alias.py [--db pokemons.db] import aliases.csv [--dry-run] [--strict]
+
+Files ending in .jsonl are read and written as one JSON object per line,
+anything else as CSV with a header row. Each imported row needs NAME_ALIAS,
+the pokémon as NDEX_NUMBER or NAME, and optionally the form as FORM_ID or
+FORM (the label shown in the GUI, "基本" by default).
+"""
+import argparse
+import csv
+import json
+import sqlite3
+import sys
+
+from alias_store import BASE_FORM_LABEL, FormTable
+from migrations import migrate
+
+EXPORT_FIELDS = ["NDEX_NUMBER", "NAME", "FORM_ID", "FORM", "NAME_ALIAS"]
+
+
+def detect_format(path, fmt=None):
+    if fmt:
+        return fmt
+    return "jsonl" if path.endswith(".jsonl") else "csv"
+
+
+def open_text(path, mode):
+    if path == "-":
+        return sys.stdin if "r" in mode else sys.stdout
+    encoding = "utf-8-sig" if "r" in mode else "utf-8"
+    return open(path, mode, encoding=encoding, newline="")
+
+
+def read_rows(stream, fmt):
+    """Yield ``(line number, dict)`` pairs without loading the whole file."""
+    if fmt == "jsonl":
+        for line_no, line in enumerate(stream, 1):
+            if line.strip():
+                yield line_no, json.loads(line)
+    else:
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+
+
+class ImportReport:
+    def __init__(self):
+        self.read = 0
+        self.inserted = 0
+        self.errors = []  # (line number, message)
+        self.duplicates = []  # (line number, alias, NDEX_NUMBER, FORM_ID)
+
+    def error(self, line_no, message):
+        self.errors.append((line_no, message))
+
+    def print(self, out=sys.stderr):
+        for line_no, message in self.errors:
+            print(f"{line_no}行目: {message}", file=out)
+        for line_no, alias, ndex, form_id in self.duplicates:
+            print(f"{line_no}行目: 重複 '{alias}' (NDEX_NUMBER={ndex}, FORM_ID={form_id})", file=out)
+        print(f"読み込み {self.read} 件 / 追加 {self.inserted} 件 / 重複 {len(self.duplicates)} 件 / "
+              f"エラー {len(self.errors)} 件", file=out)
+
+
+def resolve_rows(rows, ndex_by_name, forms, report):
+    """Turn input dicts into ``(line, NDEX_NUMBER, FORM_ID, NAME_ALIAS)`` tuples."""
+    known_ndex = set(ndex_by_name.values())
+    for line_no, row in rows:
+        report.read += 1
+        alias = (row.get("NAME_ALIAS") or "").strip()
+        if not alias:
+            report.error(line_no, "NAME_ALIAS がありません")
+            continue
+
+        ndex = row.get("NDEX_NUMBER")
+        if ndex not in (None, ""):
+            try:
+                ndex = int(ndex)
+            except (TypeError, ValueError):
+                report.error(line_no, f"NDEX_NUMBER が不正です: {ndex!r}")
+                continue
+            if ndex not in known_ndex:
+                report.error(line_no, f"不明なポケモン: NDEX_NUMBER={ndex}")
+                continue
+        else:
+            name = (row.get("NAME") or "").strip()
+            ndex = ndex_by_name.get(name)
+            if ndex is None:
+                report.error(line_no, f"不明なポケモン: {name!r}")
+                continue
+
+        mapping = forms.mapping(ndex)
+        form_id = row.get("FORM_ID")
+        if form_id not in (None, ""):
+            try:
+                form_id = int(form_id)
+            except (TypeError, ValueError):
+                report.error(line_no, f"FORM_ID が不正です: {form_id!r}")
+                continue
+            if form_id not in mapping.values():
+                report.error(line_no, f"不明なすがた: NDEX_NUMBER={ndex}, FORM_ID={form_id}")
+                continue
+        else:
+            label = (row.get("FORM") or BASE_FORM_LABEL).strip()
+            if label not in mapping:
+                report.error(line_no, f"不明なすがた: {label!r} (候補: {', '.join(forms.labels(ndex))})")
+                continue
+            form_id = mapping[label]
+
+        yield line_no, ndex, form_id, alias
+
+
+def import_aliases(conn, rows, dry_run=False, strict=False):
+    """Insert resolved rows in a single transaction and return an ImportReport.
+
+    Rows are staged in a temporary table with ``executemany`` so duplicates,
+    both within the input and against the database, are found with set-based
+    queries instead of one lookup per row.
+    """
+    report = ImportReport()
+    ndex_by_name = dict(conn.execute("SELECT NAME, NDEX_NUMBER FROM POKEMON_NAME"))
+    forms = FormTable()
+    forms.load(conn)
+
+    cursor = conn.cursor()
+    cursor.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS IMPORT_ALIAS (
+            LINE INTEGER PRIMARY KEY, NDEX_NUMBER INTEGER, FORM_ID INTEGER, NAME_ALIAS TEXT)""")
+    cursor.execute("DELETE FROM IMPORT_ALIAS")
+    try:
+        cursor.executemany("INSERT INTO IMPORT_ALIAS (LINE, NDEX_NUMBER, FORM_ID, NAME_ALIAS) VALUES (?, ?, ?, ?)",
+                           resolve_rows(rows, ndex_by_name, forms, report))
+
+        # Repeated within the input: every occurrence after the first
+        cursor.execute("""
+            SELECT LINE, NAME_ALIAS, NDEX_NUMBER, FORM_ID FROM IMPORT_ALIAS
+            WHERE LINE NOT IN (SELECT MIN(LINE) FROM IMPORT_ALIAS GROUP BY NDEX_NUMBER, FORM_ID, NAME_ALIAS)""")
+        report.duplicates.extend(cursor.fetchall())
+        # Already present in the database (reported once per distinct row)
+        cursor.execute("""
+            SELECT I.LINE, I.NAME_ALIAS, I.NDEX_NUMBER, I.FORM_ID FROM IMPORT_ALIAS I
+            WHERE I.LINE IN (SELECT MIN(LINE) FROM IMPORT_ALIAS GROUP BY NDEX_NUMBER, FORM_ID, NAME_ALIAS)
+            AND EXISTS (SELECT 1 FROM POKEMON_NAME_ALIAS A
+                          WHERE A.NDEX_NUMBER = I.NDEX_NUMBER AND A.FORM_ID = I.FORM_ID
+                          AND A.NAME_ALIAS = I.NAME_ALIAS)""")
+        report.duplicates.extend(cursor.fetchall())
+        report.duplicates.sort()
+
+        cursor.execute("""
+            INSERT OR IGNORE INTO POKEMON_NAME_ALIAS (NDEX_NUMBER, FORM_ID, NAME_ALIAS)
+            SELECT NDEX_NUMBER, FORM_ID, NAME_ALIAS FROM IMPORT_ALIAS ORDER BY LINE""")
+        report.inserted = cursor.rowcount
+        cursor.execute("DELETE FROM IMPORT_ALIAS")
+
+        if dry_run or (strict and report.errors):
+            conn.rollback()
+        else:
+            conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return report
+
+
+def export_aliases(conn, out, fmt):
+    """Stream every alias row to `out`; returns the number of rows written."""
+    forms = FormTable()
+    forms.load(conn)
+    cursor = conn.execute("""
+        SELECT A.NDEX_NUMBER, N.NAME, A.FORM_ID, A.NAME_ALIAS
+        FROM POKEMON_NAME_ALIAS A LEFT JOIN POKEMON_NAME N ON N.NDEX_NUMBER = A.NDEX_NUMBER
+        ORDER BY A.NDEX_NUMBER, A.FORM_ID, A.NAME_ALIAS""")
+
+    if fmt == "jsonl":
+        def write(record):
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+    else:
+        writer = csv.DictWriter(out, fieldnames=EXPORT_FIELDS)
+        writer.writeheader()
+        write = writer.writerow
+
+    count = 0
+    for ndex, name, form_id, alias in cursor:
+        write({
+            "NDEX_NUMBER": ndex,
+            "NAME": name,
+            "FORM_ID": form_id,
+            "FORM": forms.label_for(ndex, form_id),
+            "NAME_ALIAS": alias,
+        })
+        count += 1
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="POKEMON_NAME_ALIAS の一括インポート/エクスポート")
+    parser.add_argument("--db", default="pokemons.db", help="データベースファイル (既定: pokemons.db)")
+    parser.add_argument("--format", choices=["csv", "jsonl"], help="ファイル形式 (既定: 拡張子から判定)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = commands.add_parser("export", help="別名をファイルに書き出す")
+    export_parser.add_argument("path", help="出力ファイル (- で標準出力)")
+
+    import_parser = commands.add_parser("import", help="ファイルから別名を追加する")
+    import_parser.add_argument("path", help="入力ファイル (- で標準入力)")
+    import_parser.add_argument("--dry-run", action="store_true", help="検証のみ行い、変更を保存しない")
+    import_parser.add_argument("--strict", action="store_true", help="エラーが1件でもあれば何も追加しない")
+
+    args = parser.parse_args(argv)
+    fmt = detect_format(args.path, args.format)
+    conn = sqlite3.connect(args.db)
+    try:
+        migrate(conn)
+        if args.command == "export":
+            out = open_text(args.path, "w")
+            try:
+                count = export_aliases(conn, out, fmt)
+            finally:
+                if out is not sys.stdout:
+                    out.close()
+            print(f"{count} 件の別名を書き出しました", file=sys.stderr)
+            return 0
+
+        stream = open_text(args.path, "r")
+        try:
+            report = import_aliases(conn, read_rows(stream, fmt), dry_run=args.dry_run, strict=args.strict)
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+        report.print()
+        if args.dry_run:
+            print("--dry-run のため変更は保存されていません", file=sys.stderr)
+        elif args.strict and report.errors:
+            print("--strict のためエラーがあったので変更は保存されていません", file=sys.stderr)
+        return 1 if report.errors else 0
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
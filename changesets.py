@@ -0,0 +1,489 @@
+"""Delta sync of alias edits through changeset files.
+
+Instead of uploading the whole database after every edit, alias additions
+and deletions are recorded in ALIAS_CHANGE_JOURNAL and pushed as a small
+JSONL changeset stored next to the base database. Other clients replay the
+changesets they have not applied yet (tracked in SYNC_APPLIED). Compaction
+uploads a new base snapshot that contains every applied changeset, bumps
+the generation in the manifest and deletes the changesets it absorbed.
+
+Storage layout, for a base named ``pokemons.db``::
+
+    pokemons.db                                      base snapshot
+    pokemons.manifest.json                           {"generation": N}
+    pokemons.changes.<generation>.<seq>.<client>.jsonl
+
+Changesets are replayed in ``(generation, seq, client)`` order. Two clients
+pushing at the same time can pick the same seq, so the client id breaks the
+tie; when such a changeset turns up after later ones were applied, those are
+replayed again after it so every client ends in the same state.
+
+The functions here are split into network-only parts (``exchange``,
+``upload_base``), which are safe to run on the sync worker, and database
+parts, which must run on the thread that owns the connection.
+"""
+import io
+import json
+import os
+import shutil
+import sqlite3
+import uuid
+
+from instrumentation import traced
+import search_index
+from transfer import (EXTENSIONS, MIMETYPES, NONE, chunk_size, codec, download_media, encode_file, file_md5,
+                      run_chunks, upload_media)
+
+ADD = "add"
+DELETE = "delete"
+
+COMPACT_THRESHOLD = 50
+# appProperties key of the compressed base copy: md5 of the database it holds
+BASE_MD5 = "baseMd5"
+# The compressed copy is skipped unless it is at most this fraction of the base
+MAX_COMPRESSED_RATIO = 0.9
+
+
+def new_client_id():
+    return uuid.uuid4().hex[:8]
+
+
+# -- journal ------------------------------------------------------------------
+
+def record(cursor, op, ndex_number, form_id, alias):
+    """Journal one alias change; call inside the transaction that makes it."""
+    cursor.execute("INSERT INTO ALIAS_CHANGE_JOURNAL (OP, NDEX_NUMBER, FORM_ID, NAME_ALIAS) VALUES (?, ?, ?, ?)",
+                   (op, ndex_number, form_id, alias))
+
+
+def pending_ops(conn):
+    """Return ``(ops, last SEQ)`` for the journal entries not pushed yet."""
+    rows = conn.execute("SELECT SEQ, OP, NDEX_NUMBER, FORM_ID, NAME_ALIAS FROM ALIAS_CHANGE_JOURNAL ORDER BY SEQ").fetchall()
+    ops = [{"op": op, "ndex": ndex, "form_id": form_id, "alias": alias} for _, op, ndex, form_id, alias in rows]
+    return ops, (rows[-1][0] if rows else 0)
+
+
+def encode(ops):
+    return "".join(json.dumps(op, ensure_ascii=False) + "\n" for op in ops).encode("utf-8")
+
+
+def decode(data):
+    return [json.loads(line) for line in data.decode("utf-8").splitlines() if line.strip()]
+
+
+def apply_ops(cursor, ops):
+    """Replay ops idempotently: adding an existing alias or deleting a missing one is a no-op."""
+    for op in ops:
+        params = (op["ndex"], op["form_id"], op["alias"])
+        if op["op"] == ADD:
+            cursor.execute("INSERT OR IGNORE INTO POKEMON_NAME_ALIAS (NDEX_NUMBER, FORM_ID, NAME_ALIAS) VALUES (?, ?, ?)", params)
+        elif op["op"] == DELETE:
+            cursor.execute("DELETE FROM POKEMON_NAME_ALIAS WHERE NDEX_NUMBER = ? AND FORM_ID = ? AND NAME_ALIAS = ?", params)
+
+
+def carry_pending(conn, ops):
+    """Re-apply and re-journal unpushed ops on a freshly loaded base."""
+    cursor = conn.cursor()
+    apply_ops(cursor, ops)
+    for op in ops:
+        record(cursor, op["op"], op["ndex"], op["form_id"], op["alias"])
+    conn.commit()
+
+
+def get_state(conn, key, default=None):
+    row = conn.execute("SELECT VALUE FROM SYNC_STATE WHERE KEY = ?", (key,)).fetchone()
+    return row[0] if row else default
+
+
+def set_state(cursor, key, value):
+    cursor.execute("INSERT OR REPLACE INTO SYNC_STATE (KEY, VALUE) VALUES (?, ?)", (key, value))
+
+
+def generation(conn):
+    return get_state(conn, "generation", 0)
+
+
+def applied_names(conn):
+    return {row[0] for row in conn.execute("SELECT NAME FROM SYNC_APPLIED")}
+
+
+def base_state(db_path):
+    """Return ``(generation, applied names)`` of a base file without modifying it."""
+    conn = sqlite3.connect(f"file:{os.path.abspath(db_path)}?mode=ro", uri=True)
+    try:
+        return generation(conn), applied_names(conn)
+    except sqlite3.OperationalError:
+        # Base written before the journal tables existed
+        return 0, set()
+    finally:
+        conn.close()
+
+
+# -- storage backends -----------------------------------------------------------
+
+def changeset_prefix(base_name):
+    return os.path.splitext(base_name)[0] + ".changes."
+
+
+def manifest_name(base_name):
+    return os.path.splitext(base_name)[0] + ".manifest.json"
+
+
+def parse_changeset_name(name, prefix):
+    """Return ``(generation, seq, client)`` for a changeset file name, or None.
+
+    The tuple is the replay order of the changesets.
+    """
+    if not name.startswith(prefix) or not name.endswith(".jsonl"):
+        return None
+    parts = name[len(prefix):-len(".jsonl")].split(".")
+    if len(parts) != 3 or not parts[0].isdigit() or not parts[1].isdigit():
+        return None
+    return int(parts[0]), int(parts[1]), parts[2]
+
+
+class LocalStorage:
+    """Changeset storage in a local directory, used offline and in tests."""
+
+    def __init__(self, directory, base_name="pokemons.db"):
+        self.directory = directory
+        self.base_name = base_name
+        self.prefix = changeset_prefix(base_name)
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def read_base(self, dest_path):
+        shutil.copyfile(self._path(self.base_name), dest_path)
+
+    def write_base(self, src_path):
+        tmp = self._path(self.base_name + ".part")
+        shutil.copyfile(src_path, tmp)
+        os.replace(tmp, self._path(self.base_name))
+
+    def read_manifest(self):
+        try:
+            with open(self._path(manifest_name(self.base_name)), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def write_manifest(self, manifest):
+        path = self._path(manifest_name(self.base_name))
+        with open(path + ".part", "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(path + ".part", path)
+
+    def list_changesets(self):
+        names = [name for name in os.listdir(self.directory) if parse_changeset_name(name, self.prefix)]
+        return sorted(names, key=lambda name: parse_changeset_name(name, self.prefix))
+
+    def read_changeset(self, name):
+        with open(self._path(name), "rb") as f:
+            return f.read()
+
+    def write_changeset(self, name, data):
+        tmp = self._path(name + ".part")
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, self._path(name))
+
+    def delete_changeset(self, name):
+        try:
+            os.remove(self._path(name))
+        except FileNotFoundError:
+            pass
+
+
+class DriveStorage:
+    """Changeset storage in the Google Drive folder that holds the base file."""
+
+    def __init__(self, service, base_file_id):
+        from googleapiclient.http import MediaIoBaseDownload, MediaIoBaseUpload
+
+        self._download = MediaIoBaseDownload
+        self._upload = MediaIoBaseUpload
+        self.service = service
+        self.base_file_id = base_file_id
+        meta = service.files().get(fileId=base_file_id, fields="name,parents").execute()
+        self.base_name = meta["name"]
+        self.parents = meta.get("parents") or []
+        self.prefix = changeset_prefix(self.base_name)
+
+    def _find(self, name_query):
+        escaped = name_query.replace("\\", "\\\\").replace("'", "\\'")
+        query = f"name contains '{escaped}' and trashed = false"
+        if self.parents:
+            query += f" and '{self.parents[0]}' in parents"
+        files, page_token = [], None
+        while True:
+            response = self.service.files().list(q=query, fields="nextPageToken, files(id, name, appProperties)",
+                                                 pageSize=1000, pageToken=page_token).execute()
+            files.extend(response.get("files", []))
+            page_token = response.get("nextPageToken")
+            if not page_token:
+                return files
+
+    def _read(self, file_id):
+        buffer = io.BytesIO()
+        downloader = self._download(buffer, self.service.files().get_media(fileId=file_id))
+        run_chunks(downloader.next_chunk, "変更履歴をダウンロード中")
+        return buffer.getvalue()
+
+    def _write(self, name, data, mimetype, file_id=None):
+        media = self._upload(io.BytesIO(data), mimetype=mimetype, resumable=True)
+        if file_id:
+            request = self.service.files().update(fileId=file_id, media_body=media, fields="id")
+        else:
+            body = {"name": name}
+            if self.parents:
+                body["parents"] = self.parents[:1]
+            request = self.service.files().create(body=body, media_body=media, fields="id")
+        return run_chunks(request.next_chunk, "変更履歴をアップロード中")
+
+    def _compressed_copy(self, base_md5):
+        """File id of a compressed copy made from the base with `base_md5`, or None."""
+        names = {self.base_name + extension for extension in EXTENSIONS.values() if extension}
+        for file in self._find(self.base_name + "."):
+            if file["name"] in names and (file.get("appProperties") or {}).get(BASE_MD5) == base_md5:
+                return file["id"]
+        return None
+
+    def read_base(self, dest_path, progress=None, cancel_event=None):
+        """Download the base, through its compressed copy when that is up to date."""
+        file_id = self.base_file_id
+        base_md5 = self.service.files().get(fileId=file_id, fields="md5Checksum").execute().get("md5Checksum")
+        if base_md5:
+            file_id = self._compressed_copy(base_md5) or file_id
+        download_media(self.service.files().get_media(fileId=file_id), dest_path, progress, cancel_event)
+
+    def write_base(self, src_path):
+        """Upload a new base.
+
+        The shared base file stays a plain SQLite database that older
+        clients and anyone with the link can open, so compression only
+        speeds up downloads: the upload sends the full base plus a
+        compressed sibling (``pokemons.db.gz``) tagged with the md5 of the
+        database it was made from, and readers use the sibling only while
+        that matches the base. The sibling is not uploaded when it would not
+        be smaller than MAX_COMPRESSED_RATIO of the base; an older one is
+        then left behind and ignored because its md5 no longer matches.
+        """
+        meta = upload_media(lambda media: self.service.files().update(
+            fileId=self.base_file_id, media_body=media, fields="id,md5Checksum,modifiedTime,size"),
+            path=src_path, name=NONE)
+        name = codec()
+        if name == NONE:
+            return meta
+        compressed = self.base_name + EXTENSIONS[name]
+        encoded = src_path + EXTENSIONS[name]
+        encode_file(src_path, encoded, name)
+        try:
+            if os.path.getsize(encoded) > os.path.getsize(src_path) * MAX_COMPRESSED_RATIO:
+                return meta
+            body = {"appProperties": {BASE_MD5: file_md5(src_path)}}
+            existing = [file["id"] for file in self._find(compressed) if file["name"] == compressed]
+            with open(encoded, "rb") as f:
+                media = self._upload(f, mimetype=MIMETYPES[name], chunksize=chunk_size(), resumable=True)
+                if existing:
+                    request = self.service.files().update(fileId=existing[0], body=body, media_body=media, fields="id")
+                else:
+                    body["name"] = compressed
+                    if self.parents:
+                        body["parents"] = self.parents[:1]
+                    request = self.service.files().create(body=body, media_body=media, fields="id")
+                run_chunks(request.next_chunk, "アップロード中")
+        finally:
+            os.remove(encoded)
+        return meta
+
+    def read_manifest(self):
+        name = manifest_name(self.base_name)
+        for file in self._find(name):
+            if file["name"] == name:
+                return json.loads(self._read(file["id"]).decode("utf-8"))
+        return {}
+
+    def write_manifest(self, manifest):
+        name = manifest_name(self.base_name)
+        existing = [file["id"] for file in self._find(name) if file["name"] == name]
+        self._write(name, json.dumps(manifest).encode("utf-8"), "application/json",
+                    existing[0] if existing else None)
+
+    def _changesets(self):
+        return {file["name"]: file["id"] for file in self._find(self.prefix)
+                if parse_changeset_name(file["name"], self.prefix)}
+
+    def list_changesets(self):
+        self._ids = self._changesets()
+        return sorted(self._ids, key=lambda name: parse_changeset_name(name, self.prefix))
+
+    def read_changeset(self, name):
+        if name not in getattr(self, "_ids", {}):
+            self._ids = self._changesets()
+        return self._read(self._ids[name])
+
+    def write_changeset(self, name, data):
+        self._write(name, data, "application/x-ndjson")
+
+    def delete_changeset(self, name):
+        if name not in getattr(self, "_ids", {}):
+            self._ids = self._changesets()
+        if name in self._ids:
+            self.service.files().delete(fileId=self._ids.pop(name)).execute()
+
+
+# -- sync -----------------------------------------------------------------------
+
+class BaseChanged(Exception):
+    """Raised by `upload_base` when the stored base moved to a newer generation."""
+
+
+class SyncResult:
+    def __init__(self, needs_rebase=False, fetched=(), pushed=None, remote_count=0):
+        self.needs_rebase = needs_rebase
+        self.fetched = list(fetched)  # [(name, data), ...] in replay order
+        self.pushed = pushed
+        self.remote_count = remote_count  # changesets present on the storage after the exchange
+
+
+@traced("drive_exchange")
+def exchange(storage, local_generation, applied, payload, client_id):
+    """Fetch unapplied changesets and push `payload` as a new one (network only).
+
+    Applied changesets that sort after the first unapplied one are fetched
+    again, so the caller replays everything from there in order. When the
+    storage's base is newer than the local generation nothing is pushed and
+    the caller has to reload the base first.
+    """
+    remote_generation = storage.read_manifest().get("generation", 0)
+    if remote_generation > local_generation:
+        return SyncResult(needs_rebase=True)
+
+    names = storage.list_changesets()
+    missing = [name for name in names if name not in applied]
+    if missing:
+        first = parse_changeset_name(missing[0], storage.prefix)
+        replay = [name for name in names if parse_changeset_name(name, storage.prefix) >= first]
+    else:
+        replay = []
+    fetched = [(name, storage.read_changeset(name)) for name in replay]
+    pushed = None
+    if payload:
+        seqs = [parse_changeset_name(name, storage.prefix)[1] for name in names]
+        seq = max(seqs, default=0) + 1
+        pushed = f"{storage.prefix}{local_generation:04d}.{seq:06d}.{client_id}.jsonl"
+        storage.write_changeset(pushed, payload)
+    return SyncResult(False, fetched, pushed, len(names) + (1 if pushed else 0))
+
+
+def apply_result(conn, result, pushed_through):
+    """Apply fetched changesets, then re-apply our own pushed ops on top.
+
+    Our changeset gets a seq after everything we listed, so re-applying our
+    journal last matches the replay order. A changeset pushed concurrently
+    with the same seq may still sort before ours; the next exchange then
+    fetches ours again after it. Journal entries up to `pushed_through` are
+    cleared.
+    """
+    cursor = conn.cursor()
+    for name, data in result.fetched:
+        apply_ops(cursor, decode(data))
+        cursor.execute("INSERT OR IGNORE INTO SYNC_APPLIED (NAME) VALUES (?)", (name,))
+    ops, _ = pending_ops(conn)
+    apply_ops(cursor, ops)
+    if result.pushed:
+        cursor.execute("INSERT OR IGNORE INTO SYNC_APPLIED (NAME) VALUES (?)", (result.pushed,))
+        cursor.execute("DELETE FROM ALIAS_CHANGE_JOURNAL WHERE SEQ <= ?", (pushed_through,))
+    conn.commit()
+
+
+def make_base_snapshot(conn, path):
+    """Write the next-generation base snapshot of `conn` to `path`.
+
+    The snapshot has an empty journal and includes every applied changeset.
+    Returns ``(new generation, names of the changesets it contains)``.
+    """
+    conn.commit()
+    dst = sqlite3.connect(path)
+    try:
+        conn.backup(dst)
+        # The editor runs in WAL mode; the shared base must not depend on a -wal file
+        dst.execute("PRAGMA journal_mode = DELETE")
+        next_generation = generation(dst) + 1
+        set_state(dst.cursor(), "generation", next_generation)
+        dst.execute("DELETE FROM ALIAS_CHANGE_JOURNAL")
+        dst.commit()
+        dst.execute("VACUUM")
+        # VACUUM may renumber the rowids the search index is keyed on
+        if search_index.exists(dst):
+            search_index.rebuild(dst)
+        contained = applied_names(dst)
+    finally:
+        dst.close()
+    return next_generation, contained
+
+
+@traced("drive_upload_base")
+def upload_base(storage, path, next_generation, contained):
+    """Upload a snapshot as the new base and drop the changesets it absorbed (network only).
+
+    Raises BaseChanged without uploading when another client compacted
+    since our last sync; the caller then reloads the base like after
+    `needs_rebase`. The storage has no conditional writes, so two clients
+    passing this check at the same moment can still both upload: the later
+    base wins and changesets only the earlier one contained are lost from it.
+    """
+    if storage.read_manifest().get("generation", 0) != next_generation - 1:
+        raise BaseChanged()
+    meta = storage.write_base(path)
+    storage.write_manifest({"generation": next_generation})
+    for name in storage.list_changesets():
+        if name in contained:
+            storage.delete_changeset(name)
+    return meta
+
+
+def merge_sync_state(conn, other_path):
+    """Adopt the applied changesets and generation of another copy after merging with it."""
+    other_generation, other_applied = base_state(other_path)
+    cursor = conn.cursor()
+    cursor.executemany("INSERT OR IGNORE INTO SYNC_APPLIED (NAME) VALUES (?)", ((name,) for name in other_applied))
+    if other_generation > generation(conn):
+        set_state(cursor, "generation", other_generation)
+    conn.commit()
+
+
+def finish_compaction(conn, next_generation):
+    cursor = conn.cursor()
+    set_state(cursor, "generation", next_generation)
+    cursor.execute("DELETE FROM ALIAS_CHANGE_JOURNAL")
+    conn.commit()
+
+
+def sync(conn, storage, client_id):
+    """Pull and push in one call, for single-threaded callers such as scripts.
+
+    Returns the SyncResult; when `needs_rebase` is set the base must be
+    reloaded (keeping `pending_ops`) before syncing again.
+    """
+    ops, through = pending_ops(conn)
+    result = exchange(storage, generation(conn), applied_names(conn), encode(ops) if ops else None, client_id)
+    if not result.needs_rebase:
+        apply_result(conn, result, through)
+    return result
+
+
+def compact(conn, storage, client_id, snapshot_path):
+    """Sync, then replace the stored base with a snapshot of `conn`."""
+    result = sync(conn, storage, client_id)
+    if result.needs_rebase:
+        return result
+    next_generation, contained = make_base_snapshot(conn, snapshot_path)
+    try:
+        upload_base(storage, snapshot_path, next_generation, contained)
+    except BaseChanged:
+        return SyncResult(needs_rebase=True)
+    finish_compaction(conn, next_generation)
+    return result
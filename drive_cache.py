@@ -0,0 +1,114 @@
+"""Persistent local cache of Google Drive files, keyed by file ID.
+
+Before downloading, only the file's ``md5Checksum``/``modifiedTime`` metadata
+is fetched; the cached copy is reused when it still matches. The service
+object only needs ``files().get(fileId=..., fields=...).execute()``, so a
+fake service can stand in for the real Drive API.
+"""
+import json
+import os
+import shutil
+import tempfile
+
+from instrumentation import traced
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "pokemon-db-update")
+METADATA_FIELDS = "id,md5Checksum,modifiedTime,size"
+
+
+class DriveCache:
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR):
+        self.cache_dir = cache_dir
+
+    def db_path(self, file_id):
+        return os.path.join(self.cache_dir, f"{file_id}.db")
+
+    def meta_path(self, file_id):
+        return os.path.join(self.cache_dir, f"{file_id}.json")
+
+    def load_meta(self, file_id):
+        """Return the metadata stored with the cached copy, or None."""
+        try:
+            with open(self.meta_path(file_id), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def has(self, file_id):
+        return os.path.exists(self.db_path(file_id)) and self.load_meta(file_id) is not None
+
+    @staticmethod
+    @traced("drive_metadata")
+    def fetch_metadata(service, file_id):
+        return service.files().get(fileId=file_id, fields=METADATA_FIELDS).execute()
+
+    @staticmethod
+    def same_version(cached, remote):
+        """True when the cached metadata describes the same remote content."""
+        if not cached or not remote:
+            return False
+        if cached.get("md5Checksum") and remote.get("md5Checksum"):
+            return cached["md5Checksum"] == remote["md5Checksum"]
+        return bool(remote.get("modifiedTime")) and cached.get("modifiedTime") == remote.get("modifiedTime")
+
+    def is_current(self, file_id, remote_meta):
+        return os.path.exists(self.db_path(file_id)) and self.same_version(self.load_meta(file_id), remote_meta)
+
+    def sync(self, service, file_id, download):
+        """Make sure the cache holds the current remote version of `file_id`.
+
+        `download(path)` is called to fetch the file only when the metadata
+        differs from the cached copy. Returns ``(cached path, downloaded)``.
+        """
+        remote_meta = self.fetch_metadata(service, file_id)
+        if self.is_current(file_id, remote_meta):
+            return self.db_path(file_id), False
+        self.download(file_id, download, remote_meta)
+        return self.db_path(file_id), True
+
+    def download(self, file_id, download, remote_meta):
+        """Replace the cached copy with what `download(path)` writes to `path`."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(suffix=".part", dir=self.cache_dir)
+        os.close(fd)
+        try:
+            download(tmp_path)
+            self._commit(file_id, tmp_path, remote_meta)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def store(self, file_id, src_path, remote_meta):
+        """Record `src_path` as the cached copy of `file_id`, e.g. right after uploading it."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(suffix=".part", dir=self.cache_dir)
+        os.close(fd)
+        try:
+            shutil.copyfile(src_path, tmp_path)
+            self._commit(file_id, tmp_path, remote_meta)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def store_bytes(self, file_id, data, remote_meta):
+        """Like `store`, for a database image held in memory."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(suffix=".part", dir=self.cache_dir)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            self._commit(file_id, tmp_path, remote_meta)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _commit(self, file_id, tmp_path, remote_meta):
+        # Replace the data first and the metadata last, so an interrupted
+        # update never pairs new metadata with old content
+        meta_path = self.meta_path(file_id)
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
+        os.replace(tmp_path, self.db_path(file_id))
+        with open(meta_path + ".part", "w", encoding="utf-8") as f:
+            json.dump(remote_meta, f)
+        os.replace(meta_path + ".part", meta_path)
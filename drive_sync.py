@@ -0,0 +1,90 @@
+"""Background worker for Google Drive transfers.
+
+Transfers run on a single worker thread so the Tk main loop keeps
+processing events. The worker never touches tkinter or the editor's
+sqlite3 connection: it reports progress through a thread-safe queue that
+the main thread drains with ``root.after``, and results are handed back to
+callbacks that run on the main thread. Callers snapshot the database before
+an upload and swap connections only in the completion callback.
+"""
+import queue
+import threading
+
+POLL_MS = 100
+
+
+class TransferCancelled(Exception):
+    """Raised inside a transfer when the user cancelled it."""
+
+
+class SyncWorker:
+    def __init__(self, root, on_progress=None, poll_ms=POLL_MS):
+        self.root = root
+        self.on_progress = on_progress
+        self.poll_ms = poll_ms
+        self.events = queue.Queue()
+        self.cancel_event = threading.Event()
+        self.thread = None
+        self._callbacks = None
+
+    def busy(self):
+        return self.thread is not None
+
+    def start(self, func, on_done, on_error=None, on_cancel=None):
+        """Run ``func(progress, cancel_event)`` on the worker thread.
+
+        `progress(fraction, message)` may be called from the worker; the
+        callbacks are invoked on the Tk main thread. Returns False when
+        another transfer is still running.
+        """
+        if self.busy():
+            return False
+        self.cancel_event.clear()
+        self._callbacks = (on_done, on_error, on_cancel)
+        self.thread = threading.Thread(target=self._run, args=(func,), daemon=True)
+        self.thread.start()
+        self.root.after(self.poll_ms, self._poll)
+        return True
+
+    def cancel(self):
+        if self.busy():
+            self.cancel_event.set()
+
+    def _progress(self, fraction, message=None):
+        self.events.put(("progress", fraction, message))
+
+    def _run(self, func):
+        try:
+            result = func(self._progress, self.cancel_event)
+        except TransferCancelled:
+            self.events.put(("cancelled", None, None))
+        except Exception as e:
+            self.events.put(("error", e, None))
+        else:
+            self.events.put(("done", result, None))
+
+    def _poll(self):
+        while True:
+            try:
+                kind, value, message = self.events.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "progress":
+                if self.on_progress:
+                    self.on_progress(value, message)
+                continue
+
+            # The transfer finished; the thread is about to exit
+            self.thread.join()
+            self.thread = None
+            on_done, on_error, on_cancel = self._callbacks
+            self._callbacks = None
+            if kind == "done":
+                on_done(value)
+            elif kind == "error":
+                if on_error:
+                    on_error(value)
+            elif on_cancel:
+                on_cancel()
+            return
+        self.root.after(self.poll_ms, self._poll)
@@ -0,0 +1,181 @@
+"""Batched alias editing with undo and redo.
+
+An EditSession switches the database to WAL with ``synchronous=NORMAL`` and
+keeps alias edits in one open transaction, so a click costs no fsync. The
+editors commit on explicit save, after IDLE_COMMIT_MS without edits, and
+before anything copies the file (uploads, save_local, closing).
+
+Each edit, undo and redo runs inside its own SAVEPOINT: a failing action
+(e.g. a duplicate alias) is rolled back alone and the rest of the batch is
+kept. Undo applies the inverse edit instead of rolling back, so it also works
+for edits that were already committed, and observers (the changeset journal)
+and listeners (the autocomplete index, the alias list) see every change in
+both directions. Listeners keep in-memory state, so they are only told
+about an edit once its savepoint is released; a batch that fails halfway
+reaches them not at all.
+"""
+from alias_store import insert_alias, rename_alias, delete_alias
+from instrumentation import traced
+
+ADD = "add"
+DELETE = "delete"
+IDLE_COMMIT_MS = 5000
+UNDO_LIMIT = 200
+
+
+class Edit:
+    def __init__(self, label, do, undo):
+        self.label = label
+        self.do = do
+        self.undo = undo
+
+
+class EditSession:
+    def __init__(self, conn, observers=(), wal=True, listeners=()):
+        """`observers` are called as ``observer(cursor, op, ndex, form_id, alias)``
+        with op ADD or DELETE, inside the savepoint of the change. `listeners`
+        are called as ``listener(op, ndex, form_id, alias)`` after the edit
+        succeeded."""
+        self.conn = conn
+        self.observers = list(observers)
+        self.listeners = list(listeners)
+        self._changes = []
+        self.undo_stack = []
+        self.redo_stack = []
+        self._savepoints = 0
+        if wal:
+            conn.commit()
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+
+    @property
+    def pending(self):
+        """True while edits are waiting to be committed."""
+        return self.conn.in_transaction
+
+    def _run(self, func):
+        # Keep the batch open: an outermost SAVEPOINT would commit on RELEASE
+        if not self.conn.in_transaction:
+            self.conn.execute("BEGIN")
+        name = f"EDIT_{self._savepoints}"
+        self._savepoints += 1
+        cursor = self.conn.cursor()
+        cursor.execute(f"SAVEPOINT {name}")
+        self._changes = []
+        try:
+            result = func(cursor)
+        except BaseException:
+            cursor.execute(f"ROLLBACK TO {name}")
+            cursor.execute(f"RELEASE {name}")
+            self._changes = []
+            raise
+        cursor.execute(f"RELEASE {name}")
+        changes, self._changes = self._changes, []
+        for change in changes:
+            for listener in self.listeners:
+                listener(*change)
+        return result
+
+    def apply(self, label, do, undo):
+        """Run ``do(cursor)`` as one undoable edit and return its result.
+
+        Nothing is pushed when `do` reports no change (a falsy result).
+        Exceptions roll back this edit only and propagate.
+        """
+        changed = self._run(do)
+        if changed:
+            self.undo_stack.append(Edit(label, do, undo))
+            del self.undo_stack[:-UNDO_LIMIT]
+            self.redo_stack.clear()
+        return changed
+
+    def can_undo(self):
+        return bool(self.undo_stack)
+
+    def can_redo(self):
+        return bool(self.redo_stack)
+
+    def undo(self):
+        """Revert the latest edit; returns it, or None when there is nothing to undo."""
+        if not self.undo_stack:
+            return None
+        edit = self.undo_stack[-1]
+        self._run(edit.undo)
+        self.redo_stack.append(self.undo_stack.pop())
+        return edit
+
+    def redo(self):
+        if not self.redo_stack:
+            return None
+        edit = self.redo_stack[-1]
+        self._run(edit.do)
+        self.undo_stack.append(self.redo_stack.pop())
+        return edit
+
+    def _notify(self, cursor, op, ndex_number, form_id, alias):
+        for observer in self.observers:
+            observer(cursor, op, ndex_number, form_id, alias)
+        self._changes.append((op, ndex_number, form_id, alias))
+
+    def _add(self, cursor, ndex_number, form_id, alias):
+        insert_alias(cursor, ndex_number, form_id, alias)
+        self._notify(cursor, ADD, ndex_number, form_id, alias)
+        return 1
+
+    def _delete(self, cursor, ndex_number, form_id, alias):
+        removed = delete_alias(cursor, ndex_number, form_id, alias)
+        if removed:
+            self._notify(cursor, DELETE, ndex_number, form_id, alias)
+        return removed
+
+    def _rename(self, cursor, ndex_number, form_id, old_alias, new_alias):
+        renamed = rename_alias(cursor, ndex_number, form_id, old_alias, new_alias)
+        if renamed:
+            self._notify(cursor, DELETE, ndex_number, form_id, old_alias)
+            self._notify(cursor, ADD, ndex_number, form_id, new_alias)
+        return renamed
+
+    def add_alias(self, ndex_number, form_id, alias):
+        """Add an alias; raises sqlite3.IntegrityError when it already exists."""
+        return self.apply(f"'{alias}' の追加",
+                          lambda cursor: self._add(cursor, ndex_number, form_id, alias),
+                          lambda cursor: self._delete(cursor, ndex_number, form_id, alias))
+
+    def rename_alias(self, ndex_number, form_id, old_alias, new_alias):
+        return self.apply(f"'{old_alias}' → '{new_alias}' の編集",
+                          lambda cursor: self._rename(cursor, ndex_number, form_id, old_alias, new_alias),
+                          lambda cursor: self._rename(cursor, ndex_number, form_id, new_alias, old_alias))
+
+    def delete_alias(self, ndex_number, form_id, alias):
+        return self.apply(f"'{alias}' の削除",
+                          lambda cursor: self._delete(cursor, ndex_number, form_id, alias),
+                          lambda cursor: self._add(cursor, ndex_number, form_id, alias))
+
+    def apply_changes(self, label, added, removed):
+        """Add and delete many ``(ndex, form_id, alias)`` rows as one undoable edit."""
+        def change(cursor, adds, deletes):
+            for row in deletes:
+                self._delete(cursor, *row)
+            for row in adds:
+                self._add(cursor, *row)
+            return len(adds) + len(deletes)
+        return self.apply(label, lambda cursor: change(cursor, added, removed),
+                          lambda cursor: change(cursor, removed, added))
+
+    @traced("commit")
+    def commit(self):
+        """Commit the batch; returns True when there was something to commit."""
+        if not self.conn.in_transaction:
+            return False
+        self.conn.commit()
+        return True
+
+    def checkpoint(self):
+        """Commit and fold the WAL back into the database file, before it is copied."""
+        self.commit()
+        self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def close(self):
+        """Commit and leave WAL mode, so the file is self-contained again."""
+        self.commit()
+        self.conn.execute("PRAGMA journal_mode = DELETE")
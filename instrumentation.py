@@ -0,0 +1,260 @@
+"""Latency histograms and slow-operation logging for the editors.
+
+Disabled by default. When disabled, a `traced` function costs one global
+lookup on top of the call itself; nothing is timed or stored. Enable it from
+code with `enable()` or by setting environment variables before starting a
+GUI:
+
+    POKEMON_DB_METRICS=metrics.jsonl   rotating JSONL log (slow operations and summaries)
+    POKEMON_DB_SLOW_MS=50              log operations slower than this (default 100)
+    POKEMON_DB_TRACE_SQL=1             also count SQL statements per operation
+
+Usage: python instrumentation.py summary metrics.jsonl [--json]
+"""
+import bisect
+import functools
+import json
+import logging
+import logging.handlers
+import os
+import re
+import sys
+import threading
+import time
+
+DEFAULT_SLOW_MS = 100
+MAX_LOG_BYTES = 1024 * 1024
+LOG_BACKUPS = 3
+# Upper bounds of the histogram buckets; the last bucket is open-ended
+BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+# sqlite3 passes statements to the trace callback with their parameters
+# expanded; literals are folded back so one query is counted under one key
+SQL_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+_recorder = None
+_local = threading.local()
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.rows = 0
+
+    def add(self, ms, rows=None):
+        self.counts[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+        if rows is not None:
+            self.rows += rows
+
+    def percentile(self, fraction):
+        """Upper bound of the bucket holding the given fraction of samples."""
+        target = fraction * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS_MS, self.counts):
+            seen += count
+            if count and seen >= target:
+                return min(bound, self.max_ms)
+        return self.max_ms
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "mean_ms": self.total_ms / self.count if self.count else 0.0,
+            "p50_ms": self.percentile(0.5),
+            "p95_ms": self.percentile(0.95),
+            "max_ms": self.max_ms,
+            "rows": self.rows,
+            "buckets": {str(bound): count for bound, count in zip(BUCKETS_MS + ("inf",), self.counts) if count},
+        }
+
+
+class Recorder:
+    def __init__(self, log_path=None, slow_ms=DEFAULT_SLOW_MS, trace_sql=False,
+                 max_bytes=MAX_LOG_BYTES, backup_count=LOG_BACKUPS):
+        self.slow_ms = slow_ms
+        self.trace_sql = trace_sql
+        self.histograms = {}
+        self.statements = {}  # (operation, SQL) -> count
+        self.lock = threading.Lock()
+        self.handler = None
+        if log_path:
+            self.handler = logging.handlers.RotatingFileHandler(
+                log_path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
+
+    def record(self, operation, seconds, rows=None):
+        ms = seconds * 1000
+        with self.lock:
+            histogram = self.histograms.get(operation)
+            if histogram is None:
+                histogram = self.histograms[operation] = Histogram()
+            histogram.add(ms, rows)
+        if ms >= self.slow_ms:
+            self.log({"type": "slow", "op": operation, "ms": round(ms, 3), "rows": rows})
+
+    def log(self, event):
+        if self.handler is None:
+            return
+        event = dict(event, time=time.strftime("%Y-%m-%dT%H:%M:%S"))
+        self.handler.handle(logging.makeLogRecord({"msg": json.dumps(event, ensure_ascii=False)}))
+
+    def attach(self, conn):
+        """Count the statements `conn` runs, per operation, when SQL tracing is on."""
+        if self.trace_sql:
+            conn.set_trace_callback(self._on_statement)
+
+    def _on_statement(self, sql):
+        sql = SQL_LITERALS.sub("?", " ".join(sql.split()))[:200]
+        key = (getattr(_local, "operation", None) or "-", sql)
+        with self.lock:
+            self.statements[key] = self.statements.get(key, 0) + 1
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "operations": {name: histogram.to_dict() for name, histogram in sorted(self.histograms.items())},
+                "statements": [{"op": op, "sql": sql, "count": count}
+                               for (op, sql), count in sorted(self.statements.items(), key=lambda item: -item[1])],
+            }
+
+    def write_summary(self):
+        self.log(dict(self.snapshot(), type="summary"))
+
+    def close(self):
+        if self.handler is not None:
+            self.handler.close()
+            self.handler = None
+
+
+def enable(log_path=None, slow_ms=DEFAULT_SLOW_MS, trace_sql=False, **kwargs):
+    """Start recording and return the Recorder."""
+    global _recorder
+    _recorder = Recorder(log_path, slow_ms, trace_sql, **kwargs)
+    return _recorder
+
+
+def disable():
+    global _recorder
+    recorder, _recorder = _recorder, None
+    if recorder is not None:
+        recorder.close()
+    return recorder
+
+
+def enable_from_env(environ=os.environ):
+    """Enable recording when POKEMON_DB_METRICS is set; returns the Recorder or None."""
+    log_path = environ.get("POKEMON_DB_METRICS")
+    if not log_path:
+        return None
+    import atexit
+
+    recorder = enable(log_path, float(environ.get("POKEMON_DB_SLOW_MS") or DEFAULT_SLOW_MS),
+                      environ.get("POKEMON_DB_TRACE_SQL") not in (None, "", "0"))
+    atexit.register(recorder.write_summary)
+    return recorder
+
+
+def active():
+    return _recorder
+
+
+def attach(conn):
+    if _recorder is not None:
+        _recorder.attach(conn)
+
+
+def _count_rows(result):
+    if isinstance(result, (list, tuple)):
+        return len(result)
+    if isinstance(result, int) and not isinstance(result, bool):
+        return result
+    return None
+
+
+def traced(operation, rows=_count_rows):
+    """Decorator recording the latency of every call under `operation`.
+
+    `rows(result)` gives the row count stored with each sample; by default
+    the length of a returned list or a returned rowcount.
+    """
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            recorder = _recorder
+            if recorder is None:
+                return func(*args, **kwargs)
+            outer = getattr(_local, "operation", None)
+            _local.operation = operation
+            start = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                _local.operation = outer
+            recorder.record(operation, elapsed, rows(result))
+            return result
+        return wrapper
+    return decorate
+
+
+def read_log(path):
+    """Yield the events of a log file and its rotated backups, oldest first."""
+    paths = [f"{path}.{i}" for i in range(LOG_BACKUPS * 4, 0, -1)] + [path]
+    for log_path in paths:
+        if not os.path.exists(log_path):
+            continue
+        with open(log_path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="計測ログの集計")
+    commands = parser.add_subparsers(dest="command", required=True)
+    summary_parser = commands.add_parser("summary", help="最新の集計と遅い処理を表示する")
+    summary_parser.add_argument("log", help="POKEMON_DB_METRICS で指定したログファイル")
+    summary_parser.add_argument("--slowest", type=int, default=10, help="表示する遅い処理の件数")
+    summary_parser.add_argument("--json", action="store_true", help="JSONで出力する")
+    args = parser.parse_args(argv)
+
+    summary = None
+    slow = []
+    for event in read_log(args.log):
+        if event.get("type") == "summary":
+            summary = event
+        elif event.get("type") == "slow":
+            slow.append(event)
+    slow.sort(key=lambda event: -event["ms"])
+    slow = slow[:args.slowest]
+
+    if args.json:
+        json.dump({"summary": summary, "slowest": slow}, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+        return 0
+    if summary:
+        print(f"集計 ({summary['time']})")
+        print(f"{'operation':<26}{'count':>8}{'mean (ms)':>12}{'p95 (ms)':>12}{'max (ms)':>12}{'rows':>10}")
+        for name, stats in summary["operations"].items():
+            print(f"{name:<26}{stats['count']:>8}{stats['mean_ms']:>12.3f}{stats['p95_ms']:>12.3f}"
+                  f"{stats['max_ms']:>12.3f}{stats['rows']:>10}")
+        for statement in summary["statements"][:args.slowest]:
+            print(f"{statement['count']:>8}  [{statement['op']}] {statement['sql']}")
+    else:
+        print("集計がまだ記録されていません")
+    if slow:
+        print("遅い処理:")
+        for event in slow:
+            print(f"  {event['time']}  {event['op']:<26}{event['ms']:>10.1f} ms  rows={event['rows']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,15 +1,35 @@
 import tkinter as tk
 from tkinter import messagebox, simpledialog, ttk
 import sqlite3
+from autocomplete import AutocompleteIndex, SUGGEST_DELAY_MS
+from migrations import migrate
+from alias_store import FormTable, ndex_for_name, fetch_aliases
+from alias_view import AliasListView
+from artwork import ArtworkLoader, ArtworkPanel
+from edit_session import EditSession, ADD, IDLE_COMMIT_MS
+import instrumentation
+from search_index import search_aliases
 
 class PokemonAliasManager:
     def __init__(self, root, db_path):
         self.root = root
         self.db_path = db_path
         self.conn = sqlite3.connect(self.db_path)
+        migrate(self.conn)
+        instrumentation.attach(self.conn)
         self.cursor = self.conn.cursor()
         self.selected_pokemon = None
         self.selected_alias = None
+        self.autocomplete = AutocompleteIndex()
+        self.forms = FormTable()
+        self.forms.load(self.conn)
+        self.autocomplete.load(self.conn)
+        self.session = EditSession(self.conn, listeners=[self.on_alias_change])
+        self._suggest_job = None
+        self._commit_job = None
+        self._search_job = None
+        self._refresh_job = None
+        self.search_results = {}
 
         self.setup_ui()
 
@@ -24,6 +44,14 @@ class PokemonAliasManager:
         self.pokemon_entry.bind("<KeyRelease>", self.suggest_pokemon)
         self.pokemon_entry.bind("<<ComboboxSelected>>", self.select_pokemon)
 
+        # Search every alias by substring (full-text index)
+        tk.Label(self.root, text="別名で検索").grid(row=1, column=0, padx=5, pady=5)
+        self.alias_search_var = tk.StringVar()
+        self.alias_search_entry = ttk.Combobox(self.root, textvariable=self.alias_search_var)
+        self.alias_search_entry.grid(row=1, column=1, padx=5, pady=5)
+        self.alias_search_entry.bind("<KeyRelease>", self.search_by_alias)
+        self.alias_search_entry.bind("<<ComboboxSelected>>", self.select_search_result)
+
         # Alias display
         tk.Label(self.root, text="すがた:").grid(row=2, column=0, padx=5, pady=5)
         self.form_var = tk.StringVar()
@@ -31,51 +59,70 @@ class PokemonAliasManager:
         self.form_option = tk.OptionMenu(self.root, self.form_var, "")
         self.form_option.grid(row=2, column=1, padx=5, pady=5)
 
-        self.alias_listbox = tk.Listbox(self.root)
-        self.alias_listbox.grid(row=3, column=0, columnspan=2, padx=5, pady=5)
-        self.alias_listbox.bind("<Button-3>", self.show_alias_options)
+        # Artwork of the selected form, loaded in the background
+        self.artwork_panel = ArtworkPanel(self.root, self.forms, ArtworkLoader(self.root))
+        self.artwork_panel.grid(row=2, column=2, rowspan=2, padx=5, pady=5)
+        self.form_var.trace('w', self.update_artwork)
+
+        self.alias_view = AliasListView(self.root)
+        self.alias_view.grid(row=3, column=0, columnspan=2, padx=5, pady=5)
+        self.alias_view.bind("<Button-3>", self.show_alias_options)
 
         tk.Button(self.root, text="別名の追加", command=self.add_alias).grid(row=4, column=0, padx=5, pady=5)
         tk.Button(self.root, text="別名の削除", command=self.delete_alias).grid(row=4, column=1, padx=5, pady=5)
 
+        # Edits are batched in one transaction; undo/redo and explicit save
+        edit_frame = tk.Frame(self.root)
+        edit_frame.grid(row=5, column=0, columnspan=2, padx=5, pady=5)
+        tk.Button(edit_frame, text="元に戻す", command=self.undo_edit).pack(side=tk.LEFT, padx=2)
+        tk.Button(edit_frame, text="やり直す", command=self.redo_edit).pack(side=tk.LEFT, padx=2)
+        tk.Button(edit_frame, text="保存", command=self.commit_edits).pack(side=tk.LEFT, padx=2)
+        self.root.bind("<Control-z>", self.undo_edit)
+        self.root.bind("<Control-y>", self.redo_edit)
+        self.root.bind("<Control-s>", self.commit_edits)
+
     def suggest_pokemon(self, event):
-        typed = self.pokemon_var.get()
-        self.cursor.execute("SELECT NAME FROM POKEMON_NAME WHERE NAME LIKE ?", ('%' + typed + '%',))
-        suggestions = [row[0] for row in self.cursor.fetchall()]
-        self.pokemon_entry['values'] = suggestions
+        # Debounce keystrokes: only the last key within the delay triggers a lookup
+        if self._suggest_job is not None:
+            self.root.after_cancel(self._suggest_job)
+        self._suggest_job = self.root.after(SUGGEST_DELAY_MS, self.apply_suggestions)
+
+    def apply_suggestions(self):
+        self._suggest_job = None
+        self.pokemon_entry['values'] = self.autocomplete.suggest(self.pokemon_var.get())
+
+    def search_by_alias(self, event):
+        # Debounced like suggest_pokemon
+        if self._search_job is not None:
+            self.root.after_cancel(self._search_job)
+        self._search_job = self.root.after(SUGGEST_DELAY_MS, self.apply_alias_search)
+
+    def apply_alias_search(self):
+        self._search_job = None
+        self.search_results = {}
+        for ndex, form_id, alias in search_aliases(self.conn, self.alias_search_var.get()):
+            name = self.autocomplete.name_by_ndex.get(ndex)
+            label = self.forms.label_for(ndex, form_id)
+            self.search_results[f"{alias} → {name} ({label})"] = (name, label)
+        self.alias_search_entry['values'] = list(self.search_results)
+
+    def select_search_result(self, event=None):
+        result = self.search_results.get(self.alias_search_var.get())
+        if result:
+            name, label = result
+            self.pokemon_var.set(name)
+            self.select_pokemon()
+            self.form_var.set(label)
 
     def select_pokemon(self, event=None):
         self.selected_pokemon = self.pokemon_var.get()
         self.update_forms_and_aliases()
 
     def update_forms_and_aliases(self):
-        self.cursor.execute("SELECT NDEX_NUMBER FROM POKEMON_NAME WHERE NAME = ?", (self.selected_pokemon,))
-        result = self.cursor.fetchone()
-        if result:
-            self.ndex_number = result[0]
-            self.cursor.execute("SELECT FORM_ID, FORM_NAME, GENDER FROM POKEMON_NAME_FORM WHERE NDEX_NUMBER = ?", (self.ndex_number,))
-            forms = []
-            form_exists = False
-
-            for form_id, form_name, gender in self.cursor.fetchall():
-                if form_id == 0:
-                    form_exists = True
-                    if form_name is None and gender is None:
-                        forms.append("基本")
-                    elif form_name is not None:
-                        forms.append(form_name)
-                    elif gender is not None:
-                        forms.append(gender)
-                else:
-                    if form_name is not None:
-                        forms.append(form_name)
-                    if gender is not None:
-                        forms.append(gender)
-
-            if not form_exists:
-                forms.append("基本")
-
-            forms = list(set(forms))  # Remove duplicates
+        ndex_number = ndex_for_name(self.cursor, self.selected_pokemon)
+        if ndex_number is not None:
+            self.ndex_number = ndex_number
+            forms = self.forms.labels(self.ndex_number)
 
             self.form_option['menu'].delete(0, 'end')
             self.form_var.set(forms[0] if forms else "")
@@ -84,27 +131,26 @@ class PokemonAliasManager:
 
             self.update_alias_list()
 
+    def update_artwork(self, *args):
+        if self.form_var.get():
+            self.artwork_panel.show(self.ndex_number, self.form_var.get())
+
     def update_alias_list(self, *args):
+        # Resetting the form menu fires form_var several times; query once
+        if self._refresh_job is None:
+            self._refresh_job = self.root.after_idle(self.refresh_alias_list)
+
+    def refresh_alias_list(self):
+        self._refresh_job = None
         if self.form_var.get():
-            self.alias_listbox.delete(0, tk.END)
-            form_name = self.form_var.get()
-            if form_name == "基本":
-                self.cursor.execute("SELECT NAME_ALIAS FROM POKEMON_NAME_ALIAS WHERE NDEX_NUMBER = ? AND FORM_ID = 0", (self.ndex_number,))
-            else:
-                self.cursor.execute("""
-                    SELECT NAME_ALIAS FROM POKEMON_NAME_ALIAS 
-                    WHERE NDEX_NUMBER = ? AND FORM_ID = 
-                    (SELECT FORM_ID FROM POKEMON_NAME_FORM 
-                     WHERE (FORM_NAME = ? OR GENDER = ?) AND NDEX_NUMBER = ?)""", 
-                    (self.ndex_number, form_name, form_name, self.ndex_number))
-            aliases = [alias[0] for alias in self.cursor.fetchall()]
-            for alias in aliases:
-                self.alias_listbox.insert(tk.END, alias)
+            form_id = self.forms.form_id(self.ndex_number, self.form_var.get())
+            aliases = fetch_aliases(self.cursor, self.ndex_number, form_id)
+            self.alias_view.set_items((self.ndex_number, form_id), aliases)
 
     def show_alias_options(self, event):
-        selection = self.alias_listbox.curselection()
-        if selection:
-            self.selected_alias = self.alias_listbox.get(selection[0])
+        selected = self.alias_view.selected()
+        if selected is not None:
+            self.selected_alias = selected
             menu = tk.Menu(self.root, tearoff=0)
             menu.add_command(label="編集", command=self.edit_alias)
             menu.add_command(label="削除", command=self.delete_alias)
@@ -113,66 +159,91 @@ class PokemonAliasManager:
     def add_alias(self):
         new_alias = simpledialog.askstring("別名の追加", "新しい別名を入力")
         if new_alias:
-            form_name = self.form_var.get()
-            if form_name == "基本":
-                form_id = 0
-            else:
-                self.cursor.execute("""
-                    SELECT FORM_ID FROM POKEMON_NAME_FORM 
-                    WHERE (FORM_NAME = ? OR GENDER = ?) AND NDEX_NUMBER = ?""", 
-                    (form_name, form_name, self.ndex_number))
-                form_id = self.cursor.fetchone()
-                form_id = form_id[0] if form_id else 0
-
-            self.cursor.execute("INSERT INTO POKEMON_NAME_ALIAS (NAME_ALIAS, NDEX_NUMBER, FORM_ID) VALUES (?, ?, ?)", (new_alias, self.ndex_number, form_id))
-            self.conn.commit()
-            self.update_alias_list()
+            form_id = self.forms.form_id(self.ndex_number, self.form_var.get())
+
+            try:
+                self.session.add_alias(self.ndex_number, form_id, new_alias)
+            except sqlite3.IntegrityError:
+                messagebox.showerror("別名の追加", f"'{new_alias}' は既に登録されています")
+                return
+            self.schedule_commit()
 
     def edit_alias(self):
         new_alias = simpledialog.askstring("別名の編集", "新しい別名を入力", initialvalue=self.selected_alias)
         if new_alias:
-            form_name = self.form_var.get()
-            if form_name == "基本":
-                form_id = 0
-            else:
-                self.cursor.execute("""
-                    SELECT FORM_ID FROM POKEMON_NAME_FORM 
-                    WHERE (FORM_NAME = ? OR GENDER = ?) AND NDEX_NUMBER = ?""", 
-                    (form_name, form_name, self.ndex_number))
-                form_id = self.cursor.fetchone()
-                form_id = form_id[0] if form_id else 0
-
-            self.cursor.execute("UPDATE POKEMON_NAME_ALIAS SET NAME_ALIAS = ? WHERE NAME_ALIAS = ? AND NDEX_NUMBER = ? AND FORM_ID = ?", (new_alias, self.selected_alias, self.ndex_number, form_id))
-            self.conn.commit()
-            self.update_alias_list()
+            form_id = self.forms.form_id(self.ndex_number, self.form_var.get())
+
+            try:
+                self.session.rename_alias(self.ndex_number, form_id, self.selected_alias, new_alias)
+            except sqlite3.IntegrityError:
+                messagebox.showerror("別名の編集", f"'{new_alias}' は既に登録されています")
+                return
+            self.schedule_commit()
 
     def delete_alias(self):
         if self.selected_alias:
             confirm = messagebox.askokcancel("別名の削除", f"本当に '{self.selected_alias}' を削除しますか？")
             if confirm:
-                form_name = self.form_var.get()
-                if form_name == "基本":
-                    form_id = 0
-                else:
-                    self.cursor.execute("""
-                        SELECT FORM_ID FROM POKEMON_NAME_FORM 
-                        WHERE (FORM_NAME = ? OR GENDER = ?) AND NDEX_NUMBER = ?""", 
-                        (form_name, form_name, self.ndex_number))
-                    form_id = self.cursor.fetchone()
-                    form_id = form_id[0] if form_id else 0
-
-                self.cursor.execute("DELETE FROM POKEMON_NAME_ALIAS WHERE NAME_ALIAS = ? AND NDEX_NUMBER = ? AND FORM_ID = ?", (self.selected_alias, self.ndex_number, form_id))
-                self.conn.commit()
-                self.update_alias_list()
+                form_id = self.forms.form_id(self.ndex_number, self.form_var.get())
+
+                self.session.delete_alias(self.ndex_number, form_id, self.selected_alias)
+                self.schedule_commit()
                 self.selected_alias = None
 
+    def on_alias_change(self, op, ndex_number, form_id, alias):
+        # The list is patched in place, including for undo/redo of other forms' edits
+        shown = self.alias_view.key == (ndex_number, form_id)
+        if op == ADD:
+            self.autocomplete.add_alias(alias, ndex_number)
+            if shown:
+                self.alias_view.add(alias)
+        else:
+            self.autocomplete.remove_alias(alias, ndex_number)
+            if shown:
+                self.alias_view.remove(alias)
+
+    def schedule_commit(self):
+        # Commit once editing pauses instead of after every change
+        if self._commit_job is not None:
+            self.root.after_cancel(self._commit_job)
+        self._commit_job = self.root.after(IDLE_COMMIT_MS, self.commit_edits)
+
+    def commit_edits(self, event=None):
+        if self._commit_job is not None:
+            self.root.after_cancel(self._commit_job)
+            self._commit_job = None
+        self.session.commit()
+
+    def undo_edit(self, event=None):
+        self.step_edit(self.session.undo, "元に戻す")
+
+    def redo_edit(self, event=None):
+        self.step_edit(self.session.redo, "やり直す")
+
+    def step_edit(self, step, title):
+        try:
+            edit = step()
+        except sqlite3.IntegrityError:
+            messagebox.showerror(title, "同じ別名が既に登録されているため実行できません")
+            return
+        if edit:
+            self.schedule_commit()
+
+    def on_close(self):
+        self.commit_edits()
+        self.session.close()
+        self.artwork_panel.loader.close()
+        self.root.destroy()
+
     def run(self):
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
         self.root.mainloop()
 
     def __del__(self):
         self.conn.close()
 
 if __name__ == "__main__":
+    instrumentation.enable_from_env()
     root = tk.Tk()
     app = PokemonAliasManager(root, "pokemons.db")
     app.run()
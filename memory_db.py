@@ -0,0 +1,82 @@
+"""In-memory working copies of the database.
+
+`remote_update.py` edits the downloaded database in memory: the bytes are
+loaded with ``Connection.deserialize`` and written back with
+``Connection.serialize`` or the backup API, so no temporary working file is
+left behind. Python before 3.11 lacks (de)serialize; the backup API is used
+instead.
+"""
+import os
+import sqlite3
+import tempfile
+
+# Offsets 18/19 of the header: file format write/read version, 2 in WAL mode
+_FORMAT_VERSION = slice(18, 20)
+_LEGACY = b"\x01\x01"
+
+
+def _legacy_header(data):
+    # A WAL-mode image cannot be opened from memory (there is no -wal file
+    # beside it); marking it as rollback-journal is what leaving WAL does
+    if data[_FORMAT_VERSION] == _LEGACY or len(data) < 100:
+        return data
+    data = bytearray(data)
+    data[_FORMAT_VERSION] = _LEGACY
+    return bytes(data)
+
+
+def load(source):
+    """Open an in-memory copy of `source`, a database path or its bytes."""
+    conn = sqlite3.connect(":memory:")
+    if hasattr(conn, "deserialize"):
+        if not isinstance(source, (bytes, bytearray)):
+            with open(source, "rb") as f:
+                source = f.read()
+        conn.deserialize(_legacy_header(source))
+        return conn
+    if isinstance(source, (bytes, bytearray)):
+        fd, path = tempfile.mkstemp(suffix=".db")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(_legacy_header(source))
+            return load(path)
+        finally:
+            os.remove(path)
+    src = sqlite3.connect(source)
+    try:
+        src.backup(conn)
+    finally:
+        src.close()
+    return conn
+
+
+def to_bytes(conn):
+    """Return the committed content of `conn` as a database image."""
+    conn.commit()
+    if hasattr(conn, "serialize"):
+        return _legacy_header(conn.serialize())
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    try:
+        save(conn, path)
+        with open(path, "rb") as f:
+            return f.read()
+    finally:
+        os.remove(path)
+
+
+def save(conn, path):
+    """Write a self-contained copy of `conn` to `path`, replacing it atomically."""
+    conn.commit()
+    part = path + ".part"
+    dst = sqlite3.connect(part)
+    try:
+        conn.backup(dst)
+        # backup() copies the WAL setting of a file-backed source
+        dst.execute("PRAGMA journal_mode = DELETE")
+    except BaseException:
+        dst.close()
+        os.remove(part)
+        raise
+    dst.close()
+    os.replace(part, path)
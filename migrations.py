@@ -0,0 +1,118 @@
+"""Versioned schema migrations for pokemons.db.
+
+The schema version is tracked with ``PRAGMA user_version``. Both entry points
+call ``migrate`` right after opening the database, so a copy downloaded from
+Google Drive is brought up to date before it is edited.
+"""
+import sqlite3
+
+import search_index
+
+
+def _alias_indexes(cursor):
+    # Drop exact duplicate rows, keeping the oldest one, so the unique index can be built
+    cursor.execute("""
+        DELETE FROM POKEMON_NAME_ALIAS WHERE rowid NOT IN
+        (SELECT MIN(rowid) FROM POKEMON_NAME_ALIAS
+         GROUP BY NDEX_NUMBER, FORM_ID, NAME_ALIAS)""")
+    cursor.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS IDX_POKEMON_NAME_ALIAS_KEY
+        ON POKEMON_NAME_ALIAS (NDEX_NUMBER, FORM_ID, NAME_ALIAS)""")
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS IDX_POKEMON_NAME_ALIAS_NAME
+        ON POKEMON_NAME_ALIAS (NAME_ALIAS)""")
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS IDX_POKEMON_NAME_NAME
+        ON POKEMON_NAME (NAME)""")
+
+
+def _change_journal(cursor):
+    # Local alias edits waiting to be pushed as a changeset (see changesets.py)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS ALIAS_CHANGE_JOURNAL (
+            SEQ INTEGER PRIMARY KEY,
+            OP TEXT NOT NULL,
+            NDEX_NUMBER INTEGER NOT NULL,
+            FORM_ID INTEGER NOT NULL,
+            NAME_ALIAS TEXT NOT NULL
+        )""")
+    # Changesets already contained in this database
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS SYNC_APPLIED (
+            NAME TEXT PRIMARY KEY
+        ) WITHOUT ROWID""")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS SYNC_STATE (
+            KEY TEXT PRIMARY KEY,
+            VALUE
+        ) WITHOUT ROWID""")
+
+
+# (version, description, function); versions must be consecutive
+MIGRATIONS = [
+    (1, "POKEMON_NAME_ALIAS の重複削除とインデックス追加", _alias_indexes),
+    (2, "差分同期用の変更ジャーナル", _change_journal),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def get_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn):
+    """Apply every pending migration, each in its own transaction.
+
+    Returns the list of versions that were applied. A database written by a
+    newer version of the tool is not migrated. The search index is checked
+    afterwards in either case (see ``search_index.ensure``).
+    """
+    applied = []
+    # Not a pokemons.db (e.g. a failed download): nothing to migrate
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'POKEMON_NAME_ALIAS'").fetchone() is None:
+        return applied
+    current = get_version(conn)
+    if current < LATEST_VERSION:
+        applied = _apply(conn, current)
+    search_index.ensure(conn)
+    return applied
+
+
+def _apply(conn, current):
+    applied = []
+    conn.commit()
+    isolation_level = conn.isolation_level
+    conn.isolation_level = None  # manage BEGIN/COMMIT ourselves
+    try:
+        for version, description, func in MIGRATIONS:
+            if version <= current:
+                continue
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                func(cursor)
+                # PRAGMA does not accept bound parameters
+                cursor.execute(f"PRAGMA user_version = {int(version)}")
+                cursor.execute("COMMIT")
+            except sqlite3.Error:
+                cursor.execute("ROLLBACK")
+                raise
+            applied.append(version)
+    finally:
+        conn.isolation_level = isolation_level
+    return applied
+
+
+if __name__ == "__main__":
+    import sys
+
+    db_path = sys.argv[1] if len(sys.argv) > 1 else "pokemons.db"
+    conn = sqlite3.connect(db_path)
+    before = get_version(conn)
+    applied = migrate(conn)
+    conn.close()
+    if applied:
+        print(f"{db_path}: version {before} -> {applied[-1]}")
+    else:
+        print(f"{db_path}: already at version {before}")
@@ -0,0 +1,153 @@
+"""Search-key normalization for pokémon names and aliases.
+
+`search_key` folds the spellings editors use for the same name onto one key:
+
+* NFKC (half-width katakana, full-width letters and digits) and casefold;
+* hiragana to katakana;
+* dash and tilde variants after kana to "ー", then "ー" to the vowel it
+  lengthens ("ピカチュー" and "ピカチュウ" both become "ピカチュウ");
+* spaces, "・" and ":" are dropped ("カプ・コケコ", "タイプ:ヌル").
+
+`query_keys` also transliterates romaji, so "pikachuu" finds ピカチュウ.
+"""
+import unicodedata
+
+HIRAGANA_START, HIRAGANA_END = ord("ぁ"), ord("ゖ")
+KATAKANA_OFFSET = ord("ァ") - ord("ぁ")
+LONG_VOWEL = "ー"
+LONG_VOWEL_VARIANTS = set("-‐‑‒–—―−~〜")
+IGNORED = set(" 　・:")
+
+# The kana "ー" stands for after each vowel row; e/o rows lengthen with イ/ウ
+_ROWS = {
+    "ア": "アカサタナハマヤラワガザダバパァャヮヵ",
+    "イ": "イキシチニヒミリギジヂビピィ",
+    "ウ": "ウクスツヌフムユルグズヅブプヴゥュ",
+    "エ": "エケセテネヘメレゲゼデベペェヶ",
+    "オ": "オコソトノホモヨロヲゴゾドボポォョ",
+}
+_LENGTHENED = {"ア": "ア", "イ": "イ", "ウ": "ウ", "エ": "イ", "オ": "ウ"}
+LONG_VOWEL_KANA = {kana: _LENGTHENED[row] for row, kanas in _ROWS.items() for kana in kanas}
+
+ROMAJI = {
+    "a": "ア", "i": "イ", "u": "ウ", "e": "エ", "o": "オ",
+    "ka": "カ", "ki": "キ", "ku": "ク", "ke": "ケ", "ko": "コ", "kya": "キャ", "kyu": "キュ", "kyo": "キョ",
+    "ga": "ガ", "gi": "ギ", "gu": "グ", "ge": "ゲ", "go": "ゴ", "gya": "ギャ", "gyu": "ギュ", "gyo": "ギョ",
+    "sa": "サ", "shi": "シ", "si": "シ", "su": "ス", "se": "セ", "so": "ソ",
+    "sha": "シャ", "shu": "シュ", "sho": "ショ", "she": "シェ", "sya": "シャ", "syu": "シュ", "syo": "ショ",
+    "za": "ザ", "ji": "ジ", "zi": "ジ", "zu": "ズ", "ze": "ゼ", "zo": "ゾ",
+    "ja": "ジャ", "ju": "ジュ", "jo": "ジョ", "je": "ジェ", "zya": "ジャ", "zyu": "ジュ", "zyo": "ジョ",
+    "ta": "タ", "chi": "チ", "ti": "チ", "tsu": "ツ", "tu": "ツ", "te": "テ", "to": "ト",
+    "cha": "チャ", "chu": "チュ", "cho": "チョ", "che": "チェ", "tya": "チャ", "tyu": "チュ", "tyo": "チョ",
+    "thi": "ティ", "twu": "トゥ",
+    "da": "ダ", "di": "ヂ", "du": "ヅ", "de": "デ", "do": "ド", "dhi": "ディ", "dwu": "ドゥ",
+    "na": "ナ", "ni": "ニ", "nu": "ヌ", "ne": "ネ", "no": "ノ", "nya": "ニャ", "nyu": "ニュ", "nyo": "ニョ",
+    "ha": "ハ", "hi": "ヒ", "fu": "フ", "hu": "フ", "he": "ヘ", "ho": "ホ",
+    "hya": "ヒャ", "hyu": "ヒュ", "hyo": "ヒョ", "fa": "ファ", "fi": "フィ", "fe": "フェ", "fo": "フォ",
+    "ba": "バ", "bi": "ビ", "bu": "ブ", "be": "ベ", "bo": "ボ", "bya": "ビャ", "byu": "ビュ", "byo": "ビョ",
+    "pa": "パ", "pi": "ピ", "pu": "プ", "pe": "ペ", "po": "ポ", "pya": "ピャ", "pyu": "ピュ", "pyo": "ピョ",
+    "ma": "マ", "mi": "ミ", "mu": "ム", "me": "メ", "mo": "モ", "mya": "ミャ", "myu": "ミュ", "myo": "ミョ",
+    "ya": "ヤ", "yu": "ユ", "yo": "ヨ",
+    "ra": "ラ", "ri": "リ", "ru": "ル", "re": "レ", "ro": "ロ", "rya": "リャ", "ryu": "リュ", "ryo": "リョ",
+    "la": "ラ", "li": "リ", "lu": "ル", "le": "レ", "lo": "ロ",
+    "wa": "ワ", "wi": "ウィ", "we": "ウェ", "wo": "ヲ",
+    "va": "ヴァ", "vi": "ヴィ", "vu": "ヴ", "ve": "ヴェ", "vo": "ヴォ",
+    "xa": "ァ", "xi": "ィ", "xu": "ゥ", "xe": "ェ", "xo": "ォ", "xya": "ャ", "xyu": "ュ", "xyo": "ョ",
+    "xtu": "ッ", "xtsu": "ッ", "ltu": "ッ", "-": LONG_VOWEL,
+}
+ROMAJI_MAX = max(len(key) for key in ROMAJI)
+VOWELS = set("aiueo")
+
+
+def _is_kana(char):
+    return "ァ" <= char <= "ヶ" or char == LONG_VOWEL
+
+
+# Kana folding and dropped characters in one C-level pass
+_TRANSLATION = {code: code + KATAKANA_OFFSET for code in range(HIRAGANA_START, HIRAGANA_END + 1)}
+_TRANSLATION.update((ord(char), None) for char in IGNORED)
+_LONG_VOWEL_CHARS = frozenset(LONG_VOWEL_VARIANTS | {LONG_VOWEL})
+
+
+def _fold_long_vowels(text):
+    # Long vowel marks depend on the preceding kana
+    if _LONG_VOWEL_CHARS.isdisjoint(text):
+        return text
+    out = []
+    for char in text:
+        if char in LONG_VOWEL_VARIANTS and out and _is_kana(out[-1]):
+            char = LONG_VOWEL
+        if char == LONG_VOWEL and out:
+            char = LONG_VOWEL_KANA.get(out[-1], LONG_VOWEL)
+        out.append(char)
+    return "".join(out)
+
+
+def search_key(text):
+    """Return the normalized key `text` is indexed and searched under."""
+    return _fold_long_vowels(unicodedata.normalize("NFKC", text).casefold().translate(_TRANSLATION))
+
+
+def search_keys(texts):
+    """Return `search_key` of each of `texts`, normalizing them as one string.
+
+    Line feeds never change under NFKC or casefold, so the texts are joined
+    with them and folded in a single pass, which is much faster for
+    hundreds of thousands of short strings.
+    """
+    texts = list(texts)
+    joined = "\n".join(texts)
+    if joined.count("\n") != len(texts) - 1:
+        return [search_key(text) for text in texts]
+    folded = unicodedata.normalize("NFKC", joined).casefold().translate(_TRANSLATION)
+    return [_fold_long_vowels(key) for key in folded.split("\n")] if texts else []
+
+
+def romaji_to_katakana(text):
+    """Transliterate the romaji in `text`, IME style.
+
+    Returns ``(converted, pending)`` where `pending` is the number of
+    trailing letters that do not form a complete syllable yet ("pik").
+    Other characters pass through unchanged.
+    """
+    text = text.casefold()
+    out = []
+    pending = 0
+    i = 0
+    while i < len(text):
+        char = text[i]
+        following = text[i + 1] if i + 1 < len(text) else ""
+        if char == "n" and following not in VOWELS and following != "y":
+            # "n" before a consonant or at the end; "nn" spells one ン
+            out.append("ン")
+            i += 2 if following == "n" and text[i + 2:i + 3] not in VOWELS | {"y"} else 1
+            pending = 0
+            continue
+        if char.isascii() and char.isalpha() and char == following and char not in VOWELS:
+            out.append("ッ")
+            i += 1
+            continue
+        for length in range(ROMAJI_MAX, 0, -1):
+            kana = ROMAJI.get(text[i:i + length])
+            if kana:
+                out.append(kana)
+                i += length
+                pending = 0
+                break
+        else:
+            out.append(char)
+            pending = pending + 1 if char.isascii() and char.isalpha() else 0
+            i += 1
+    return "".join(out), pending
+
+
+def query_keys(text):
+    """Return the distinct search keys to try for what the user typed."""
+    keys = [search_key(text)]
+    if any(char.isascii() and char.isalpha() for char in text):
+        converted, pending = romaji_to_katakana(unicodedata.normalize("NFKC", text))
+        keys.append(search_key(converted))
+        if pending:
+            # Still typing a syllable: match on the complete part
+            keys.append(search_key(converted[:-pending]))
+    return [key for key in dict.fromkeys(keys) if key]
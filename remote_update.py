@@ -1,23 +1,54 @@
 import tkinter as tk
 from tkinter import messagebox, simpledialog, ttk, filedialog
 import sqlite3
+from autocomplete import AutocompleteIndex, SUGGEST_DELAY_MS
+from migrations import migrate
+from alias_store import FormTable, ndex_for_name, fetch_aliases
+from alias_view import AliasListView
+from artwork import ArtworkLoader, ArtworkPanel
+from edit_session import EditSession, ADD, IDLE_COMMIT_MS
+import instrumentation
+from search_index import search_aliases
+from drive_cache import DriveCache, DEFAULT_CACHE_DIR
+from drive_sync import SyncWorker
+from transfer import download_url
+from version_store import VersionStore, DriveBackend, read_tables, alias_changes, format_diff
+import changesets
+import memory_db
+from alias_merge import merge_databases, apply_merge
 import os
+import shutil
 import tempfile
-import requests
 import re
 import json
-import time
-from google.oauth2.service_account import Credentials
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload, MediaIoBaseDownload
-import io
+
+# The Google API client is imported where it is first used: it takes longer
+# to import than the rest of the tool, and the window should appear before
+# Drive is contacted.
+
+def build_drive_service(credentials_file):
+    """Build the Google Drive API service from a service account file."""
+    from google.oauth2.service_account import Credentials
+    from googleapiclient.discovery import build
+
+    # Load credentials from the service account file
+    scopes = ['https://www.googleapis.com/auth/drive']
+    credentials = Credentials.from_service_account_file(credentials_file, scopes=scopes)
+    
+    # Build the Drive API service
+    return build('drive', 'v3', credentials=credentials)
 
 class PokemonAliasManager:
-    def __init__(self, root, drive_url, credentials_file=None):
+    def __init__(self, root, drive_url, credentials_file=None, cache_dir=DEFAULT_CACHE_DIR, work_path=None):
         self.root = root
         self.drive_url = drive_url
         self.credentials_file = credentials_file
         self.service = None
+        self.cache = DriveCache(cache_dir)
+        self.sync = SyncWorker(root, on_progress=self.show_transfer_progress)
+        self.storage = None  # changeset storage next to the Drive file, created on the worker
+        self.version_store = None  # version history next to the Drive file, created on the worker
+        self.client_id = changesets.new_client_id()
         
         # Extract file ID from the URL
         file_id_match = re.search(r'/d/([a-zA-Z0-9_-]+)', self.drive_url)
@@ -26,37 +57,41 @@ class PokemonAliasManager:
         else:
             raise ValueError("Invalid Google Drive URL. Could not extract file ID.")
         
-        # Create a temporary file to store the database
-        fd, self.db_path = tempfile.mkstemp(suffix='.db')
-        os.close(fd)
-        
-        # Setup Google Drive service if credentials file is provided
-        if credentials_file and os.path.exists(credentials_file):
-            self.setup_drive_service(credentials_file)
+        # The working copy lives in memory unless a file is given to keep it on disk
+        self.db_path = work_path
         
-        # Download the database from Google Drive
-        self.download_db()
+        # Add a status bar to show sync status
+        self.status_var = tk.StringVar()
         
-        self.conn = sqlite3.connect(self.db_path)
-        self.cursor = self.conn.cursor()
+        # The database is opened once a copy is available (cached or downloaded)
+        self.conn = None
+        self.cursor = None
+        self.session = None
         self.selected_pokemon = None
         self.selected_alias = None
-        
-        # Add a status bar to show sync status
-        self.status_var = tk.StringVar()
-        self.status_var.set("データベースが正常にダウンロードされました")
+        self.autocomplete = AutocompleteIndex()
+        self.forms = FormTable()
+        self._suggest_job = None
+        self._search_job = None
+        self._refresh_job = None
+        self._commit_job = None
+        self.search_results = {}
+        self.use_api = bool(credentials_file and os.path.exists(credentials_file))
         
         self.setup_ui()
+        
+        # Show the last cached copy right away and contact Drive in the background
+        if self.cache.has(self.file_id):
+            self.reopen_db(self.cache.db_path(self.file_id))
+            self.status_var.set("前回取得したデータベースを表示しています。Google Driveに接続中...")
+        else:
+            self.status_var.set("Google Driveに接続中...")
+        self.root.after_idle(self.connect_drive)
     
     def setup_drive_service(self, credentials_file):
         """Setup Google Drive API service."""
         try:
-            # Load credentials from the service account file
-            scopes = ['https://www.googleapis.com/auth/drive']
-            credentials = Credentials.from_service_account_file(credentials_file, scopes=scopes)
-            
-            # Build the Drive API service
-            self.service = build('drive', 'v3', credentials=credentials)
+            self.service = build_drive_service(credentials_file)
             return True
         except Exception as e:
             messagebox.showerror("API認証エラー", f"Google Drive APIの認証に失敗しました: {str(e)}")
@@ -74,6 +109,14 @@ class PokemonAliasManager:
         self.pokemon_entry.bind("<KeyRelease>", self.suggest_pokemon)
         self.pokemon_entry.bind("<<ComboboxSelected>>", self.select_pokemon)
 
+        # Search every alias by substring (full-text index)
+        tk.Label(self.root, text="別名で検索").grid(row=1, column=0, padx=5, pady=5)
+        self.alias_search_var = tk.StringVar()
+        self.alias_search_entry = ttk.Combobox(self.root, textvariable=self.alias_search_var, width=30)
+        self.alias_search_entry.grid(row=1, column=1, padx=5, pady=5)
+        self.alias_search_entry.bind("<KeyRelease>", self.search_by_alias)
+        self.alias_search_entry.bind("<<ComboboxSelected>>", self.select_search_result)
+
         # Alias display
         tk.Label(self.root, text="すがた:").grid(row=2, column=0, padx=5, pady=5)
         self.form_var = tk.StringVar()
@@ -81,9 +124,14 @@ class PokemonAliasManager:
         self.form_option = tk.OptionMenu(self.root, self.form_var, "")
         self.form_option.grid(row=2, column=1, padx=5, pady=5)
 
-        self.alias_listbox = tk.Listbox(self.root, width=40, height=10)
-        self.alias_listbox.grid(row=3, column=0, columnspan=2, padx=5, pady=5)
-        self.alias_listbox.bind("<Button-3>", self.show_alias_options)
+        # Artwork of the selected form, loaded in the background
+        self.artwork_panel = ArtworkPanel(self.root, self.forms, ArtworkLoader(self.root))
+        self.artwork_panel.grid(row=2, column=2, rowspan=2, padx=5, pady=5)
+        self.form_var.trace('w', self.update_artwork)
+
+        self.alias_view = AliasListView(self.root, width=40, height=10)
+        self.alias_view.grid(row=3, column=0, columnspan=2, padx=5, pady=5)
+        self.alias_view.bind("<Button-3>", self.show_alias_options)
 
         # Buttons
         button_frame = tk.Frame(self.root)
@@ -92,15 +140,26 @@ class PokemonAliasManager:
         tk.Button(button_frame, text="別名の追加", command=self.add_alias).grid(row=0, column=0, padx=5, pady=5)
         tk.Button(button_frame, text="別名の削除", command=self.delete_alias).grid(row=0, column=1, padx=5, pady=5)
         tk.Button(button_frame, text="ローカルに保存", command=self.save_local).grid(row=0, column=2, padx=5, pady=5)
+        tk.Button(button_frame, text="元に戻す", command=self.undo_edit).grid(row=1, column=0, padx=5, pady=5)
+        tk.Button(button_frame, text="やり直す", command=self.redo_edit).grid(row=1, column=1, padx=5, pady=5)
+        self.root.bind("<Control-z>", self.undo_edit)
+        self.root.bind("<Control-y>", self.redo_edit)
+        self.root.bind("<Control-s>", self.commit_edits)
         
         # Google Drive sync buttons
         drive_frame = tk.Frame(self.root)
         drive_frame.grid(row=5, column=0, columnspan=2, padx=5, pady=5)
         
         # Only show upload button if API is configured
-        if self.service:
-            tk.Button(drive_frame, text="Google Driveに保存", command=self.upload_to_drive).grid(row=0, column=0, padx=5, pady=5)
-            tk.Button(drive_frame, text="最新版を取得", command=self.refresh_from_drive).grid(row=0, column=1, padx=5, pady=5)
+        if self.use_api:
+            self.upload_button = tk.Button(drive_frame, text="Google Driveに保存", command=self.upload_to_drive)
+            self.upload_button.grid(row=0, column=0, padx=5, pady=5)
+            self.refresh_button = tk.Button(drive_frame, text="最新版を取得", command=self.refresh_from_drive)
+            self.refresh_button.grid(row=0, column=1, padx=5, pady=5)
+            self.history_button = tk.Button(drive_frame, text="バージョン履歴", command=self.show_versions)
+            self.history_button.grid(row=0, column=2, padx=5, pady=5)
+            self.cancel_button = tk.Button(drive_frame, text="キャンセル", command=self.sync.cancel, state=tk.DISABLED)
+            self.cancel_button.grid(row=0, column=3, padx=5, pady=5)
         else:
             tk.Label(drive_frame, text="Google Drive APIが設定されていません。認証情報が必要です。").grid(row=0, column=0, columnspan=2, padx=5, pady=5)
             tk.Button(drive_frame, text="認証情報を設定", command=self.set_credentials).grid(row=1, column=0, columnspan=2, padx=5, pady=5)
@@ -109,42 +168,82 @@ class PokemonAliasManager:
         status_bar = tk.Label(self.root, textvariable=self.status_var, bd=1, relief=tk.SUNKEN, anchor=tk.W)
         status_bar.grid(row=6, column=0, columnspan=2, sticky=tk.W+tk.E, padx=5, pady=5)
 
-    def download_db(self):
-        """Download the database from Google Drive."""
-        try:
-            if self.service:
-                # Download using Google Drive API
-                request = self.service.files().get_media(fileId=self.file_id)
-                fh = io.FileIO(self.db_path, 'wb')
-                downloader = MediaIoBaseDownload(fh, request)
-                done = False
-                while done is False:
-                    status, done = downloader.next_chunk()
-                fh.close()
-                self.status_var.set("データベースが正常にダウンロードされました")
-            else:
-                # Fallback to direct download link
-                download_url = f"https://drive.google.com/uc?id={self.file_id}&export=download"
-                
-                # Download the file
-                response = requests.get(download_url)
-                
-                if response.status_code == 200:
-                    with open(self.db_path, 'wb') as f:
-                        f.write(response.content)
-                    self.status_var.set("データベースが正常にダウンロードされました (API未使用)")
-                else:
-                    raise Exception(f"ダウンロードエラー: {response.status_code}")
-                
-        except Exception as e:
+    def set_transfer_state(self, busy):
+        """Enable the cancel button only while a transfer is running."""
+        if not self.use_api:  # no transfer buttons without API credentials
+            return
+        self.upload_button.config(state=tk.DISABLED if busy else tk.NORMAL)
+        self.refresh_button.config(state=tk.DISABLED if busy else tk.NORMAL)
+        self.history_button.config(state=tk.DISABLED if busy else tk.NORMAL)
+        self.cancel_button.config(state=tk.NORMAL if busy else tk.DISABLED)
+
+    def show_transfer_progress(self, fraction, message):
+        self.status_var.set(f"{message}... {fraction:.0%}")
+
+    @instrumentation.traced("drive_download")
+    def download_file(self, path, progress=None, cancel_event=None, file_id=None, service=None):
+        """Download the Drive file to `path` using the Google Drive API.
+
+        May run on the sync worker thread; it only touches `path`.
+        """
+        # The storage prefers the compressed copy of the base when it is current
+        storage = self.get_storage(file_id or self.file_id, service)
+        storage.read_base(path, progress, cancel_event)
+
+    @instrumentation.traced("drive_download")
+    def download_public(self, path, file_id, progress=None, cancel_event=None):
+        """Download the file through its public link, for use without API credentials."""
+        download_url(f"https://drive.google.com/uc?id={file_id}&export=download", path, progress, cancel_event)
+
+    def connect_drive(self):
+        """Connect to Google Drive and load the latest database on the sync worker."""
+        credentials_file = self.credentials_file if self.use_api else None
+        file_id = self.file_id
+
+        def transfer(progress, cancel_event):
+            if not credentials_file:
+                # No metadata without the API, so this copy is never reused as "unchanged"
+                self.cache.download(file_id, lambda path: self.download_public(path, file_id, progress, cancel_event),
+                                    {})
+                return None, self.cache.db_path(file_id)
+            try:
+                service = build_drive_service(credentials_file)
+            except Exception as e:
+                return e, None
+            return service, self.fetch_latest(service, file_id, progress, cancel_event)
+
+        def on_done(value):
+            service, latest = value
+            self.set_transfer_state(False)
+            if isinstance(service, Exception):
+                messagebox.showerror("API認証エラー", f"Google Drive APIの認証に失敗しました: {str(service)}")
+                self.status_var.set("Google Drive APIの認証に失敗しました")
+                return
+            if service is None:
+                self.reopen_db(latest)
+                self.status_var.set("データベースが正常にダウンロードされました (API未使用)")
+                return
+            self.service = service
+            self.load_latest(latest, keep_pending=True)
+
+        def on_error(e):
+            self.set_transfer_state(False)
             self.status_var.set(f"エラー: {str(e)}")
-            messagebox.showerror("ダウンロードエラー", f"データベースのダウンロードに失敗しました: {str(e)}")
+            if self.conn is None:
+                messagebox.showerror("ダウンロードエラー", f"データベースのダウンロードに失敗しました: {str(e)}")
+
+        def on_cancel():
+            self.set_transfer_state(False)
+            self.status_var.set("Google Driveへの接続をキャンセルしました")
+
+        self.set_transfer_state(True)
+        self.sync.start(transfer, on_done, on_error, on_cancel)
 
     def save_local(self):
         """Save the database to a local file."""
-        # Commit any pending transactions
-        self.conn.commit()
-        
+        if self.conn is None:
+            messagebox.showerror("保存エラー", "データベースがまだ読み込まれていません。")
+            return
         # Ask for a location to save
         file_path = filedialog.asksaveasfilename(
             defaultextension=".db",
@@ -155,8 +254,8 @@ class PokemonAliasManager:
         if file_path:
             try:
                 # Copy the database to the selected location
-                with open(self.db_path, 'rb') as src, open(file_path, 'wb') as dst:
-                    dst.write(src.read())
+                self.commit_edits()
+                memory_db.save(self.conn, file_path)
                 
                 self.status_var.set(f"データベースが {file_path} に保存されました")
                 messagebox.showinfo("成功", f"データベースが {file_path} に正常に保存されました")
@@ -178,120 +277,447 @@ class PokemonAliasManager:
                 self.root.destroy()  # Restart the app to apply changes
             
     def upload_to_drive(self):
-        """Upload the database to Google Drive."""
+        """Sync the edits to Google Drive, or save the current content as a version."""
         if not self.service:
             messagebox.showerror("APIエラー", "Google Drive APIが設定されていません。")
             return
+        if self.sync.busy():
+            messagebox.showinfo("転送中", "別の転送が実行中です。完了するまでお待ちください。")
+            return
             
-        try:
-            # Commit any pending transactions
-            self.conn.commit()
-            
-            # Create file metadata
-            file_metadata = {
-                'name': f'pokemons_{time.strftime("%Y%m%d_%H%M%S")}.db',  # Create version with timestamp
-            }
-            
-            # Create media
-            media = MediaFileUpload(self.db_path, mimetype='application/x-sqlite3')
-            
-            # Check if we should create a new file or update existing one
-            update_existing = messagebox.askyesno("アップロード方法", 
-                                                "既存のファイルを上書きしますか？\nはい: 既存ファイルを上書き\nいいえ: 新しいバージョンを作成")
-            
-            if update_existing:
-                # Update the existing file
-                file = self.service.files().update(
-                    fileId=self.file_id,
-                    media_body=media,
-                    fields='id'
-                ).execute()
-                self.status_var.set(f"Google Driveのファイルが更新されました")
+        # Commit any pending transactions
+        self.commit_edits()
+        
+        # Check if we should sync the existing file or record a version
+        update_existing = messagebox.askyesnocancel("アップロード方法", 
+                                            "既存のファイルを更新しますか？\nはい: 既存ファイルに変更分を同期\nいいえ: 現在の内容を新しいバージョンとして履歴に保存")
+        if update_existing is None:
+            return
+        if update_existing:
+            self.sync_changes()
+        else:
+            self.save_version()
+
+    def get_versions(self, service=None):
+        """Return the version store next to the Drive file; called on the sync worker."""
+        if self.version_store is None or self.version_store.backend.base_file_id != self.file_id:
+            self.version_store = VersionStore(DriveBackend(service or self.service, self.file_id),
+                                              cache_dir=os.path.join(self.cache.cache_dir, "versions"))
+        return self.version_store
+
+    def save_version(self):
+        """Record the current tables in the version history on the sync worker."""
+        message = simpledialog.askstring("バージョンの保存", "このバージョンのメモ（省略可）")
+        if message is None:
+            return
+        # Rows are read on the main thread; hashing and uploading run on the worker
+        tables = read_tables(self.conn)
+
+        def transfer(progress, cancel_event):
+            progress(0.0, "バージョンを保存中")
+            return self.get_versions().save(tables, message)
+
+        def on_done(value):
+            self.set_transfer_state(False)
+            version, created = value
+            if created:
+                self.status_var.set(f"新しいバージョンを保存しました ({version.id[:12]})")
             else:
-                # Create a new file
-                file = self.service.files().create(
-                    body=file_metadata,
-                    media_body=media,
-                    fields='id'
-                ).execute()
-                self.file_id = file.get('id')
-                self.status_var.set(f"新しいバージョンがGoogle Driveに保存されました (ID: {self.file_id})")
-            
-            messagebox.showinfo("成功", "データベースがGoogle Driveに正常に保存されました")
-            
-        except Exception as e:
+                self.status_var.set("前回のバージョンから変更がないため保存しませんでした")
+
+        def on_error(e):
+            self.set_transfer_state(False)
             self.status_var.set(f"エラー: {str(e)}")
-            messagebox.showerror("アップロードエラー", f"Google Driveへのアップロードに失敗しました: {str(e)}")
+            messagebox.showerror("アップロードエラー", f"バージョンの保存に失敗しました: {str(e)}")
+
+        def on_cancel():
+            self.set_transfer_state(False)
+            self.status_var.set("バージョンの保存をキャンセルしました")
+
+        self.set_transfer_state(True)
+        self.sync.start(transfer, on_done, on_error, on_cancel)
+
+    def run_version_task(self, message, task, on_done):
+        """Run `task(store)` on the sync worker and pass its result to `on_done`."""
+        if not self.service or self.sync.busy():
+            return
+
+        def done(value):
+            self.set_transfer_state(False)
+            self.status_var.set("")
+            on_done(value)
+
+        def on_error(e):
+            self.set_transfer_state(False)
+            self.status_var.set(f"エラー: {str(e)}")
+            messagebox.showerror("バージョン履歴", f"バージョン履歴の取得に失敗しました: {str(e)}")
+
+        def on_cancel():
+            self.set_transfer_state(False)
+            self.status_var.set("キャンセルしました")
+
+        self.set_transfer_state(True)
+        self.status_var.set(message)
+        self.sync.start(lambda progress, cancel_event: task(self.get_versions()), done, on_error, on_cancel)
+
+    def show_versions(self):
+        self.run_version_task("バージョン一覧を取得中...", lambda store: store.versions(), self.open_version_window)
+
+    def open_version_window(self, versions):
+        window = tk.Toplevel(self.root)
+        window.title("バージョン履歴")
+        listbox = tk.Listbox(window, width=70, height=15)
+        listbox.pack(padx=5, pady=5, fill=tk.BOTH, expand=True)
+        for version in versions:
+            listbox.insert(tk.END, version.describe())
+
+        def selected():
+            selection = listbox.curselection()
+            return versions[selection[0]] if selection else None
+
+        buttons = tk.Frame(window)
+        buttons.pack(padx=5, pady=5)
+        tk.Button(buttons, text="現在との差分", command=lambda: self.show_version_diff(selected())).pack(side=tk.LEFT, padx=5)
+        tk.Button(buttons, text="この版に戻す", command=lambda: self.restore_version(selected())).pack(side=tk.LEFT, padx=5)
+
+    def show_version_diff(self, version):
+        if version is None:
+            return
+        tables = read_tables(self.conn)
+
+        def show(changes):
+            window = tk.Toplevel(self.root)
+            window.title(f"差分: {version.id[:12]} → 現在")
+            text = tk.Text(window, width=80, height=25)
+            text.pack(padx=5, pady=5, fill=tk.BOTH, expand=True)
+            text.insert(tk.END, format_diff(changes))
+            text.config(state=tk.DISABLED)
+
+        self.run_version_task("差分を計算中...", lambda store: store.diff(version.id, tables), show)
+
+    def restore_version(self, version):
+        """Bring the aliases back to `version` as one undoable, journaled edit."""
+        if version is None:
+            return
+        if not messagebox.askokcancel("バージョンの復元", f"別名を次のバージョンの内容に戻しますか？\n{version.describe()}"):
+            return
+
+        def apply(tables):
+            added, removed = alias_changes(read_tables(self.conn), tables)
+            self.session.apply_changes(f"バージョン {version.id[:12]} の復元", added, removed)
+            self.schedule_commit()
+            self.status_var.set(f"バージョン {version.id[:12]} を復元しました (追加 {len(added)} 件、削除 {len(removed)} 件、未同期)")
+
+        self.run_version_task("バージョンを取得中...", lambda store: store.load(version.id), apply)
     
     def refresh_from_drive(self):
-        """Refresh the database from Google Drive."""
+        """Refresh the database from Google Drive on the sync worker."""
         if not self.service:
             messagebox.showerror("APIエラー", "Google Drive APIが設定されていません。")
             return
+        if self.sync.busy():
+            messagebox.showinfo("転送中", "別の転送が実行中です。完了するまでお待ちください。")
+            return
             
         # Check if there are unsaved changes
         confirm = messagebox.askokcancel("更新確認", 
                                        "Google Driveから最新のデータベースを取得します。\n未保存の変更は失われます。続行しますか？")
         if not confirm:
             return
-            
+
+        self.start_refresh()
+
+    def start_refresh(self, keep_pending=False, after=None):
+        """Download the base on the sync worker, then replay changesets on it.
+
+        With `keep_pending`, unpushed journal entries are carried over to the
+        new base instead of being discarded.
+        """
+        file_id = self.file_id
+
+        def transfer(progress, cancel_event):
+            return self.fetch_latest(self.service, file_id, progress, cancel_event)
+
+        def on_done(value):
+            self.set_transfer_state(False)
+            self.load_latest(value, keep_pending)
+            if after:
+                after()
+
+        def on_error(e):
+            self.set_transfer_state(False)
+            self.status_var.set(f"エラー: {str(e)}")
+            messagebox.showerror("ダウンロードエラー", f"データベースのダウンロードに失敗しました: {str(e)}")
+
+        def on_cancel():
+            self.set_transfer_state(False)
+            self.status_var.set("ダウンロードをキャンセルしました (現在のデータベースはそのままです)")
+
+        self.set_transfer_state(True)
+        self.status_var.set("Google Driveを確認しています...")
+        self.sync.start(transfer, on_done, on_error, on_cancel)
+
+    @instrumentation.traced("drive_fetch", rows=lambda latest: len(latest[1].fetched))
+    def fetch_latest(self, service, file_id, progress, cancel_event):
+        """Bring the cache up to date and fetch unapplied changesets (sync worker)."""
+        # Downloads into the cache only; the open connection is swapped on the main thread
+        cached = self.cache.sync(service, file_id,
+                                 lambda path: self.download_file(path, progress, cancel_event, file_id, service))
+        progress(1.0, "変更履歴を確認中")
+        storage = self.get_storage(file_id, service)
+        base_generation, applied = changesets.base_state(cached[0])
+        result = changesets.exchange(storage, base_generation, applied, None, self.client_id)
+        return cached, result
+
+    def load_latest(self, latest, keep_pending):
+        """Open the base fetched by `fetch_latest` and replay changesets on it."""
+        (cached_path, downloaded), result = latest
+        pending = changesets.pending_ops(self.conn)[0] if keep_pending and self.conn else []
+        self.reopen_db(cached_path)
+        if pending:
+            changesets.carry_pending(self.conn, pending)
+        if not result.needs_rebase:
+            changesets.apply_result(self.conn, result, 0)
+        self.autocomplete.load(self.conn)
+        self.status_var.set(f"Google Driveから最新のデータベースを取得しました (変更 {len(result.fetched)} 件を適用)"
+                            if downloaded or result.fetched
+                            else "Google Driveのデータベースに変更がないため、キャッシュを使用しました")
+
+    def get_storage(self, file_id, service=None):
+        """Return the changeset storage for `file_id`; called on the sync worker."""
+        if self.storage is None or self.storage.base_file_id != file_id:
+            self.storage = changesets.DriveStorage(service or self.service, file_id)
+        return self.storage
+
+    def sync_changes(self, after=None):
+        """Pull other editors' changesets and push local edits as one changeset."""
+        if not self.service or self.sync.busy():
+            return
+        self.commit_edits()
+        ops, pushed_through = changesets.pending_ops(self.conn)
+        payload = changesets.encode(ops) if ops else None
+        local_generation = changesets.generation(self.conn)
+        applied = changesets.applied_names(self.conn)
+        file_id = self.file_id
+
+        def transfer(progress, cancel_event):
+            progress(0.0, "変更を同期中")
+            return changesets.exchange(self.get_storage(file_id), local_generation, applied, payload, self.client_id)
+
+        def on_done(result):
+            self.set_transfer_state(False)
+            if result.needs_rebase:
+                # Someone compacted the changesets into a new base: reload it, keeping our edits
+                self.start_refresh(keep_pending=True, after=lambda: self.sync_changes(after))
+                return
+            changesets.apply_result(self.conn, result, pushed_through)
+            if result.fetched:
+                self.autocomplete.load(self.conn)
+                self.update_alias_list()
+            self.status_var.set(f"Google Driveと同期しました (取得 {len(result.fetched)} 件 / 送信 {len(ops) if result.pushed else 0} 件)")
+            if result.remote_count >= changesets.COMPACT_THRESHOLD:
+                self.compact_base(after)
+            elif after:
+                after()
+
+        def on_error(e):
+            self.set_transfer_state(False)
+            self.status_var.set(f"エラー: {str(e)}")
+            messagebox.showerror("同期エラー", f"Google Driveとの同期に失敗しました: {str(e)}")
+
+        def on_cancel():
+            self.set_transfer_state(False)
+            self.status_var.set("同期をキャンセルしました")
+
+        self.set_transfer_state(True)
+        self.sync.start(transfer, on_done, on_error, on_cancel)
+
+    def compact_base(self, after=None):
+        """Upload a new base snapshot that absorbs the accumulated changesets.
+
+        If the Drive file changed since it was downloaded, the remote copy is
+        first three-way merged into the local database so nothing is overwritten.
+        """
+        file_id = self.file_id
+
+        def check_remote(progress, cancel_event):
+            progress(0.0, "Google Driveの更新を確認中")
+            meta = self.cache.fetch_metadata(self.service, file_id)
+            if self.cache.is_current(file_id, meta):
+                return meta, None
+            fd, remote_path = tempfile.mkstemp(suffix='.db')
+            os.close(fd)
+            try:
+                self.download_file(remote_path, progress, cancel_event, file_id)
+            except BaseException:
+                os.remove(remote_path)
+                raise
+            return meta, remote_path
+
+        def on_checked(value):
+            self.set_transfer_state(False)
+            meta, remote_path = value
+            if remote_path:
+                try:
+                    if not self.merge_remote(file_id, remote_path):
+                        self.status_var.set("アップロードを中止しました")
+                        return
+                    # The remote copy becomes the base for the next comparison
+                    self.cache.store(file_id, remote_path, meta)
+                finally:
+                    os.remove(remote_path)
+            self.upload_base(after)
+
+        def on_error(e):
+            self.set_transfer_state(False)
+            self.status_var.set(f"エラー: {str(e)}")
+
+        self.set_transfer_state(True)
+        self.sync.start(check_remote, on_checked, on_error, lambda: self.set_transfer_state(False))
+
+    def merge_remote(self, file_id, remote_path):
+        """Three-way merge the remote alias table into the local database.
+
+        Returns False when the user aborted because of conflicts.
+        """
+        self.commit_edits()
+        result = merge_databases(self.cache.db_path(file_id), self.conn, remote_path)
+        if result.conflicts:
+            details = "\n".join(conflict.describe() for conflict in result.conflicts[:10])
+            if len(result.conflicts) > 10:
+                details += f"\n... ほか {len(result.conflicts) - 10} 件"
+            choice = messagebox.askyesnocancel(
+                "競合",
+                f"Google Drive上のデータベースが他の人によって更新されており、{len(result.conflicts)} 件の競合があります。\n\n"
+                f"{details}\n\nはい: ローカルの変更を優先\nいいえ: 両方の別名を残す\nキャンセル: アップロードを中止")
+            if choice is None:
+                return False
+            if choice:
+                result = result.prefer_local()
+        apply_merge(self.conn, result)
+        changesets.merge_sync_state(self.conn, remote_path)
+        self.autocomplete.load(self.conn)
+        self.update_alias_list()
+        return True
+
+    def upload_base(self, after=None):
+        fd, snapshot_path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        next_generation, contained = changesets.make_base_snapshot(self.conn, snapshot_path)
+        file_id = self.file_id
+
+        def transfer(progress, cancel_event):
+            progress(0.0, "変更履歴を統合中")
+            return changesets.upload_base(self.get_storage(file_id), snapshot_path, next_generation, contained)
+
+        def finished():
+            self.set_transfer_state(False)
+            try:
+                os.remove(snapshot_path)
+            except OSError:
+                pass
+
+        def on_done(meta):
+            changesets.finish_compaction(self.conn, next_generation)
+            self.cache.store(file_id, snapshot_path, meta)
+            finished()
+            self.status_var.set("変更履歴を新しいベースに統合しました")
+            if after:
+                after()
+
+        def on_error(e):
+            finished()
+            if isinstance(e, changesets.BaseChanged):
+                # Someone else compacted first: reload their base, keeping our edits
+                self.start_refresh(keep_pending=True, after=after)
+                return
+            self.status_var.set(f"エラー: 変更履歴の統合に失敗しました: {str(e)}")
+
+        self.set_transfer_state(True)
+        self.sync.start(transfer, on_done, on_error, finished)
+
+    def reopen_db(self, source):
+        """Replace the working database with `source` (a path or database bytes) and reset the UI."""
         # Close current connection
-        self.conn.close()
-        
-        # Download fresh copy
-        self.download_db()
+        if self.conn is not None:
+            self.commit_edits()
+            self.session.close()
+            self.conn.close()
         
         # Reopen connection
-        self.conn = sqlite3.connect(self.db_path)
+        if self.db_path is None:
+            self.conn = memory_db.load(source)
+        else:
+            # A -wal left by a crash would be replayed onto the new content
+            for leftover in (self.db_path + '-wal', self.db_path + '-shm'):
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+            if isinstance(source, bytes):
+                with open(self.db_path, 'wb') as f:
+                    f.write(source)
+            else:
+                shutil.copyfile(source, self.db_path)
+            self.conn = sqlite3.connect(self.db_path)
+        migrate(self.conn)
+        instrumentation.attach(self.conn)
+        self.forms.load(self.conn)
         self.cursor = self.conn.cursor()
+        self.autocomplete.load(self.conn)
+        self.session = EditSession(self.conn, [changesets.record], listeners=[self.on_alias_change])
         
         # Reset UI
         self.pokemon_var.set("")
         self.form_var.set("")
-        self.alias_listbox.delete(0, tk.END)
+        self.alias_view.clear()
         self.selected_pokemon = None
         self.selected_alias = None
-        
-        self.status_var.set("Google Driveから最新のデータベースを取得しました")
 
     def suggest_pokemon(self, event):
-        typed = self.pokemon_var.get()
-        self.cursor.execute("SELECT NAME FROM POKEMON_NAME WHERE NAME LIKE ?", ('%' + typed + '%',))
-        suggestions = [row[0] for row in self.cursor.fetchall()]
-        self.pokemon_entry['values'] = suggestions
+        # Debounce keystrokes: only the last key within the delay triggers a lookup
+        if self._suggest_job is not None:
+            self.root.after_cancel(self._suggest_job)
+        self._suggest_job = self.root.after(SUGGEST_DELAY_MS, self.apply_suggestions)
+
+    def apply_suggestions(self):
+        self._suggest_job = None
+        self.pokemon_entry['values'] = self.autocomplete.suggest(self.pokemon_var.get())
+
+    def search_by_alias(self, event):
+        # Debounced like suggest_pokemon
+        if self._search_job is not None:
+            self.root.after_cancel(self._search_job)
+        self._search_job = self.root.after(SUGGEST_DELAY_MS, self.apply_alias_search)
+
+    def apply_alias_search(self):
+        self._search_job = None
+        self.search_results = {}
+        if self.conn is None:
+            return
+        for ndex, form_id, alias in search_aliases(self.conn, self.alias_search_var.get()):
+            name = self.autocomplete.name_by_ndex.get(ndex)
+            label = self.forms.label_for(ndex, form_id)
+            self.search_results[f"{alias} → {name} ({label})"] = (name, label)
+        self.alias_search_entry['values'] = list(self.search_results)
+
+    def select_search_result(self, event=None):
+        result = self.search_results.get(self.alias_search_var.get())
+        if result:
+            name, label = result
+            self.pokemon_var.set(name)
+            self.select_pokemon()
+            self.form_var.set(label)
 
     def select_pokemon(self, event=None):
         self.selected_pokemon = self.pokemon_var.get()
         self.update_forms_and_aliases()
 
     def update_forms_and_aliases(self):
-        self.cursor.execute("SELECT NDEX_NUMBER FROM POKEMON_NAME WHERE NAME = ?", (self.selected_pokemon,))
-        result = self.cursor.fetchone()
-        if result:
-            self.ndex_number = result[0]
-            self.cursor.execute("SELECT FORM_ID, FORM_NAME, GENDER FROM POKEMON_NAME_FORM WHERE NDEX_NUMBER = ?", (self.ndex_number,))
-            forms = []
-            form_exists = False
-
-            for form_id, form_name, gender in self.cursor.fetchall():
-                if form_id == 0:
-                    form_exists = True
-                    if form_name is None and gender is None:
-                        forms.append("基本")
-                    elif form_name is not None:
-                        forms.append(form_name)
-                    elif gender is not None:
-                        forms.append(gender)
-                else:
-                    if form_name is not None:
-                        forms.append(form_name)
-                    if gender is not None:
-                        forms.append(gender)
-
-            if not form_exists:
-                forms.append("基本")
-
-            forms = list(set(forms))  # Remove duplicates
+        if self.cursor is None:  # still waiting for the first download
+            return
+        ndex_number = ndex_for_name(self.cursor, self.selected_pokemon)
+        if ndex_number is not None:
+            self.ndex_number = ndex_number
+            forms = self.forms.labels(self.ndex_number)
 
             self.form_option['menu'].delete(0, 'end')
             self.form_var.set(forms[0] if forms else "")
@@ -300,27 +726,26 @@ class PokemonAliasManager:
 
             self.update_alias_list()
 
+    def update_artwork(self, *args):
+        if self.form_var.get():
+            self.artwork_panel.show(self.ndex_number, self.form_var.get())
+
     def update_alias_list(self, *args):
+        # Resetting the form menu fires form_var several times; query once
+        if self._refresh_job is None:
+            self._refresh_job = self.root.after_idle(self.refresh_alias_list)
+
+    def refresh_alias_list(self):
+        self._refresh_job = None
         if self.form_var.get():
-            self.alias_listbox.delete(0, tk.END)
-            form_name = self.form_var.get()
-            if form_name == "基本":
-                self.cursor.execute("SELECT NAME_ALIAS FROM POKEMON_NAME_ALIAS WHERE NDEX_NUMBER = ? AND FORM_ID = 0", (self.ndex_number,))
-            else:
-                self.cursor.execute("""
-                    SELECT NAME_ALIAS FROM POKEMON_NAME_ALIAS 
-                    WHERE NDEX_NUMBER = ? AND FORM_ID = 
-                    (SELECT FORM_ID FROM POKEMON_NAME_FORM 
-                     WHERE (FORM_NAME = ? OR GENDER = ?) AND NDEX_NUMBER = ?)""", 
-                    (self.ndex_number, form_name, form_name, self.ndex_number))
-            aliases = [alias[0] for alias in self.cursor.fetchall()]
-            for alias in aliases:
-                self.alias_listbox.insert(tk.END, alias)
+            form_id = self.forms.form_id(self.ndex_number, self.form_var.get())
+            aliases = fetch_aliases(self.cursor, self.ndex_number, form_id)
+            self.alias_view.set_items((self.ndex_number, form_id), aliases)
 
     def show_alias_options(self, event):
-        selection = self.alias_listbox.curselection()
-        if selection:
-            self.selected_alias = self.alias_listbox.get(selection[0])
+        selected = self.alias_view.selected()
+        if selected is not None:
+            self.selected_alias = selected
             menu = tk.Menu(self.root, tearoff=0)
             menu.add_command(label="編集", command=self.edit_alias)
             menu.add_command(label="削除", command=self.delete_alias)
@@ -329,61 +754,82 @@ class PokemonAliasManager:
     def add_alias(self):
         new_alias = simpledialog.askstring("別名の追加", "新しい別名を入力")
         if new_alias:
-            form_name = self.form_var.get()
-            if form_name == "基本":
-                form_id = 0
-            else:
-                self.cursor.execute("""
-                    SELECT FORM_ID FROM POKEMON_NAME_FORM 
-                    WHERE (FORM_NAME = ? OR GENDER = ?) AND NDEX_NUMBER = ?""", 
-                    (form_name, form_name, self.ndex_number))
-                form_id = self.cursor.fetchone()
-                form_id = form_id[0] if form_id else 0
-
-            self.cursor.execute("INSERT INTO POKEMON_NAME_ALIAS (NAME_ALIAS, NDEX_NUMBER, FORM_ID) VALUES (?, ?, ?)", (new_alias, self.ndex_number, form_id))
-            self.conn.commit()
-            self.update_alias_list()
-            self.status_var.set("別名が追加されました (ローカルのみ)")
+            form_id = self.forms.form_id(self.ndex_number, self.form_var.get())
+
+            try:
+                self.session.add_alias(self.ndex_number, form_id, new_alias)
+            except sqlite3.IntegrityError:
+                messagebox.showerror("別名の追加", f"'{new_alias}' は既に登録されています")
+                return
+            self.schedule_commit()
+            self.status_var.set("別名が追加されました (未同期)")
 
     def edit_alias(self):
         new_alias = simpledialog.askstring("別名の編集", "新しい別名を入力", initialvalue=self.selected_alias)
         if new_alias:
-            form_name = self.form_var.get()
-            if form_name == "基本":
-                form_id = 0
-            else:
-                self.cursor.execute("""
-                    SELECT FORM_ID FROM POKEMON_NAME_FORM 
-                    WHERE (FORM_NAME = ? OR GENDER = ?) AND NDEX_NUMBER = ?""", 
-                    (form_name, form_name, self.ndex_number))
-                form_id = self.cursor.fetchone()
-                form_id = form_id[0] if form_id else 0
-
-            self.cursor.execute("UPDATE POKEMON_NAME_ALIAS SET NAME_ALIAS = ? WHERE NAME_ALIAS = ? AND NDEX_NUMBER = ? AND FORM_ID = ?", (new_alias, self.selected_alias, self.ndex_number, form_id))
-            self.conn.commit()
-            self.update_alias_list()
-            self.status_var.set("別名が編集されました (ローカルのみ)")
+            form_id = self.forms.form_id(self.ndex_number, self.form_var.get())
+
+            try:
+                self.session.rename_alias(self.ndex_number, form_id, self.selected_alias, new_alias)
+            except sqlite3.IntegrityError:
+                messagebox.showerror("別名の編集", f"'{new_alias}' は既に登録されています")
+                return
+            self.schedule_commit()
+            self.status_var.set("別名が編集されました (未同期)")
 
     def delete_alias(self):
         if self.selected_alias:
             confirm = messagebox.askokcancel("別名の削除", f"本当に '{self.selected_alias}' を削除しますか？")
             if confirm:
-                form_name = self.form_var.get()
-                if form_name == "基本":
-                    form_id = 0
-                else:
-                    self.cursor.execute("""
-                        SELECT FORM_ID FROM POKEMON_NAME_FORM 
-                        WHERE (FORM_NAME = ? OR GENDER = ?) AND NDEX_NUMBER = ?""", 
-                        (form_name, form_name, self.ndex_number))
-                    form_id = self.cursor.fetchone()
-                    form_id = form_id[0] if form_id else 0
-
-                self.cursor.execute("DELETE FROM POKEMON_NAME_ALIAS WHERE NAME_ALIAS = ? AND NDEX_NUMBER = ? AND FORM_ID = ?", (self.selected_alias, self.ndex_number, form_id))
-                self.conn.commit()
-                self.update_alias_list()
+                form_id = self.forms.form_id(self.ndex_number, self.form_var.get())
+
+                self.session.delete_alias(self.ndex_number, form_id, self.selected_alias)
+                self.schedule_commit()
                 self.selected_alias = None
-                self.status_var.set("別名が削除されました (ローカルのみ)")
+                self.status_var.set("別名が削除されました (未同期)")
+
+    def on_alias_change(self, op, ndex_number, form_id, alias):
+        # The list is patched in place, including for undo/redo of other forms' edits
+        shown = self.alias_view.key == (ndex_number, form_id)
+        if op == ADD:
+            self.autocomplete.add_alias(alias, ndex_number)
+            if shown:
+                self.alias_view.add(alias)
+        else:
+            self.autocomplete.remove_alias(alias, ndex_number)
+            if shown:
+                self.alias_view.remove(alias)
+
+    def schedule_commit(self):
+        # Commit once editing pauses instead of after every change
+        if self._commit_job is not None:
+            self.root.after_cancel(self._commit_job)
+        self._commit_job = self.root.after(IDLE_COMMIT_MS, self.commit_edits)
+
+    def commit_edits(self, event=None):
+        if self._commit_job is not None:
+            self.root.after_cancel(self._commit_job)
+            self._commit_job = None
+        if self.session is not None:
+            self.session.commit()
+
+    def undo_edit(self, event=None):
+        self.step_edit(self.session.undo if self.session else None, "元に戻す")
+
+    def redo_edit(self, event=None):
+        self.step_edit(self.session.redo if self.session else None, "やり直す")
+
+    def step_edit(self, step, title):
+        if step is None:
+            return
+        try:
+            edit = step()
+        except sqlite3.IntegrityError:
+            messagebox.showerror(title, "同じ別名が既に登録されているため実行できません")
+            return
+        if edit:
+            self.schedule_commit()
+            self.status_var.set(f"{title}: {edit.label} (未同期)")
 
     def run(self):
         self.root.protocol("WM_DELETE_WINDOW", self.on_close)
@@ -391,18 +837,28 @@ class PokemonAliasManager:
 
     def on_close(self):
         """Handle window close event - ask to save changes."""
-        confirm = messagebox.askyesnocancel("終了", "変更をローカルに保存しますか？")
-        if confirm is None:  # Cancel was clicked
-            return
-        elif confirm:  # Yes was clicked
-            self.save_local()
-        
-        # Clean up temporary file
-        self.conn.close()
-        try:
-            os.remove(self.db_path)
-        except:
-            pass
+        if self.sync.busy():
+            if not messagebox.askokcancel("終了", "Google Driveとの転送中です。中止して終了しますか？"):
+                return
+            self.sync.cancel()
+        elif self.service and self.conn is not None and changesets.pending_ops(self.conn)[0]:
+            push = messagebox.askyesnocancel("終了", "Google Driveに同期していない変更があります。同期してから終了しますか？")
+            if push is None:
+                return
+            if push:
+                self.sync_changes(after=self.on_close)
+                return
+        if self.conn is not None:
+            confirm = messagebox.askyesnocancel("終了", "変更をローカルに保存しますか？")
+            if confirm is None:  # Cancel was clicked
+                return
+            elif confirm:  # Yes was clicked
+                self.save_local()
+            
+            self.commit_edits()
+            self.session.close()
+            self.conn.close()
+        self.artwork_panel.loader.close()
         self.root.destroy()
 
     def __del__(self):
@@ -410,12 +866,9 @@ class PokemonAliasManager:
             self.conn.close()
         except:
             pass
-        try:
-            os.remove(self.db_path)
-        except:
-            pass
 
 if __name__ == "__main__":
+    instrumentation.enable_from_env()
     # Google Drive file URL
     drive_url = "https://drive.google.com/file/d/1X1GQ_TSW8PTsSG1ZtMkzpPuddezsHcA9/view?usp=drive_link"
     
@@ -424,6 +877,9 @@ if __name__ == "__main__":
     if os.path.exists('credentials.json'):
         credentials_file = 'credentials.json'
     
+    # The working copy is kept in memory; POKEMON_DB_WORK_FILE keeps it on disk instead
+    work_path = os.environ.get("POKEMON_DB_WORK_FILE") or None
+    
     root = tk.Tk()
-    app = PokemonAliasManager(root, drive_url, credentials_file)
+    app = PokemonAliasManager(root, drive_url, credentials_file, work_path=work_path)
     app.run()
\ No newline at end of file
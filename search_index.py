@@ -0,0 +1,191 @@
+"""Trigram full-text index over pokémon names, form names and aliases.
+
+POKEMON_SEARCH is an FTS5 table with the trigram tokenizer, so substring
+queries of three or more characters are answered from the index instead of
+scanning the tables with ``LIKE '%...%'``. Triggers on POKEMON_NAME,
+POKEMON_NAME_FORM and POKEMON_NAME_ALIAS keep it in sync with every writer,
+including the bulk tools and changeset replay.
+
+Index rows are keyed by the rowid of their source row (``rowid * 4 + kind``).
+VACUUM may renumber the rowids of tables without an INTEGER PRIMARY KEY, so
+call `rebuild` after vacuuming.
+
+The index is not part of the versioned migrations: the same file can be
+opened by SQLite builds with and without FTS5, so `ensure` checks for it on
+every open and remembers the answer for that connection. Without FTS5 the triggers would make every write to the source
+tables fail with "no such module: fts5", so `ensure` drops them and
+searches fall back to LIKE; the next build with FTS5 recreates and refills
+the index.
+"""
+import sqlite3
+
+from instrumentation import traced
+
+SEARCH_TABLE = "POKEMON_SEARCH"
+NAME, FORM, ALIAS = 1, 2, 3
+# Trigram queries shorter than this cannot use the index
+MIN_QUERY_LENGTH = 3
+SEARCH_LIMIT = 50
+
+_SOURCES = [
+    # (kind, table, text column, NDEX expression, FORM_ID expression)
+    (NAME, "POKEMON_NAME", "NAME", "NDEX_NUMBER", "NULL"),
+    (FORM, "POKEMON_NAME_FORM", "FORM_NAME", "NDEX_NUMBER", "FORM_ID"),
+    (ALIAS, "POKEMON_NAME_ALIAS", "NAME_ALIAS", "NDEX_NUMBER", "FORM_ID"),
+]
+
+
+def supported(conn):
+    """True when this SQLite build has FTS5 with the trigram tokenizer."""
+    try:
+        conn.execute("CREATE VIRTUAL TABLE temp.SEARCH_PROBE USING fts5(TEXT, tokenize = 'trigram')")
+    except sqlite3.OperationalError:
+        return False
+    conn.execute("DROP TABLE temp.SEARCH_PROBE")
+    return True
+
+
+_TRIGGERS = [f"{table}_SEARCH_{event}" for _, table, _, _, _ in _SOURCES for event in ("AI", "AD", "AU")]
+
+
+def _present(conn, names):
+    marks = ", ".join("?" * len(names))
+    return {row[0] for row in conn.execute(f"SELECT name FROM sqlite_master WHERE name IN ({marks})", names)}
+
+
+# id(connection) -> whether the index was usable when last checked;
+# sqlite3 connections take no weak references or attributes
+_ready = {}
+
+
+def exists(conn):
+    """True when the index and the triggers keeping it current are in place."""
+    return len(_present(conn, [SEARCH_TABLE] + _TRIGGERS)) == len(_TRIGGERS) + 1
+
+
+def ensure(conn):
+    """Create the index if this build supports it, else drop its triggers.
+
+    Returns True when `search` can use the index.
+    """
+    if supported(conn):
+        if not exists(conn):
+            rebuild(conn)
+        _ready[id(conn)] = True
+        return True
+    _ready[id(conn)] = False
+    triggers = _present(conn, _TRIGGERS)
+    if triggers:
+        conn.commit()
+        for name in triggers:
+            conn.execute(f"DROP TRIGGER {name}")
+        conn.commit()
+    return False
+
+
+def _populate(cursor):
+    for kind, table, column, ndex, form_id in _SOURCES:
+        cursor.execute(f"""
+            INSERT INTO {SEARCH_TABLE} (rowid, TEXT, KIND, NDEX_NUMBER, FORM_ID)
+            SELECT rowid * 4 + {kind}, {column}, {kind}, {ndex}, {form_id} FROM {table}
+            WHERE {column} IS NOT NULL""")
+
+
+def create(cursor):
+    """Create the index, its triggers and its contents."""
+    cursor.execute(f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5(
+            TEXT, KIND UNINDEXED, NDEX_NUMBER UNINDEXED, FORM_ID UNINDEXED,
+            tokenize = 'trigram')""")
+    for kind, table, column, ndex, form_id in _SOURCES:
+        insert = f"""
+            INSERT INTO {SEARCH_TABLE} (rowid, TEXT, KIND, NDEX_NUMBER, FORM_ID)
+            SELECT new.rowid * 4 + {kind}, new.{column}, {kind}, new.{ndex}, {form_id.replace('FORM_ID', 'new.FORM_ID')}
+            WHERE new.{column} IS NOT NULL;"""
+        delete = f"DELETE FROM {SEARCH_TABLE} WHERE rowid = old.rowid * 4 + {kind};"
+        cursor.execute(f"CREATE TRIGGER IF NOT EXISTS {table}_SEARCH_AI AFTER INSERT ON {table} BEGIN {insert} END")
+        cursor.execute(f"CREATE TRIGGER IF NOT EXISTS {table}_SEARCH_AD AFTER DELETE ON {table} BEGIN {delete} END")
+        cursor.execute(f"CREATE TRIGGER IF NOT EXISTS {table}_SEARCH_AU AFTER UPDATE ON {table} "
+                       f"BEGIN {delete} {insert} END")
+    cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+    _populate(cursor)
+
+
+def rebuild(conn):
+    """Refill the index from the source tables, creating it if needed."""
+    if not supported(conn):
+        return False
+    conn.commit()
+    cursor = conn.cursor()
+    create(cursor)
+    conn.commit()
+    _ready[id(conn)] = True
+    return True
+
+
+def _usable(conn):
+    ready = _ready.get(id(conn))
+    if ready is None:
+        # Not opened through `ensure`: check once
+        ready = _ready[id(conn)] = exists(conn)
+    return ready
+
+
+def _match_expression(text):
+    # One phrase, so operators and quotes typed by the user are literal
+    return '"' + text.replace('"', '""') + '"'
+
+
+def _like_pattern(text):
+    escaped = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+_ORDER = """ORDER BY TEXT = :text DESC, substr(TEXT, 1, length(:text)) = :text DESC,
+    length(TEXT), NDEX_NUMBER, KIND, FORM_ID, TEXT LIMIT :limit"""
+
+
+@traced("search")
+def search(conn, text, kinds=(NAME, FORM, ALIAS), limit=SEARCH_LIMIT):
+    """Return ``(KIND, NDEX_NUMBER, FORM_ID, TEXT)`` rows whose text contains `text`.
+
+    Exact matches come first, then prefix matches, then shorter texts.
+    Queries shorter than MIN_QUERY_LENGTH fall back to a LIKE scan of the
+    index, which trigram cannot serve; without the index, `like_search`
+    scans the tables.
+    """
+    text = text.strip()
+    if not text:
+        return []
+    if not _usable(conn):
+        return like_search(conn, text, kinds, limit)
+    kind_list = ", ".join(str(int(kind)) for kind in kinds)
+    if len(text) >= MIN_QUERY_LENGTH:
+        condition, argument = f"{SEARCH_TABLE} MATCH :query", _match_expression(text)
+    else:
+        condition, argument = "TEXT LIKE :query ESCAPE '\\'", _like_pattern(text)
+    try:
+        return conn.execute(f"""
+            SELECT KIND, NDEX_NUMBER, FORM_ID, TEXT FROM {SEARCH_TABLE}
+            WHERE {condition} AND KIND IN ({kind_list}) {_ORDER}""",
+            {"query": argument, "text": text, "limit": limit}).fetchall()
+    except sqlite3.OperationalError:
+        # The index was dropped since it was checked (or the id was reused)
+        if exists(conn):
+            raise
+        _ready[id(conn)] = False
+        return like_search(conn, text, kinds, limit)
+
+
+def like_search(conn, text, kinds=(NAME, FORM, ALIAS), limit=SEARCH_LIMIT):
+    """Same results as `search`, from ``LIKE '%...%'`` scans of the source tables."""
+    selects = [f"""SELECT {kind} AS KIND, {ndex} AS NDEX_NUMBER, {form_id} AS FORM_ID, {column} AS TEXT
+                   FROM {table} WHERE {column} LIKE :query ESCAPE '\\'"""
+               for kind, table, column, ndex, form_id in _SOURCES if kind in kinds]
+    return conn.execute(f"SELECT * FROM ({' UNION ALL '.join(selects)}) {_ORDER}",
+                        {"query": _like_pattern(text), "text": text, "limit": limit}).fetchall()
+
+
+def search_aliases(conn, text, limit=SEARCH_LIMIT):
+    """Return ``(NDEX_NUMBER, FORM_ID, NAME_ALIAS)`` for aliases containing `text`."""
+    return [(ndex, form_id, alias) for _, ndex, form_id, alias in search(conn, text, (ALIAS,), limit)]
@@ -0,0 +1,75 @@
+import sqlite3
+
+import pytest
+
+from alias_artifact import AliasArtifact, ArtifactError, compile_artifact, verify
+from benchmarks.synthetic import create_database
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "pokemons.db")
+    conn = create_database(path, pokemon=200, aliases=3000, forms_per_pokemon=0.8, seed=1)
+    conn.executemany("INSERT INTO POKEMON_NAME_ALIAS VALUES (?, ?, ?)", [
+        (6, 1, "リザX"),
+        (7, 0, "Zeni"),
+        (8, 0, "zeni"),  # same key as "Zeni" on another pokémon
+        (9, 0, " ZENI "),
+    ])
+    # Two forms with the same label: only the first one gets a menu entry
+    conn.executemany("INSERT INTO POKEMON_NAME_FORM VALUES (?, ?, ?, ?, ?)", [
+        (25, 11, None, "キャップ", "0025_11"),
+        (25, 12, None, "キャップ", "0025_12"),
+    ])
+    conn.commit()
+    conn.close()
+    return path
+
+
+def build(db_path, tmp_path):
+    path = str(tmp_path / "aliases.bin")
+    conn = sqlite3.connect(db_path)
+    try:
+        compile_artifact(conn, path)
+    finally:
+        conn.close()
+    return path
+
+
+def test_artifact_matches_independent_sql(db_path, tmp_path):
+    with AliasArtifact(build(db_path, tmp_path)) as artifact:
+        assert verify(artifact, db_path) == []
+        assert artifact.resolve("リザx") == (6, 1)
+        assert artifact.resolve_all("zeni") == [(7, 0), (8, 0), (9, 0)]
+        assert artifact.resolve("存在しない") is None
+        assert artifact.artwork(25, 12) == "0025_12"
+
+
+def test_prefix_is_sorted_and_limited(db_path, tmp_path):
+    with AliasArtifact(build(db_path, tmp_path)) as artifact:
+        results = artifact.prefix("ze", limit=5)
+        assert results[0] == ("Zeni", 7, 0)
+        assert len(results) <= 5
+
+
+def test_verify_reports_database_changes(db_path, tmp_path):
+    path = build(db_path, tmp_path)
+    conn = sqlite3.connect(db_path)
+    conn.execute("INSERT INTO POKEMON_NAME_ALIAS VALUES (1, 0, 'あとから追加')")
+    conn.commit()
+    conn.close()
+    with AliasArtifact(path) as artifact:
+        problems = verify(artifact, db_path)
+    assert any("あとから追加" in problem for problem in problems)
+
+
+def test_corruption_fails_the_checksum(db_path, tmp_path):
+    path = build(db_path, tmp_path)
+    with open(path, "r+b") as f:
+        f.seek(-1, 2)
+        last = f.read(1)
+        f.seek(-1, 2)
+        f.write(bytes([last[0] ^ 0xFF]))
+    with AliasArtifact(path) as artifact:
+        with pytest.raises(ArtifactError):
+            artifact.check()
@@ -0,0 +1,117 @@
+import os
+import shutil
+import sqlite3
+
+import pytest
+
+import changesets
+from edit_session import EditSession
+from migrations import migrate
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PIKACHU = 25
+
+
+class Hide:
+    """Storage wrapper whose listing misses one changeset, like a push racing ours."""
+
+    def __init__(self, storage, hidden):
+        self.storage = storage
+        self.hidden = hidden
+
+    def __getattr__(self, name):
+        return getattr(self.storage, name)
+
+    def list_changesets(self):
+        return [name for name in self.storage.list_changesets() if name != self.hidden]
+
+
+class Client:
+    def __init__(self, tmp_path, storage, client_id):
+        self.client_id = client_id
+        self.path = str(tmp_path / f"{client_id}.db")
+        storage.read_base(self.path)
+        self.conn = sqlite3.connect(self.path)
+        migrate(self.conn)
+        self.session = EditSession(self.conn, [changesets.record])
+
+    def sync(self, storage):
+        self.session.commit()
+        return changesets.sync(self.conn, storage, self.client_id)
+
+    def aliases(self):
+        return sorted(self.conn.execute(
+            "SELECT NDEX_NUMBER, FORM_ID, NAME_ALIAS FROM POKEMON_NAME_ALIAS").fetchall())
+
+    def has(self, alias):
+        return (PIKACHU, 0, alias) in self.aliases()
+
+
+@pytest.fixture
+def storage(tmp_path):
+    storage = changesets.LocalStorage(str(tmp_path / "drive"))
+    shutil.copyfile(os.path.join(REPO, "pokemons.db"), os.path.join(storage.directory, storage.base_name))
+    return storage
+
+
+def test_push_then_fetch(tmp_path, storage):
+    a = Client(tmp_path, storage, "a")
+    b = Client(tmp_path, storage, "b")
+    a.session.add_alias(PIKACHU, 0, "でんきねずみ")
+
+    pushed = a.sync(storage).pushed
+    assert pushed == f"{storage.prefix}0000.000001.a.jsonl"
+    assert changesets.pending_ops(a.conn) == ([], 0)
+
+    result = b.sync(storage)
+    assert [name for name, _ in result.fetched] == [pushed]
+    assert b.has("でんきねずみ")
+    assert a.aliases() == b.aliases()
+    # Nothing new on either side
+    assert not a.sync(storage).fetched and not b.sync(storage).fetched
+
+
+def test_same_seq_push_is_replayed_in_name_order(tmp_path, storage):
+    a = Client(tmp_path, storage, "a")
+    b = Client(tmp_path, storage, "b")
+    a.session.add_alias(PIKACHU, 0, "ぴか")
+    a.sync(storage)
+    b.sync(storage)
+
+    # b deletes and re-adds the alias, a deletes it; a does not see b's push
+    b.session.delete_alias(PIKACHU, 0, "ぴか")
+    b.session.add_alias(PIKACHU, 0, "ぴか")
+    b_name = b.sync(storage).pushed
+    a.session.delete_alias(PIKACHU, 0, "ぴか")
+    a_name = a.sync(Hide(storage, b_name)).pushed
+    assert changesets.parse_changeset_name(a_name, storage.prefix)[1] == \
+        changesets.parse_changeset_name(b_name, storage.prefix)[1]
+
+    # a's changeset sorts first, so b replays its own again after it
+    result = b.sync(storage)
+    assert [name for name, _ in result.fetched] == [a_name, b_name]
+    assert [name for name, _ in a.sync(storage).fetched] == [b_name]
+    assert a.has("ぴか") and b.has("ぴか")
+    assert a.aliases() == b.aliases()
+
+
+def test_compaction_is_refused_after_another_one(tmp_path, storage):
+    a = Client(tmp_path, storage, "a")
+    b = Client(tmp_path, storage, "b")
+    a.session.add_alias(PIKACHU, 0, "ぴかぴか")
+    a.sync(storage)
+
+    assert not changesets.compact(a.conn, storage, "a", str(tmp_path / "a-snapshot.db")).needs_rebase
+    assert storage.read_manifest() == {"generation": 1}
+    assert storage.list_changesets() == []
+
+    # b still thinks it is on generation 0 and must not overwrite a's base
+    snapshot = str(tmp_path / "b-snapshot.db")
+    next_generation, contained = changesets.make_base_snapshot(b.conn, snapshot)
+    with pytest.raises(changesets.BaseChanged):
+        changesets.upload_base(storage, snapshot, next_generation, contained)
+    assert changesets.compact(b.conn, storage, "b", snapshot).needs_rebase
+
+    c = Client(tmp_path, storage, "c")
+    assert c.has("ぴかぴか")
+    assert changesets.generation(c.conn) == 1
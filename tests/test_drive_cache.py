@@ -0,0 +1,77 @@
+import pytest
+
+from drive_cache import DriveCache, METADATA_FIELDS
+
+
+class FakeFiles:
+    def __init__(self, service):
+        self.service = service
+
+    def get(self, fileId, fields):
+        assert fields == METADATA_FIELDS
+        self.service.requests.append(fileId)
+        meta = dict(self.service.meta)
+        return type("Request", (), {"execute": lambda request: meta})()
+
+
+class FakeService:
+    def __init__(self, meta):
+        self.meta = meta
+        self.requests = []
+
+    def files(self):
+        return FakeFiles(self)
+
+
+class Download:
+    def __init__(self, data):
+        self.data = data
+        self.calls = 0
+
+    def __call__(self, path):
+        self.calls += 1
+        with open(path, "wb") as f:
+            f.write(self.data)
+
+
+def test_miss_then_hit(tmp_path):
+    cache = DriveCache(str(tmp_path))
+    service = FakeService({"id": "abc", "md5Checksum": "1111", "modifiedTime": "2024-01-01T00:00:00Z"})
+    download = Download(b"first")
+
+    path, downloaded = cache.sync(service, "abc", download)
+    assert downloaded and download.calls == 1
+    with open(path, "rb") as f:
+        assert f.read() == b"first"
+
+    path, downloaded = cache.sync(service, "abc", download)
+    assert not downloaded and download.calls == 1
+    assert service.requests == ["abc", "abc"]
+
+
+def test_changed_checksum_downloads_again(tmp_path):
+    cache = DriveCache(str(tmp_path))
+    service = FakeService({"id": "abc", "md5Checksum": "1111", "modifiedTime": "2024-01-01T00:00:00Z"})
+    cache.sync(service, "abc", Download(b"first"))
+
+    # Same modifiedTime, new content: the checksum decides
+    service.meta["md5Checksum"] = "2222"
+    download = Download(b"second")
+    path, downloaded = cache.sync(service, "abc", download)
+    assert downloaded and download.calls == 1
+    with open(path, "rb") as f:
+        assert f.read() == b"second"
+    assert cache.load_meta("abc")["md5Checksum"] == "2222"
+
+
+def test_failed_download_keeps_nothing(tmp_path):
+    cache = DriveCache(str(tmp_path))
+    service = FakeService({"id": "abc", "md5Checksum": "1111"})
+
+    def broken(path):
+        raise OSError("connection reset")
+
+    with pytest.raises(OSError):
+        cache.sync(service, "abc", broken)
+    assert not cache.has("abc")
+    assert sorted(p.name for p in tmp_path.iterdir()) == []
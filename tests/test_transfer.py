@@ -0,0 +1,112 @@
+import gzip
+import http.client
+import random
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from transfer import RetryPolicy, download_url
+
+NO_WAIT = RetryPolicy(retries=3, base=0)
+
+
+def sample_data():
+    rng = random.Random(7)
+    words = ["ピカチュウ", "リザードン", "pika", "zeni", "メガ", "キョダイ"]
+    return "\n".join(" ".join(rng.choice(words) for _ in range(8)) + str(i) for i in range(20000)).encode("utf-8")
+
+
+class Server:
+    """Serves `body`, cutting the first response (or all of them) off after `cut` bytes."""
+
+    def __init__(self, body, cut, honour_range=True, cut_all=False):
+        self.body = body
+        self.cut = cut
+        self.honour_range = honour_range
+        self.cut_all = cut_all
+        self.ranges = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                header = self.headers.get("Range")
+                server.ranges.append(header)
+                start = 0
+                if header and server.honour_range:
+                    start = int(header[len("bytes="):].rstrip("-"))
+                    self.send_response(206)
+                    self.send_header("Content-Range", f"bytes {start}-{len(server.body) - 1}/{len(server.body)}")
+                else:
+                    self.send_response(200)
+                self.send_header("Content-Length", str(len(server.body) - start))
+                self.end_headers()
+                if server.cut_all or len(server.ranges) == 1:
+                    self.wfile.write(server.body[start:start + server.cut])
+                    self.wfile.flush()
+                    self.connection.shutdown(socket.SHUT_RDWR)
+                    self.close_connection = True
+                else:
+                    self.wfile.write(server.body[start:])
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/pokemons.db.gz"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, args=(0.05,), daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def data():
+    return sample_data()
+
+
+def test_interrupted_gzip_download_resumes(tmp_path, data):
+    body = gzip.compress(data)
+    path = str(tmp_path / "pokemons.db")
+    with Server(body, cut=len(body) // 3) as server:
+        received = download_url(server.url, path, retry=NO_WAIT, size=4096)
+    assert server.ranges == [None, f"bytes={len(body) // 3}-"]
+    assert received == len(body)
+    with open(path, "rb") as f:
+        assert f.read() == data
+
+
+def test_server_ignoring_range_restarts(tmp_path, data):
+    body = gzip.compress(data)
+    path = str(tmp_path / "pokemons.db")
+    with Server(body, cut=len(body) // 2, honour_range=False) as server:
+        received = download_url(server.url, path, retry=NO_WAIT, size=4096)
+    assert len(server.ranges) == 2 and server.ranges[1] is not None
+    assert received == len(body)
+    with open(path, "rb") as f:
+        assert f.read() == data
+
+
+def test_retries_count_from_the_last_progress(tmp_path, data):
+    body = gzip.compress(data)
+    path = str(tmp_path / "pokemons.db")
+    cut = len(body) // 8 + 1
+    with Server(body, cut=cut, cut_all=True) as server:
+        download_url(server.url, path, retry=NO_WAIT, size=4096)
+    # More interruptions than NO_WAIT.retries, but each one made progress
+    assert len(server.ranges) == 8
+    with open(path, "rb") as f:
+        assert f.read() == data
+
+
+def test_gives_up_without_progress(tmp_path, data):
+    with Server(gzip.compress(data), cut=0, cut_all=True) as server:
+        with pytest.raises((OSError, http.client.HTTPException)):
+            download_url(server.url, str(tmp_path / "pokemons.db"), retry=NO_WAIT, size=4096)
+    assert server.ranges == [None] * (NO_WAIT.retries + 1)
@@ -0,0 +1,313 @@
+"""Streaming, compressed and resumable transfers of the database file.
+
+Uploads are compressed with gzip (or zstd when the optional ``zstandard``
+package is installed); downloads detect the codec from the first bytes, so
+uncompressed files written by older versions still load. Downloaded data is
+decompressed chunk by chunk straight into the destination file.
+
+Each chunk is retried with exponential backoff on transient failures
+(connection errors, timeouts, HTTP 408/429/5xx). Retrying `next_chunk` of
+googleapiclient's media objects resumes from the last completed chunk, and
+`download_url` resumes plain HTTP downloads with a Range request, so a
+dropped connection never restarts a transfer from zero.
+
+Settings (environment):
+    POKEMON_DB_COMPRESSION  gzip (default), zstd or none
+    POKEMON_DB_CHUNK_SIZE   chunk size in bytes (rounded up to 256 KiB)
+"""
+import gzip
+import hashlib
+import http.client
+import io
+import os
+import random
+import shutil
+import time
+import urllib.request
+import zlib
+
+from drive_sync import TransferCancelled
+
+GZIP, ZSTD, NONE = "gzip", "zstd", "none"
+MIMETYPES = {GZIP: "application/gzip", ZSTD: "application/zstd", NONE: "application/x-sqlite3"}
+EXTENSIONS = {GZIP: ".gz", ZSTD: ".zst", NONE: ""}
+_MAGIC = {GZIP: b"\x1f\x8b", ZSTD: b"\x28\xb5\x2f\xfd"}
+
+# Drive's resumable protocol requires chunks in multiples of 256 KiB
+CHUNK_ALIGN = 256 * 1024
+DEFAULT_CHUNK_SIZE = 4 * CHUNK_ALIGN
+COMPRESS_LEVEL = {GZIP: 6, ZSTD: 10}
+TIMEOUT = 60
+TRANSIENT_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter: a random wait up to ``base * 2**attempt``."""
+
+    def __init__(self, retries=5, base=0.5, cap=30.0):
+        self.retries = retries
+        self.base = base
+        self.cap = cap
+
+    def delay(self, attempt):
+        return random.uniform(0, min(self.cap, self.base * 2 ** attempt))
+
+
+DEFAULT_RETRY = RetryPolicy()
+
+
+def chunk_size():
+    size = int(os.environ.get("POKEMON_DB_CHUNK_SIZE") or DEFAULT_CHUNK_SIZE)
+    return max(CHUNK_ALIGN, -(-size // CHUNK_ALIGN) * CHUNK_ALIGN)
+
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError:
+        return None
+    return zstandard
+
+
+def codec():
+    """The codec uploads use; zstd falls back to gzip without ``zstandard``."""
+    name = (os.environ.get("POKEMON_DB_COMPRESSION") or GZIP).lower()
+    if name not in MIMETYPES:
+        raise ValueError(f"未知の圧縮形式です: {name}")
+    if name == ZSTD and _zstd() is None:
+        return GZIP
+    return name
+
+
+def detect(head):
+    """Codec of a payload starting with `head`; anything else is taken as a raw database."""
+    for name, magic in _MAGIC.items():
+        if head.startswith(magic):
+            return name
+    return NONE
+
+
+def encode_bytes(data, name):
+    if name == GZIP:
+        # mtime=0: the same database always compresses to the same bytes
+        return gzip.compress(data, compresslevel=COMPRESS_LEVEL[GZIP], mtime=0)
+    if name == ZSTD:
+        return _zstd().ZstdCompressor(level=COMPRESS_LEVEL[ZSTD]).compress(data)
+    return data
+
+
+def file_md5(path):
+    """Hex md5 of a file, as Drive reports it in ``md5Checksum``."""
+    digest = hashlib.md5()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(DEFAULT_CHUNK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def encode_file(src_path, dst_path, name):
+    """Compress `src_path` into `dst_path` without reading it into memory."""
+    with open(src_path, "rb") as src, open(dst_path, "wb") as dst:
+        if name == GZIP:
+            with gzip.GzipFile(fileobj=dst, mode="wb", compresslevel=COMPRESS_LEVEL[GZIP], mtime=0) as out:
+                shutil.copyfileobj(src, out, DEFAULT_CHUNK_SIZE)
+        elif name == ZSTD:
+            _zstd().ZstdCompressor(level=COMPRESS_LEVEL[ZSTD]).copy_stream(src, dst)
+        else:
+            shutil.copyfileobj(src, dst, DEFAULT_CHUNK_SIZE)
+
+
+class DecodingWriter:
+    """File-like sink that decompresses what is written to it into `fileobj`.
+
+    The codec is detected from the first bytes. `close` checks that a
+    compressed stream was complete; it does not close `fileobj`.
+    """
+
+    HEAD = 4
+
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.codec = None
+        self._head = b""
+        self._decoder = None
+
+    def write(self, data):
+        size = len(data)
+        if self.codec is None:
+            self._head += data
+            if len(self._head) < self.HEAD:
+                return size
+            self._start()
+            data, self._head = self._head, b""
+        if self._decoder is None:
+            self.fileobj.write(data)
+        else:
+            self.fileobj.write(self._decoder.decompress(data))
+        return size
+
+    def _start(self):
+        self.codec = detect(self._head)
+        if self.codec == GZIP:
+            self._decoder = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
+        elif self.codec == ZSTD:
+            zstandard = _zstd()
+            if zstandard is None:
+                raise RuntimeError("zstdで圧縮されたファイルを読むには zstandard パッケージが必要です")
+            self._decoder = zstandard.ZstdDecompressor().decompressobj()
+
+    def close(self):
+        if self.codec is None and self._head:
+            self._start()
+            head, self._head = self._head, b""
+            self.write(head)
+        if self.codec == GZIP:
+            self.fileobj.write(self._decoder.flush())
+            if not self._decoder.eof:
+                raise IOError("圧縮データが途中で終わっています")
+        elif self.codec == ZSTD:
+            self.fileobj.write(self._decoder.flush())
+
+
+def is_transient(error):
+    """True for failures worth retrying: network errors and HTTP 408/429/5xx."""
+    status = getattr(getattr(error, "resp", None), "status", None) or getattr(error, "code", None)
+    if isinstance(status, int):
+        return status in TRANSIENT_STATUS
+    return isinstance(error, (OSError, http.client.HTTPException))
+
+
+def _wait(seconds, cancel_event):
+    if cancel_event is None:
+        time.sleep(seconds)
+    elif cancel_event.wait(seconds):
+        raise TransferCancelled()
+
+
+def run_chunks(next_chunk, message, progress=None, cancel_event=None, retry=DEFAULT_RETRY):
+    """Call a googleapiclient ``next_chunk`` until the transfer completes.
+
+    A chunk that fails transiently is retried with backoff; the media object
+    resumes from the last completed chunk. Returns the final result.
+    """
+    result = None
+    attempt = 0
+    fraction = 0.0
+    while not result:
+        if cancel_event is not None and cancel_event.is_set():
+            raise TransferCancelled()
+        try:
+            status, result = next_chunk()
+        except Exception as e:
+            if not is_transient(e) or attempt >= retry.retries:
+                raise
+            if progress:
+                progress(fraction, f"{message} (再試行 {attempt + 1}/{retry.retries})")
+            _wait(retry.delay(attempt), cancel_event)
+            attempt += 1
+            continue
+        attempt = 0
+        if progress and status:
+            fraction = status.progress()
+            progress(fraction, message)
+    return result
+
+
+def download_media(request, path, progress=None, cancel_event=None, retry=DEFAULT_RETRY):
+    """Download a Drive media request into `path`, decompressing as it arrives."""
+    from googleapiclient.http import MediaIoBaseDownload
+
+    with open(path, "wb") as f:
+        writer = DecodingWriter(f)
+        downloader = MediaIoBaseDownload(writer, request, chunksize=chunk_size())
+        run_chunks(downloader.next_chunk, "ダウンロード中", progress, cancel_event, retry)
+        writer.close()
+
+
+def upload_media(make_request, path=None, data=None, name=None, progress=None, cancel_event=None,
+                 retry=DEFAULT_RETRY):
+    """Compress and upload a database given as `path` or `data` (bytes).
+
+    ``make_request(media)`` returns the Drive create/update request for the
+    media body. Returns the Drive response.
+    """
+    from googleapiclient.http import MediaFileUpload, MediaIoBaseUpload
+
+    name = name or codec()
+    if data is not None:
+        media = MediaIoBaseUpload(io.BytesIO(encode_bytes(data, name)), mimetype=MIMETYPES[name],
+                                  chunksize=chunk_size(), resumable=True)
+        return run_chunks(make_request(media).next_chunk, "アップロード中", progress, cancel_event, retry)
+    if name == NONE:
+        encoded = path
+    else:
+        encoded = path + EXTENSIONS[name]
+        encode_file(path, encoded, name)
+    try:
+        media = MediaFileUpload(encoded, mimetype=MIMETYPES[name], chunksize=chunk_size(), resumable=True)
+        return run_chunks(make_request(media).next_chunk, "アップロード中", progress, cancel_event, retry)
+    finally:
+        if encoded != path:
+            os.remove(encoded)
+
+
+def _total_size(response, offset):
+    content_range = response.headers.get("Content-Range")
+    if content_range and "/" in content_range:
+        total = content_range.rsplit("/", 1)[1]
+        return int(total) if total.isdigit() else None
+    length = response.headers.get("Content-Length")
+    return offset + int(length) if length and length.isdigit() else None
+
+
+def download_url(url, path, progress=None, cancel_event=None, retry=DEFAULT_RETRY, size=None):
+    """Stream a plain HTTP download into `path`, decompressing as it arrives.
+
+    An interrupted response is resumed with ``Range: bytes=<received>-``;
+    servers that ignore the Range header are read again from the start.
+    Returns the number of bytes received.
+    """
+    size = size or chunk_size()
+    with open(path, "wb") as f:
+        writer = DecodingWriter(f)
+        received = 0
+        total = None
+        attempt = 0
+        while True:
+            request = urllib.request.Request(url)
+            if received:
+                request.add_header("Range", f"bytes={received}-")
+            try:
+                with urllib.request.urlopen(request, timeout=TIMEOUT) as response:
+                    if received and response.status != 206:
+                        f.seek(0)
+                        f.truncate()
+                        writer = DecodingWriter(f)
+                        received = 0
+                    total = _total_size(response, received)
+                    while True:
+                        if cancel_event is not None and cancel_event.is_set():
+                            raise TransferCancelled()
+                        chunk = response.read(size)
+                        if not chunk:
+                            break
+                        writer.write(chunk)
+                        received += len(chunk)
+                        attempt = 0
+                        if progress and total:
+                            progress(received / total, "ダウンロード中")
+                if total is not None and received < total:
+                    raise http.client.IncompleteRead(b"", total - received)
+                break
+            except TransferCancelled:
+                raise
+            except Exception as e:
+                if not is_transient(e) or attempt >= retry.retries:
+                    raise
+                if progress:
+                    progress(received / total if total else 0.0,
+                             f"ダウンロード中 (再試行 {attempt + 1}/{retry.retries})")
+                _wait(retry.delay(attempt), cancel_event)
+                attempt += 1
+        writer.close()
+    return received
@@ -0,0 +1,401 @@
+"""Content-addressed version history of the database tables.
+
+A version records POKEMON_NAME, POKEMON_NAME_FORM and POKEMON_NAME_ALIAS as
+chunks of rows: rows are grouped by NDEX_NUMBER range (CHUNK_SPAN pokémon
+per chunk), serialized canonically and stored once under their SHA-256.
+A version's manifest only lists chunk hashes, so saving a version uploads
+the chunks that changed since any earlier version plus one small manifest;
+storage grows with the size of the changes, not with the number of saves.
+
+Backend layout (names are mapped to files by the backend)::
+
+    objects/<sha256>        gzip-compressed chunk or manifest
+    refs/<created>-<id>     summary of one version (id, manifest, parent, message, counts)
+    index                   summaries of all versions, rebuilt from refs
+
+A version id hashes the manifest digest together with the parent, time and
+message, like a commit id, so saving content identical to an older version
+(e.g. after restoring it) still creates a new version; the manifest and its
+chunks are shared.
+
+Listing reads the index plus any refs it does not know yet; diffing two
+versions only loads the chunks whose hashes differ. Objects never change,
+so they are also kept in an optional local cache directory.
+
+Usage:
+    python version_store.py STORE save pokemons.db [-m MESSAGE]
+    python version_store.py STORE list
+    python version_store.py STORE diff A [B]     (B defaults to the database given by --db)
+    python version_store.py STORE restore ID pokemons.db
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import time
+
+import changesets
+from instrumentation import traced
+
+TABLES = {
+    "POKEMON_NAME": ("NDEX_NUMBER", "NAME"),
+    "POKEMON_NAME_FORM": ("NDEX_NUMBER", "FORM_ID", "GENDER", "FORM_NAME", "ARTWORK_FILENAME"),
+    "POKEMON_NAME_ALIAS": ("NDEX_NUMBER", "FORM_ID", "NAME_ALIAS"),
+}
+ALIAS_TABLE = "POKEMON_NAME_ALIAS"
+CHUNK_SPAN = 32
+
+
+# -- snapshots --------------------------------------------------------------------
+
+def read_tables(conn):
+    """Return ``{table: [row, ...]}`` in canonical order; cheap enough for the UI thread."""
+    tables = {}
+    for table, columns in TABLES.items():
+        column_list = ", ".join(columns)
+        tables[table] = [tuple(row) for row in conn.execute(
+            f"SELECT DISTINCT {column_list} FROM {table} ORDER BY {column_list}")]
+    return tables
+
+
+def _encode(value):
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), sort_keys=True).encode("utf-8")
+
+
+def _chunks(rows):
+    """Split sorted rows into ``{bucket: encoded chunk}`` by NDEX_NUMBER range."""
+    buckets = {}
+    for row in rows:
+        buckets.setdefault(row[0] // CHUNK_SPAN, []).append(row)
+    return {bucket: b"\n".join(_encode(list(row)) for row in bucket_rows)
+            for bucket, bucket_rows in buckets.items()}
+
+
+def _decode_chunk(data):
+    return [tuple(json.loads(line)) for line in data.split(b"\n") if line]
+
+
+def _digest(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def alias_changes(current, target):
+    """Return ``(added, removed)`` alias rows that turn `current` into `target`."""
+    now, then = set(current[ALIAS_TABLE]), set(target[ALIAS_TABLE])
+    return sorted(then - now), sorted(now - then)
+
+
+def restore(conn, tables):
+    """Replace the contents of every versioned table with `tables` in one transaction.
+
+    The editors restore aliases through EditSession instead, so the change
+    is journaled and can be undone.
+    """
+    current = read_tables(conn)
+    cursor = conn.cursor()
+    for table, columns in TABLES.items():
+        if current[table] == tables[table]:
+            continue
+        cursor.execute(f"DELETE FROM {table}")
+        cursor.executemany(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                           tables[table])
+    conn.commit()
+
+
+# -- backends -----------------------------------------------------------------------
+
+class LocalBackend:
+    """Version store in a local directory, used by the command line and in tests."""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def _path(self, name):
+        return os.path.join(self.directory, *name.split("/"))
+
+    def read(self, name):
+        try:
+            with open(self._path(name), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def write(self, name, data):
+        path = self._path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".part", "wb") as f:
+            f.write(data)
+        os.replace(path + ".part", path)
+
+    def list(self, prefix):
+        directory = self._path(prefix.rstrip("/"))
+        try:
+            return [f"{prefix}{name}" for name in os.listdir(directory) if not name.endswith(".part")]
+        except FileNotFoundError:
+            return []
+
+
+class DriveBackend(changesets.DriveStorage):
+    """Version store next to the base file on Google Drive.
+
+    ``objects/<hash>`` is stored as ``pokemons.versions.objects.<hash>``.
+    """
+
+    def __init__(self, service, base_file_id):
+        super().__init__(service, base_file_id)
+        self.version_prefix = os.path.splitext(self.base_name)[0] + ".versions."
+        self._names = None
+
+    def _file_name(self, name):
+        return self.version_prefix + name.replace("/", ".")
+
+    def _files(self):
+        if self._names is None:
+            self._names = {file["name"]: file["id"] for file in self._find(self.version_prefix)}
+        return self._names
+
+    def read(self, name):
+        file_id = self._files().get(self._file_name(name))
+        return self._read(file_id) if file_id else None
+
+    def write(self, name, data):
+        file_name = self._file_name(name)
+        result = self._write(file_name, data, "application/octet-stream", self._files().get(file_name))
+        self._names[file_name] = result["id"]
+
+    def list(self, prefix):
+        self._names = None
+        file_prefix = self._file_name(prefix)
+        return [prefix + name[len(file_prefix):] for name in self._files() if name.startswith(file_prefix)]
+
+
+# -- store --------------------------------------------------------------------------
+
+class Version:
+    def __init__(self, id, manifest, parent, created, message, counts):
+        self.id = id
+        self.manifest = manifest  # digest of the manifest object
+        self.parent = parent
+        self.created = created
+        self.message = message
+        self.counts = counts
+
+    @classmethod
+    def create(cls, manifest, parent, message, counts):
+        created = time.time()
+        version_id = _digest(_encode({"manifest": manifest, "parent": parent, "created": created,
+                                      "message": message}))
+        return cls(version_id, manifest, parent, created, message, counts)
+
+    def to_json(self):
+        return {"id": self.id, "manifest": self.manifest, "parent": self.parent, "created": self.created,
+                "message": self.message, "counts": self.counts}
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(data["id"], data["manifest"], data.get("parent"), data["created"], data.get("message", ""),
+                   data.get("counts", {}))
+
+    def ref_name(self):
+        return f"refs/{time.strftime('%Y%m%dT%H%M%S', time.gmtime(self.created))}-{self.id}"
+
+    def describe(self):
+        stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.created))
+        return f"{self.id[:12]}  {stamp}  別名 {self.counts.get(ALIAS_TABLE, 0)} 件  {self.message}"
+
+
+class VersionStore:
+    def __init__(self, backend, cache_dir=None):
+        self.backend = backend
+        self.cache = LocalBackend(cache_dir) if cache_dir else None
+        self._manifests = {}  # manifest digest -> manifest
+        self._manifest_ids = {}  # version id -> manifest digest
+
+    def _read_object(self, digest):
+        data = self.cache.read(f"objects/{digest}") if self.cache else None
+        if data is None:
+            data = self.backend.read(f"objects/{digest}")
+            if data is None:
+                raise KeyError(f"オブジェクト {digest[:12]} が見つかりません")
+            if self.cache:
+                self.cache.write(f"objects/{digest}", data)
+        return gzip.decompress(data)
+
+    def _encode_object(self, data):
+        return gzip.compress(data, mtime=0)
+
+    @traced("versions_list", rows=len)
+    def versions(self):
+        """All versions, newest first."""
+        data = self.backend.read("index")
+        known = {entry["id"]: Version.from_json(entry) for entry in json.loads(data)} if data else {}
+        refs = self.backend.list("refs/")
+        missing = [name for name in refs if name.rsplit("-", 1)[-1] not in known]
+        for name in missing:
+            ref = self.backend.read(name)
+            if ref:
+                version = Version.from_json(json.loads(ref))
+                known[version.id] = version
+        versions = sorted(known.values(), key=lambda version: version.created, reverse=True)
+        self._manifest_ids.update((version.id, version.manifest) for version in versions)
+        if missing:
+            self.backend.write("index", _encode([version.to_json() for version in versions]))
+        return versions
+
+    def resolve(self, prefix):
+        """Full id of the version whose id starts with `prefix`."""
+        matches = [version for version in self.versions() if version.id.startswith(prefix)]
+        if len(matches) != 1:
+            raise KeyError(f"バージョン '{prefix}' が{'見つかりません' if not matches else '複数あります'}")
+        return matches[0]
+
+    def manifest(self, version_id):
+        if version_id not in self._manifest_ids:
+            self.versions()
+        digest = self._manifest_ids[version_id]
+        if digest not in self._manifests:
+            self._manifests[digest] = json.loads(self._read_object(digest))
+        return self._manifests[digest]
+
+    @traced("versions_save")
+    def save(self, tables, message="", parent=None):
+        """Store `tables` (from `read_tables`) as a new version.
+
+        Only chunks and manifests the store does not have yet are written.
+        Returns ``(version, created)``; `created` is False when the content
+        is identical to the latest version, which is then returned instead.
+        """
+        versions = self.versions()
+        head = versions[0] if versions else None
+        existing = {name.split("/", 1)[1] for name in self.backend.list("objects/")}
+        manifest_tables = {}
+        for table, rows in tables.items():
+            entries = []
+            for bucket, data in sorted(_chunks(rows).items()):
+                digest = _digest(data)
+                if digest not in existing:
+                    self.backend.write(f"objects/{digest}", self._encode_object(data))
+                    existing.add(digest)
+                entries.append([bucket, digest])
+            manifest_tables[table] = entries
+        manifest = {"tables": manifest_tables}
+        manifest_data = _encode(manifest)
+        manifest_digest = _digest(manifest_data)
+        if head is not None and head.manifest == manifest_digest:
+            return head, False
+
+        if manifest_digest not in existing:
+            self.backend.write(f"objects/{manifest_digest}", self._encode_object(manifest_data))
+        self._manifests[manifest_digest] = manifest
+        version = Version.create(manifest_digest, parent or (head.id if head else None), message,
+                                 {table: len(rows) for table, rows in tables.items()})
+        self._manifest_ids[version.id] = manifest_digest
+        self.backend.write(version.ref_name(), _encode(version.to_json()))
+        self.backend.write("index", _encode([version.to_json()] + [v.to_json() for v in versions]))
+        return version, True
+
+    def _buckets(self, source):
+        """``{table: {bucket: (digest, rows or None)}}`` for a version id or a `read_tables` result."""
+        if isinstance(source, str):
+            return {table: {bucket: (digest, None) for bucket, digest in entries}
+                    for table, entries in self.manifest(source)["tables"].items()}
+        buckets = {}
+        for table, rows in source.items():
+            chunks = _chunks(rows)
+            buckets[table] = {bucket: (_digest(data), _decode_chunk(data)) for bucket, data in chunks.items()}
+        return buckets
+
+    def _rows(self, entry):
+        digest, rows = entry
+        return rows if rows is not None else _decode_chunk(self._read_object(digest))
+
+    @traced("versions_load")
+    def load(self, version_id):
+        """The tables of a version, in `read_tables` form."""
+        return {table: [row for bucket in sorted(buckets) for row in self._rows(buckets[bucket])]
+                for table, buckets in self._buckets(version_id).items()}
+
+    @traced("versions_diff")
+    def diff(self, old, new):
+        """Rows added and removed from `old` to `new` (version ids or `read_tables` results).
+
+        Returns ``{table: (added, removed)}`` for the tables that differ.
+        """
+        old_buckets, new_buckets = self._buckets(old), self._buckets(new)
+        changes = {}
+        for table in TABLES:
+            before, after = old_buckets.get(table, {}), new_buckets.get(table, {})
+            added, removed = set(), set()
+            for bucket in set(before) | set(after):
+                old_entry, new_entry = before.get(bucket), after.get(bucket)
+                if old_entry and new_entry and old_entry[0] == new_entry[0]:
+                    continue
+                old_rows = set(self._rows(old_entry)) if old_entry else set()
+                new_rows = set(self._rows(new_entry)) if new_entry else set()
+                added |= new_rows - old_rows
+                removed |= old_rows - new_rows
+            if added or removed:
+                changes[table] = (sorted(added), sorted(removed))
+        return changes
+
+
+def format_diff(changes):
+    lines = []
+    for table, (added, removed) in changes.items():
+        lines.append(f"{table}: +{len(added)} -{len(removed)}")
+        lines += [f"  + {row}" for row in added]
+        lines += [f"  - {row}" for row in removed]
+    return "\n".join(lines) if lines else "差分はありません"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="別名データのバージョン履歴（ローカルディレクトリ）")
+    parser.add_argument("store", help="バージョンを保存するディレクトリ")
+    commands = parser.add_subparsers(dest="command", required=True)
+    save = commands.add_parser("save", help="データベースを新しいバージョンとして保存")
+    save.add_argument("db")
+    save.add_argument("-m", "--message", default="")
+    commands.add_parser("list", help="バージョンの一覧")
+    diff = commands.add_parser("diff", help="2つのバージョン、またはバージョンとデータベースの差分")
+    diff.add_argument("old")
+    diff.add_argument("new", nargs="?")
+    diff.add_argument("--db", help="new を省略したときに比較するデータベース")
+    restore_parser = commands.add_parser("restore", help="バージョンの内容をデータベースに書き戻す")
+    restore_parser.add_argument("version")
+    restore_parser.add_argument("db")
+    args = parser.parse_args(argv)
+
+    store = VersionStore(LocalBackend(args.store))
+    if args.command == "save":
+        conn = sqlite3.connect(args.db)
+        version, created = store.save(read_tables(conn), args.message)
+        conn.close()
+        print(f"{'保存しました' if created else '変更がないため保存しませんでした'}: {version.describe()}")
+    elif args.command == "list":
+        for version in store.versions():
+            print(version.describe())
+    elif args.command == "diff":
+        old = store.resolve(args.old).id
+        if args.new:
+            new = store.resolve(args.new).id
+        elif args.db:
+            conn = sqlite3.connect(args.db)
+            new = read_tables(conn)
+            conn.close()
+        else:
+            parser.error("new か --db を指定してください")
+        print(format_diff(store.diff(old, new)))
+    elif args.command == "restore":
+        version = store.resolve(args.version)
+        conn = sqlite3.connect(args.db)
+        restore(conn, store.load(version.id))
+        conn.close()
+        print(f"復元しました: {version.describe()}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())